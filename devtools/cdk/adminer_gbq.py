@@ -1,6 +1,8 @@
 from types import ModuleType
 from aws_cdk import (
+    aws_cloudwatch as cw,
     aws_ecs as ecs,
+    aws_elasticloadbalancingv2 as elb,
 )
 from constructs import Construct
 from lib.default_patterns import DefaultPatterns
@@ -28,19 +30,98 @@ class AdminerGbqStack(FargateServicePattern):
         """環境別の既存リソース定義"""
 
         # 固有の設定
-        self.cpu = 1024
-        self.memory_limit_mib = 2048
+        # 固定しているタグ(master-3431413)のイメージは現行のdevtools/webより前にビルドしたもので、
+        # `cdk deploy -c image_tag=<tag>` で現行のDockerfileからビルドしたタグを指定した場合のみ、イメージに依存する機能を有効にする
+        image_tag = self.node.try_get_context("image_tag")
+        rebuilt_image = image_tag is not None
+        # タスクサイズは環境ごとのIResource(cpu_large/memory_large)で決める
+        self.sizing_tier = "large"
         self.health_check_grace_period = 60
         self.deregistration_delay = 60
+        self.deployment_profile = "fast"
+        # BigQueryのクエリは数秒掛かることがあるため、レイテンシのしきい値を長めにする
+        self.alarm_latency_p99 = 10
+        # `cdk deploy -c profiling=true` でプロファイリング用イメージに切り替える
+        if str(self.node.try_get_context("profiling")).lower() == "true":
+            self.profiling = True
+        # BigQueryドライバ(BigQueryMetrics)がEMFで出力するメトリクス
+        self.metrics_namespace = "AdminerBigQuery"
+        self.log_metrics = {
+            "QueryLatency": cw.Unit.MILLISECONDS,
+            "BytesProcessed": cw.Unit.BYTES,
+            "ClientCreationTime": cw.Unit.MILLISECONDS,
+            "CacheHit": cw.Unit.COUNT,
+            "SharedCacheHit": cw.Unit.COUNT,
+            "CacheMiss": cw.Unit.COUNT,
+            "ExportDuration": cw.Unit.MILLISECONDS,
+            "ExportRows": cw.Unit.COUNT,
+        }
+        self.min_capacity = 1
+        self.max_capacity = 4
+        self.scaling_cpu_target = 60
+        self.scaling_memory_target = 75
+        self.scaling_requests_per_target = 300
+        # 利用は日本の業務時間に集中するため、始業前にタスクを増やし、夜間と週末は減らす
+        self.scaling_schedules = {
+            "business-hours": {
+                "cron": {"minute": "30", "hour": "8", "week_day": "MON-FRI"},
+                "min_capacity": 2,
+                "max_capacity": 4,
+            },
+            "off-hours": {
+                "cron": {"minute": "0", "hour": "20", "week_day": "MON-FRI"},
+                "min_capacity": 1,
+                "max_capacity": 2,
+            },
+        }
+        # 始業前に起動したタスクは、ALBに登録される前にウォームアップを済ませる
+        # ウォームアップ(warmup.phpとdocker-entrypoint.shの呼び出し)はイメージに含まれている必要がある
+        if rebuilt_image:
+            self.warmup = True
+        # `cdk deploy -c blue_green=true` で、新しいタスクのキャッシュを温めてから切り替えるBlue/Greenデプロイにする
+        # RequestCountPerTargetは片方のターゲットグループしか計測できないため、CPU/メモリでスケールする
+        if str(self.node.try_get_context("blue_green")).lower() == "true":
+            # フックが呼び出す /warmup が無いイメージでは、デプロイがフックの失敗でロールバックされる
+            if not rebuilt_image:
+                raise ValueError("blue_green requires -c image_tag=<tag> built from the current devtools/web Dockerfile")
+            self.blue_green = True
+            self.blue_green_test_port = 10080
+            self.blue_green_bake_time = 10
+            self.scaling_requests_per_target = None
+        # 共有キャッシュへの接続にはイメージのphpredisが必要
+        if rebuilt_image:
+            self.shared_cache = "existing"
+            self.shared_cache_local_ttl = 60
+        # 大きなテーブルのエクスポートはWebのリクエストで実行せず、ワーカーサービスに任せる
+        # ワーカー(export-worker.php)とエクスポート画面のプラグインはイメージに含まれている必要がある
+        if rebuilt_image:
+            self.export_worker = True
+        # 接続プールやAPCuはタスクごとのため、処理中のリクエストが少ないタスクへ振り分け、
+        # ログイン後はAdminerのセッションCookieで同じタスクに固定する
+        self.load_balancing_algorithm = elb.TargetGroupLoadBalancingAlgorithmType.LEAST_OUTSTANDING_REQUESTS
+        self.stickiness = "app_cookie"
+        self.stickiness_cookie_name = "adminer_sid"
+        # 環境変数でApacheのKeepAliveTimeoutを設定できるのは、現行のDockerfileでビルドしたイメージのみ
+        if rebuilt_image:
+            self.keep_alive_timeout = 65
         self.zone = self.rs.zone_car_mo
         self.hostname = "adminer-g"
         self.fqdn = f"{self.hostname}.{self.zone.zone_name}"
         self.host_headers = [self.fqdn]
         self.port = 80
+        # 固定しているイメージには /healthz とcurlが無いため、再ビルドしたタグに切り替えるまではAdminer本体(/)を監視する
+        # タグを切り替える際に、health_check_path/healthy_http_codes を "/healthz"/"200" に、
+        # container_health_check_path を "/healthz" にする
         self.health_check_path = "/"
+        self.health_check_interval = 10
+        self.health_check_timeout = 5
+        self.healthy_threshold_count = 2
+        self.unhealthy_threshold_count = 2
 
-        image = "ghcr.io/takemi-ohama/adminer-bigquery:master-3431413"
-        image_adminer = ecs.ContainerImage.from_registry(image)
+        # ランタイム設定の環境変数は devtools/web の現行Dockerfileでビルドしたイメージで有効になる
+        image = f"ghcr.io/takemi-ohama/adminer-bigquery:{image_tag or 'master-3431413'}"
+        # soci_repositoryを指定すると、publish-soci.shでECRに公開した同じタグのイメージを遅延読み込みする
+        image_adminer = self.soci_image(self.profiling_image(image))
 
         port_mappings = [ecs.PortMapping(container_port=80, host_port=80)]
 
@@ -60,17 +141,32 @@ class AdminerGbqStack(FargateServicePattern):
             "GOOGLE_OAUTH2_COOKIE_SAMESITE": "Lax",  # SameSite設定
         }
 
+        # タスクサイズに合わせたPHP/Apacheの設定
+        environment_app.update(self.php_runtime_environment())
+        environment_app.update(self.metrics_environment(id))
+        environment_app.update(self.tracing_environment(id))
+
         # 構築定義
+        if self.shared_cache is not None:
+            environment_app.update(self.create_shared_cache(id))
+
+        self.create_log_group(id)
         task_def = self.create_ecs_task_def(id)
+        if self.export_worker:
+            environment_app.update(self.create_export_worker(id, task_def, image_adminer, environment_app))
 
-        task_def.add_container(
+        container_app = task_def.add_container(
             f"{id}-app",
             container_name="app",
             image=image_adminer,
-            logging=ecs.LogDriver.aws_logs(stream_prefix=f"{id}-container-app"),
+            logging=self.container_logging(id, task_def, "app"),
             environment=environment_app,
             port_mappings=port_mappings,
+            stop_timeout=self.container_stop_timeout(),
+            health_check=self.container_health_check(),
         )
+        if self.profiling:
+            self.create_profiling(id, task_def, container_app)
         self.create_ecs_service_elb(id, task_def, service_container_name=f"app")
 
         self.create_route53_record(id)
@@ -10,6 +10,7 @@ dev環境設定を含む完全なデプロイ設定が含まれています。
 import aws_cdk as cdk
 from adminer_gbq import AdminerGbqStack
 import config.env.dev as dev_env
+import config.env.local as local_env
 import os
 
 # CDKアプリケーションの作成
@@ -18,12 +19,16 @@ app = cdk.App()
 # 環境変数または引数から環境を取得（デフォルトはdev）
 environment = app.node.try_get_context("environment") or os.environ.get("CDK_ENV", "dev")
 
+# offlineモード: context lookupやboto3を使わずにsynthする（CI用）
+# cdk synth -c offline=true または CDK_OFFLINE=1
+offline = str(app.node.try_get_context("offline") or os.environ.get("CDK_OFFLINE", "")).lower() in ("1", "true")
+
 # 開発環境でのデプロイ設定
 if environment == "dev":
     AdminerGbqStack(
         app,
         "AdminerGbqDevStack",
-        site_module=dev_env,
+        site_module=local_env if offline else dev_env,
         env=cdk.Environment(
             account="422746423551",  # carmo-dev アカウント
             region="ap-northeast-1"  # ap-northeast-1 リージョン
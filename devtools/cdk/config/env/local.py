@@ -0,0 +1,74 @@
+from lib.base_resource import lazy
+from aws_cdk import (
+    aws_route53 as route53,
+)
+from constructs import Construct
+import config.env.dev as dev
+
+
+class Resource(dev.Resource):
+    """開発環境の既存リソース定義(offline版)
+
+    config/env/dev.pyと同じリソースを参照するが、context lookupを行わず全て属性から構築する。
+    `cdk synth -c offline=true` または `CDK_OFFLINE=1` で使用され、AWSへの接続なしでsynthできる。
+    """
+
+    def __init__(self, scope: Construct):
+        """
+            開発環境(carmo-dev)の既存リソースを属性から定義する
+        Args:
+            scope (Construct): 呼び出し元のStack
+        """
+        super().__init__(scope)
+
+        self.offline = True
+
+        # cdk.context.jsonにキャッシュされたlookup結果と同じ値
+        self.listener_arn = (
+            "arn:aws:elasticloadbalancing:ap-northeast-1:422746423551:"
+            "listener/app/dev-ecs-alb/e79b8893be6c0522/d85c476404caddb1"
+        )
+
+        self.load_balancer_arn = (
+            "arn:aws:elasticloadbalancing:ap-northeast-1:422746423551:loadbalancer/app/dev-ecs-alb/e79b8893be6c0522"
+        )
+
+        self.load_balancer_dns_name = "dev-ecs-alb-1761336980.ap-northeast-1.elb.amazonaws.com"
+
+        self.load_balancer_canonical_hosted_zone_id = "Z14GRHDCWA56QT"
+
+    @lazy
+    def zone_car_mo(self) -> route53.IHostedZone:
+        return route53.HostedZone.from_hosted_zone_attributes(
+            self.scope,
+            "zone_car_mo",
+            hosted_zone_id="ZTQOB3LUF1EAW",
+            zone_name="dev.car-mo.jp",
+        )
+
+    @lazy
+    def zone_carmo_kun(self) -> route53.IHostedZone:
+        return route53.HostedZone.from_hosted_zone_attributes(
+            self.scope,
+            "zone_carmo_kun_jp",
+            hosted_zone_id="Z0471087IOMJWS09MLAP",
+            zone_name="carmo-kun.net",
+        )
+
+    @lazy
+    def zone_app_carmo_kun(self) -> route53.IHostedZone:
+        return route53.HostedZone.from_hosted_zone_attributes(
+            self.scope,
+            "zone_app_carmo_kun",
+            hosted_zone_id="Z072112636LZUSI6ZPO0U",
+            zone_name="app.carmo-kun.net",
+        )
+
+    @lazy
+    def zone_system_carmo_kun(self) -> route53.IHostedZone:
+        return route53.HostedZone.from_hosted_zone_attributes(
+            self.scope,
+            "zone_system_carmo_kun",
+            hosted_zone_id="Z1015213IA6DYIQHW59R",
+            zone_name="system.carmo-kun.net",
+        )
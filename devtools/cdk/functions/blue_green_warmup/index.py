@@ -0,0 +1,66 @@
+"""Blue/Greenデプロイのライフサイクルフック(POST_TEST_TRAFFIC_SHIFT)
+
+テスト用listenerのルールが転送している新しいターゲットグループから新しいタスクを特定し、
+各タスクのウォームアップ(warmup.php?preload=1)をApacheのワーカー数だけ並列に呼び出す。
+ALBを経由せずタスクへ直接リクエストするため、VPC内で実行する。
+すべてのリクエストが成功した場合のみSUCCEEDEDを返し、それ以外は本番のトラフィックを切り替えずにロールバックさせる。
+
+環境変数:
+    TEST_RULE_ARN: テスト用listenerのルール
+    WARMUP_PATH: ウォームアップのパス
+    WARMUP_REQUESTS: 1タスクあたりの並列リクエスト数(起動済みのApacheワーカー数)
+    WARMUP_TIMEOUT: 1リクエストのタイムアウト(秒)
+"""
+
+import json
+import os
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+WARM_STATES = ("healthy", "initial")
+"""ウォームアップの対象にするターゲットの状態"""
+
+
+def green_targets(elbv2, rule_arn: str) -> list[tuple[str, int]]:
+    """テスト用listenerのルールが転送しているターゲットグループの(IP, ポート)を返す"""
+    rule = elbv2.describe_rules(RuleArns=[rule_arn])["Rules"][0]
+    forward = next(x for x in rule["Actions"] if x["Type"] == "forward")
+    groups = forward["ForwardConfig"]["TargetGroups"]
+    target_group_arn = max(groups, key=lambda x: x.get("Weight", 0))["TargetGroupArn"]
+    health = elbv2.describe_target_health(TargetGroupArn=target_group_arn)["TargetHealthDescriptions"]
+    return [(x["Target"]["Id"], x["Target"]["Port"]) for x in health if x["TargetHealth"]["State"] in WARM_STATES]
+
+
+def warmup(url: str, timeout: int) -> dict:
+    """ウォームアップを呼び出し、warmup.phpの結果を返す。失敗した場合は例外"""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def handler(event, context, elbv2=None):
+    elbv2 = elbv2 or boto3.client("elbv2")
+    path = os.environ.get("WARMUP_PATH", "/warmup?preload=1")
+    requests = int(os.environ.get("WARMUP_REQUESTS", "1"))
+    timeout = int(os.environ.get("WARMUP_TIMEOUT", "60"))
+
+    targets = green_targets(elbv2, os.environ["TEST_RULE_ARN"])
+    if not targets:
+        print(json.dumps({"stage": event.get("lifecycleStage"), "error": "no green targets"}))
+        return {"hookStatus": "FAILED"}
+
+    urls = [f"http://{ip}:{port}{path}" for ip, port in targets for _ in range(requests)]
+    failed = 0
+    with ThreadPoolExecutor(max_workers=min(len(urls), 64)) as executor:
+        futures = [(url, executor.submit(warmup, url, timeout)) for url in urls]
+        for url, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                result = {"error": str(e)}
+            print(json.dumps({"url": url, "result": result}))
+
+    print(json.dumps({"stage": event.get("lifecycleStage"), "targets": len(targets), "failed": failed}))
+    return {"hookStatus": "FAILED" if failed else "SUCCEEDED"}
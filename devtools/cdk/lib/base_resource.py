@@ -9,6 +9,35 @@ from aws_cdk import (
 from constructs import Construct
 
 
+class lazy:
+    """IResourceのメンバーを初回参照時に1度だけ評価するデコレータ
+
+    既存リソースのimportやcontext lookupは、Stackがそのメンバーを参照した時点で初めて実行され、
+    結果はインスタンスに保持される。参照されないメンバーはconstruct treeに追加されない。
+
+    Examples:
+        class Resource(IResource):
+            @lazy
+            def vpc(self) -> ec2.IVpc:
+                return ec2.Vpc.from_vpc_attributes(self.scope, "vpc", ...)
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = self.func(obj)
+        # インスタンスの属性として保持し、以降はこのdescriptorを経由しない
+        obj.__dict__[self.name] = value
+        return value
+
+
 class IResource:
     """環境別のリソース定義のInterface"""
 
@@ -32,6 +61,12 @@ class IResource:
     public_subnets: ec2.SubnetSelection
     "public subnet"
 
+    private_route_table_ids: list[str] = None
+    "private subnetのルートテーブルIDのリスト。S3のゲートウェイエンドポイントの関連付けに使う"
+
+    vpc_endpoint_ids: dict[str, str] = None
+    """作成済みのVPCエンドポイント(サービス名 -> vpce-xxx)。lib.vpc_endpoints.VpcEndpointsはこれらを作成しない"""
+
     vpn_cert_arn: str
     """
     client vpn用の証明書arn
@@ -55,6 +90,9 @@ class IResource:
     sg_alb: ec2.ISecurityGroup
     """alb用のセキュリティグループ"""
 
+    alb_idle_timeout: int = 60
+    """共通albのアイドルタイムアウト(秒)。タスク側のkeep-aliveはこれより長くする"""
+
     cluster: ecs.ICluster
 
     execution_role: iam.IRole
@@ -66,6 +104,9 @@ class IResource:
     ecr_registry: str
     """name of private registry"""
 
+    pull_through_cache_prefixes: dict[str, str] = None
+    """ECRのプルスルーキャッシュの上流レジストリ -> リポジトリのprefix(例: {"ghcr.io": "ghcr"})"""
+
     efs_volumes: dict[str, str | dict]
 
     elb_log_bucket: s3.IBucket
@@ -95,6 +136,24 @@ class IResource:
     load_balancer_name: str
     "共通albのload balancer arn"
 
+    offline: bool = False
+    """Trueの場合、context lookupやboto3によるAWSへの問い合わせを行わずにsynthする
+
+    offline時はlistener_name/load_balancer_nameの代わりに以下の属性を使う
+    """
+
+    listener_arn: str = None
+    "offline時に使う共通albのlisterer arn"
+
+    load_balancer_arn: str = None
+    "offline時に使う共通albのload balancer arn"
+
+    load_balancer_dns_name: str = None
+    "offline時に使う共通albのDNS名"
+
+    load_balancer_canonical_hosted_zone_id: str = None
+    "offline時に使う共通albのCanonical Hosted Zone ID"
+
     aurora_mysql: str
     "Aurora-mysqlの汎用DBへの書き込みエンドポイント"
 
@@ -114,7 +173,10 @@ class IResource:
     "Aurora-mysqlのユーザー"
 
     multipurpose_redis_url: str
-    "汎用redisサーバへのエンドポイント"
+    "汎用redisサーバへのエンドポイント。ElastiCache Serverlessの場合はTLS(rediss://)"
+
+    sg_multipurpose_redis: ec2.ISecurityGroup = None
+    """汎用redisサーバのセキュリティグループ。shared_cache="existing"で必須。sg_defaultからの接続を許可するルールを追加する"""
 
     cpu_small: int
     "dev/stagingでは512, productionでは1024"
@@ -123,7 +185,7 @@ class IResource:
     "dev/stagingでは512, productionでは2048"
 
     cpu_large: int
-    "dev/stagingでは512, productionでは4096"
+    "dev/stagingでは1024, productionでは4096"
 
     memory_small: int
     "dev/stagingでは1024, productionでは2048"
@@ -132,9 +194,10 @@ class IResource:
     "dev/stagingでは1024, productionでは4096"
 
     memory_large: int
-    "dev/stagingでは1024, productionでは8192"
+    "dev/stagingでは2048, productionでは8192"
 
     cpu_architecture: ecs.CpuArchitecture = ecs.CpuArchitecture.X86_64
+    """タスクのCPUアーキテクチャ。ARM64(Graviton)にする場合はイメージもarm64に対応している必要がある"""
 
     slack_webhook_url: str
     "slackのwebhook_url"
@@ -142,6 +205,12 @@ class IResource:
     slack_webhook_url_kaikei: str
     "kaikeiブランチ用slackのwebhook_url"
 
+    alarm_topic_arn: str = None
+    "CloudWatchアラームの通知先SNSトピックarn。Noneの場合はアラームを通知しない"
+
+    cloudfront_certificate_arn: str = None
+    "CloudFrontのカスタムドメインに使うACM証明書(us-east-1)のarn"
+
     subnet_ids: list[str]
     "サブネットIDのリスト"
 
@@ -161,4 +230,8 @@ class IResource:
     "DMS用SSL証明書のARN"
 
     def __init__(self, scope):
-        self.scope = scope
\ No newline at end of file
+        self.scope = scope
+
+    def is_evaluated(self, name: str) -> bool:
+        """lazyなメンバーが評価済みかどうか。lazyでないメンバーは常にTrue"""
+        return not isinstance(getattr(type(self), name, None), lazy) or name in self.__dict__
\ No newline at end of file
@@ -7,6 +7,7 @@ from aws_cdk import (
 
 from types import ModuleType
 from lib.base_resource import IResource
+from lib.image_platform import parse_image
 
 
 class DefaultPatterns:
@@ -37,6 +38,44 @@ class DefaultPatterns:
         image = ecs.ContainerImage.from_ecr_repository(repos, tag)
         return image
 
+    def pull_through_image(self, image: str, prefix: str) -> ecs.EcrImage:
+        """ECRのプルスルーキャッシュ経由でレジストリのイメージを取得
+
+        初回のpullでECRが上流からイメージを取り込み、以降はリージョン内のECRから取得する。
+        タスク実行ロールには ecr:BatchImportUpstreamImage と ecr:CreateRepository が必要。
+
+        Args:
+            image (str): 上流のイメージ名(例: ghcr.io/owner/name:tag)
+            prefix (str): プルスルーキャッシュルールのリポジトリprefix
+
+        Returns:
+            ecs.EcrImage: EcrImage
+        """
+        _, repository, reference = parse_image(image)
+        return self.ecr_image(f"{prefix}/{repository}", reference)
+
+    def pull_through_cache_rule(
+        self, prefix: str, upstream_registry_url: str, credential_arn: str = None
+    ) -> ecr.CfnPullThroughCacheRule:
+        """ECRのプルスルーキャッシュルールを作成する(アカウント・リージョンで1度だけ作成する)
+
+        Args:
+            prefix (str): リポジトリのprefix
+            upstream_registry_url (str): 上流レジストリ(例: ghcr.io)
+            credential_arn (str, optional): 上流の認証情報のSecrets Manager arn(名前は ecr-pullthroughcache/ で始まる)。
+                ghcr.ioなど認証が必要なレジストリでは必須
+
+        Returns:
+            ecr.CfnPullThroughCacheRule: CfnPullThroughCacheRule
+        """
+        return ecr.CfnPullThroughCacheRule(
+            self.scope,
+            f"pull-through-{prefix}",
+            ecr_repository_prefix=prefix,
+            upstream_registry_url=upstream_registry_url,
+            credential_arn=credential_arn,
+        )
+
     def ssm_param(self, param_name, construct_id=None) -> ecs.Secret:
         """SSMのセキュアパラメータの値を取得する
 
@@ -1,16 +1,137 @@
+import hashlib
+from pathlib import Path
+
 from aws_cdk import (
     Stack,
     Duration,
+    Size,
+    TimeZone,
+    aws_applicationautoscaling as appscaling,
+    aws_certificatemanager as acm,
+    aws_cloudfront as cloudfront,
+    aws_cloudfront_origins as origins,
+    aws_ec2 as ec2,
     aws_ecs as ecs,
+    aws_cloudwatch as cw,
+    aws_cloudwatch_actions as cw_actions,
+    aws_elasticache as elasticache,
     aws_elasticloadbalancingv2 as elb,
     aws_iam as iam,
+    aws_lambda as lambda_,
+    aws_logs as logs,
     aws_route53 as route53,
     aws_route53_targets as r53_targets,
+    aws_s3 as s3,
+    aws_sns as sns,
+    aws_sqs as sqs,
     aws_ssm as ssm,
 )
 from constructs import Construct
 from lib.base_resource import IResource
-import boto3
+from lib.default_patterns import DefaultPatterns
+from lib.image_platform import ImageArchitectureValidation, parse_image
+from lib.listener_priority import REFRESH_CONTEXT_KEY, ListenerPriorityAllocator
+from lib.vpc_endpoints import VpcEndpoints
+
+
+APACHE_BASE_MEMORY = 256
+"""PHPランタイムの算出で、Apache親プロセスとOSのために確保するメモリ(MiB)"""
+
+PHP_WORKER_MEMORY = 64
+"""PHPランタイムの算出で想定する、Apacheワーカー1プロセスあたりの平均メモリ(MiB)"""
+
+PHP_WORKERS_PER_VCPU = 25
+"""vCPUあたりのApacheワーカー数の上限。BigQuery APIの応答待ちが大半のためCPU数より多くする"""
+
+SPOT_INTERRUPTION_NOTICE = 120
+"""Fargate Spotの中断通知から停止までの猶予(秒)"""
+
+SPOT_STOP_TIMEOUT = 120
+"""Spot使用時のコンテナstopTimeoutの既定値(秒)。Fargateの上限で、中断通知の猶予と同じ"""
+
+FARGATE_MAX_STOP_TIMEOUT = 120
+"""Fargateで指定できるコンテナstopTimeoutの上限(秒)"""
+
+DRAIN_MARGIN = 5
+"""max_request_durationから登録解除の待ち時間とstopTimeoutを算出する際に加える余裕(秒)"""
+
+DEPLOYMENT_PROFILES = {
+    "fast": {
+        "min_healthy_percent": 50,
+        "max_healthy_percent": 200,
+        "circuit_breaker": True,
+        "max_request_duration": 60,
+    },
+}
+"""デプロイプロファイルのプリセット
+fast: 新しいタスクの起動と並行して旧タスクの半数を停止し、失敗時はロールバックする。
+      登録解除はWebの通常のリクエスト(60秒)の完了まで待つ。エクスポートをWebで実行する場合はEXPORT_REQUEST_DURATION
+"""
+
+EXPORT_REQUEST_DURATION = 600
+"""エクスポートをWebのリクエストで実行する場合の最長の処理時間(秒)。
+devtools/web/.htaccessのmax_execution_time(php.iniの300秒より優先される)に合わせる。
+LinuxのPHPはmax_execution_timeをCPU時間で数えるため、BigQueryの応答を待つリクエストはこれより長くなることがある
+"""
+
+OTEL_COLLECTOR_CONFIG = Path(__file__).resolve().parent.parent / "config" / "otel-collector.yaml"
+"""トレース用サイドカー(ADOT collector)の設定ファイル"""
+
+OTEL_COLLECTOR_PORT = 4318
+"""ADOT collectorがOTLP/HTTPを受け付けるポート。タスク内のコンテナはlocalhostで接続する"""
+
+FLUENT_BIT_CONFIG = Path(__file__).resolve().parent.parent / "config" / "fluent-bit.conf"
+"""FireLens(Fluent Bit)の追加設定。ヘルスチェックの除外とCloudWatch Logsへの送信"""
+
+FLUENT_BIT_S3_CONFIG = Path(__file__).resolve().parent.parent / "config" / "fluent-bit-s3.conf"
+"""log_archive_s3の場合にFLUENT_BIT_CONFIGへ追加する、S3へのアーカイブの設定"""
+
+FLUENT_BIT_CONFIG_PATH = "/fluent-bit/etc/adminer.conf"
+"""ルーターのコンテナ内で追加設定を書き出すパス。FireLensが生成する設定から読み込まれる"""
+
+LOG_DRIVERS = ("awslogs", "firelens")
+"""log_driverに指定できる値"""
+
+PROFILES_PATH = "/tmp/profiles"
+"""プロファイリング時に、アプリケーションとサイドカーが共有するボリュームのマウント先"""
+
+WARMUP_HOOK_CODE = Path(__file__).resolve().parent.parent / "functions" / "blue_green_warmup"
+"""Blue/Greenデプロイのライフサイクルフック(Lambda)のソース"""
+
+WARMUP_HOOK_TIMEOUT = 300
+"""ライフサイクルフックのタイムアウト(秒)"""
+
+WARMUP_REQUEST_TIMEOUT = 60
+"""ライフサイクルフックが各タスクのウォームアップを待つ時間(秒)"""
+
+TARGET_GROUP_NAME_MAX_LENGTH = 32
+"""ターゲットグループ名の最大長"""
+
+
+def target_group_name(id: str, suffix: str) -> str:
+    """`<id>-<suffix>` のターゲットグループ名を返す。
+
+    32文字を超える場合は、Stack IDを切り詰めて元のIDのハッシュを付け、Stack間で名前が衝突しないようにする。
+
+    Examples:
+        >>> target_group_name("AdminerGbqStack", "target")
+        'AdminerGbqStack-target'
+        >>> target_group_name("AdminerGbqUnmonitoredStack", "target")
+        'AdminerGbqUnmonito-acdb2e-target'
+    """
+    name = f"{id}-{suffix}"
+    if len(name) <= TARGET_GROUP_NAME_MAX_LENGTH:
+        return name
+    digest = hashlib.sha1(id.encode()).hexdigest()[:6]
+    head = id[: TARGET_GROUP_NAME_MAX_LENGTH - len(digest) - len(suffix) - 2].rstrip("-")
+    return f"{head}-{digest}-{suffix}"
+
+
+STICKINESS_TYPES = ("app_cookie", "lb_cookie")
+"""stickinessに指定できる値"""
+
+CDN_STATIC_PATHS = ("/adminer/static/*", "/static/*", "/externals/*", "/designs/*")
+"""CloudFrontでキャッシュするAdminerの静的ファイル(本体のJS/CSS、jush、デザインのCSS)のパス"""
 
 
 class FargateServicePattern(Stack):
@@ -36,12 +157,45 @@ class FargateServicePattern(Stack):
     memory_limit_mib: int
     """taskのmemory"""
 
+    sizing_tier: str = None
+    """"small"/"medium"/"large"。指定するとcpu/memory_limit_mibの代わりにIResourceのcpu_*/memory_*を使う"""
+
     port: int
     """コンテナ-ELBの接続port"""
 
     health_check_path: str
     """ヘルスチェック対象のパス名"""
 
+    healthy_http_codes: str = "200,302"
+    """ALBのヘルスチェックで正常とみなすHTTPステータス"""
+
+    health_check_interval: int = None
+    """ALBのヘルスチェック間隔(秒, 5〜300)。Noneの場合はALBの既定値(30秒)"""
+
+    health_check_timeout: int = None
+    """ALBのヘルスチェックのタイムアウト(秒, 2〜120)。health_check_intervalより短くする。Noneの場合はALBの既定値"""
+
+    healthy_threshold_count: int = None
+    """ALBが正常とみなすまでの連続成功回数(2〜10)。Noneの場合はALBの既定値(5回)"""
+
+    unhealthy_threshold_count: int = None
+    """ALBが異常とみなすまでの連続失敗回数(2〜10)。Noneの場合はALBの既定値(2回)"""
+
+    container_health_check_path: str = None
+    """コンテナのヘルスチェックでcurlするパス。Noneの場合はコンテナのヘルスチェックを行わない"""
+
+    container_health_check_interval: int = 10
+    """コンテナのヘルスチェック間隔(秒, 5〜300)"""
+
+    container_health_check_timeout: int = 2
+    """コンテナのヘルスチェックのタイムアウト(秒, 2〜60)"""
+
+    container_health_check_retries: int = 3
+    """コンテナをUNHEALTHYとみなすまでの連続失敗回数(1〜10)"""
+
+    container_health_check_start_period: int = None
+    """起動直後に失敗を数えない期間(秒, 0〜300)。Noneの場合はECSの既定値(0秒)"""
+
     health_check_grace_period: int = 240
     """初回起動時のヘルスチェック開始遅延時間(分)
     起動に時間が掛かるタイプのコンテナはここの値を大きくする
@@ -62,6 +216,289 @@ class FargateServicePattern(Stack):
     task_role: iam.Role = None
     """タスクに紐づけるIAMロール"""
 
+    min_capacity: int = None
+    """オートスケーリング時の最小タスク数。max_capacityと併せて指定するとスケーリングが有効になる"""
+
+    max_capacity: int = None
+    """オートスケーリング時の最大タスク数。Noneの場合はdesired_countで固定"""
+
+    scaling_cpu_target: int = None
+    """CPU使用率のターゲット値(%)。Noneの場合はCPUによるスケーリングを行わない"""
+
+    scaling_memory_target: int = None
+    """メモリ使用率のターゲット値(%)。Noneの場合はメモリによるスケーリングを行わない"""
+
+    scaling_requests_per_target: int = None
+    """1タスクあたりのALBリクエスト数(RequestCountPerTarget)のターゲット値。Noneの場合は使用しない"""
+
+    scale_in_cooldown: int = 300
+    """スケールインのクールダウン(秒)"""
+
+    scale_out_cooldown: int = 60
+    """スケールアウトのクールダウン(秒)"""
+
+    scaling_schedules: dict[str, dict] = None
+    """時間帯ごとの最小/最大タスク数。max_capacityを指定してオートスケーリングを有効にした場合のみ使える
+    名前 -> {"cron": appscaling.Schedule.cron()の引数, "min_capacity": int, "max_capacity": int}
+    各アクションは指定時刻にタスク数の範囲を置き換え、次のアクションまで維持する。
+    (例: {"business-hours": {"cron": {"minute": "30", "hour": "8", "week_day": "MON-FRI"}, "min_capacity": 2}})
+    """
+
+    scaling_timezone: str = "Asia/Tokyo"
+    """scaling_schedulesのcronを解釈するタイムゾーン(IANA形式)"""
+
+    shared_cache: str = None
+    """タスク間で共有するキャッシュ層
+    None: 使用しない / "existing": IResource.multipurpose_redis_url を使う / "serverless": ElastiCache Serverless(Valkey)を新規作成
+    """
+
+    shared_cache_ttl: int = None
+    """共有キャッシュのTTL(秒)。Noneの場合はアプリケーションの既定値"""
+
+    shared_cache_local_ttl: int = None
+    """共有キャッシュ使用時の、タスク内キャッシュのTTL上限(秒)"""
+
+    shared_cache_port: int = 6379
+    """共有キャッシュのポート"""
+
+    fargate_spot_weight: int = 0
+    """FARGATE_SPOTの重み。0の場合はSpotを使わず、従来どおりオンデマンドのFargateのみで起動する"""
+
+    fargate_weight: int = 1
+    """Spot使用時の、オンデマンドのFARGATEの重み(base超過分の配分)"""
+
+    fargate_base: int = 1
+    """Spot使用時に、常にオンデマンドのFARGATEで起動するタスク数"""
+
+    stop_timeout: int = None
+    """コンテナのstopTimeout(秒)。SIGTERM(Apacheはgraceful stop)からSIGKILLまでの猶予。
+    Noneの場合はECSの既定値(30秒)。Spot使用時の既定値はSPOT_STOP_TIMEOUT
+    """
+
+    load_balancing_algorithm: elb.TargetGroupLoadBalancingAlgorithmType = None
+    """ターゲットグループのルーティングアルゴリズム。Noneの場合はALBの既定値(ROUND_ROBIN)"""
+
+    slow_start: int = None
+    """新しいタスクへの転送量を徐々に増やす期間(秒, 30〜900)。LEAST_OUTSTANDING_REQUESTSとは併用できない"""
+
+    stickiness: str = None
+    """スティッキーセッション。None: 使用しない / "app_cookie": stickiness_cookie_nameのCookieに紐づける /
+    "lb_cookie": ALBが発行するCookieでstickiness_duration秒間紐づける
+    """
+
+    stickiness_cookie_name: str = None
+    """stickinessが"app_cookie"の場合に、アプリケーションが発行するCookie名"""
+
+    stickiness_duration: int = 86400
+    """スティッキーセッションの有効期間(秒, 1〜604800)"""
+
+    target_protocol_version: elb.ApplicationProtocolVersion = None
+    """ALBからタスクへのプロトコルバージョン。Noneの場合はHTTP1。HTTP2はタスクがHTTP/2に対応している場合のみ指定する"""
+
+    keep_alive_timeout: int = None
+    """Apacheのkeep-aliveのタイムアウト(秒)。ALBが再利用する接続をタスク側が先に閉じると502になるため、
+    IResource.alb_idle_timeoutより長くする。Noneの場合はイメージの既定値
+    """
+
+    warmup: bool = False
+    """Trueの場合、タスクの起動時にコンテナ内からウォームアップのリクエストを送り、
+    ALBのヘルスチェックが通る前にOPcacheとApacheのワーカーを温める(devtools/web/warmup.php)
+    """
+
+    warmup_paths: list[str] = None
+    """ウォームアップで各ワーカーに送る代表的なリクエストのパス。Noneの場合はイメージの既定値("/")"""
+
+    blue_green: bool = False
+    """Trueの場合、ECSのBlue/Greenデプロイで新しいタスクを別のターゲットグループに起動し、
+    テスト用listenerへの切り替え後にライフサイクルフックで温めてから本番のトラフィックを切り替える
+    """
+
+    blue_green_test_port: int = None
+    """Blue/Greenデプロイのテスト用listenerのポート(HTTP)。共通ALBの他のlistenerと重複しない番号にする"""
+
+    blue_green_bake_time: int = None
+    """本番のトラフィックを切り替えてから旧タスクを停止するまでの時間(分)。Noneの場合はECSの既定値"""
+
+    preload_datasets: list[str] = None
+    """デプロイ時のプリロードでテーブル一覧を読み込むデータセット。Noneの場合は先頭から20件"""
+
+    preload_tables: list[str] = None
+    """デプロイ時のプリロードでスキーマを読み込むテーブル("dataset.table")"""
+
+    target_group_attributes: dict[str, str] = None
+    """ターゲットグループに追加で設定する属性(例: {"load_balancing.cross_zone.enabled": "true"})"""
+
+    deployment_profile: str = None
+    """デプロイプロファイル(DEPLOYMENT_PROFILESのキー)。以下の属性のうちNoneのものにプリセットの値を使う"""
+
+    min_healthy_percent: int = None
+    """デプロイ中に維持する最小タスク数(desired_countに対する%)。Noneの場合はECSの既定値(100)"""
+
+    max_healthy_percent: int = None
+    """デプロイ中に起動できる最大タスク数(desired_countに対する%)。Noneの場合はECSの既定値(200)"""
+
+    circuit_breaker: bool = None
+    """デプロイのサーキットブレーカー。Trueの場合、タスクが起動できないデプロイを失敗とし、前のリビジョンへロールバックする"""
+
+    max_request_duration: int = None
+    """最長のリクエストの処理時間(秒)。指定すると、ALBの登録解除の待ち時間と
+    コンテナのstopTimeoutをこの値から算出し、デプロイやスケールイン時に処理中のリクエストを打ち切らない
+    """
+
+    log_retention: logs.RetentionDays = logs.RetentionDays.ONE_MONTH
+    """create_log_group()で作成するロググループの保持期間"""
+
+    metrics_namespace: str = None
+    """アプリケーションがEmbedded Metric Format(EMF)で出力するメトリクスの名前空間。
+    メトリクスはCloudWatch LogsがEMFのログから作成する。指定するとmetrics_environment()でアプリケーションに伝え、
+    log_metricsをダッシュボードに表示する
+    """
+
+    log_metrics: dict[str, cw.Unit] = None
+    """ダッシュボードに表示するEMFのメトリクス名と単位"""
+
+    log_driver: str = "awslogs"
+    """コンテナログの送信方法
+    "awslogs": 各コンテナからCloudWatch Logsへ送る / "firelens": Fluent Bitのサイドカー(FireLens)がまとめて送る
+    """
+
+    log_non_blocking: bool = True
+    """awslogsをnon-blockingモードにする。CloudWatch Logsへの送信が遅れてもコンテナの標準出力への書き込みを待たせず、
+    バッファが溢れた分のログは捨てる。Falseの場合はblockingモード(送信が止まるとアプリケーションも止まる)
+    """
+
+    log_max_buffer_size: int = 25
+    """non-blockingモードのログのバッファサイズ(MiB)"""
+
+    log_exclude_pattern: str = "ELB-HealthChecker"
+    """firelensの場合に、送信前に捨てるログ行の正規表現。既定ではALBのヘルスチェックのアクセスログを捨てる"""
+
+    log_archive_s3: bool = False
+    """firelensの場合に、CloudWatch Logsに加えてS3にもログを保存する"""
+
+    log_archive_retention_days: int = 90
+    """S3に保存したログの保持期間(日)"""
+
+    log_router_image: str = "public.ecr.aws/aws-observability/aws-for-fluent-bit:2.32.5"
+    """FireLensのログルーター(Fluent Bit)のイメージ"""
+
+    log_router_memory: int = 64
+    """ログルーターのメモリ予約(MiB)"""
+
+    tracing: bool = False
+    """Trueの場合、ADOT collectorのサイドカーを追加し、X-Rayへトレースを送信する"""
+
+    tracing_collector_image: str = "public.ecr.aws/aws-observability/aws-otel-collector:v0.43.3"
+    """ADOT collectorのイメージ"""
+
+    tracing_collector_memory: int = 64
+    """ADOT collectorのメモリ予約(MiB)"""
+
+    tracing_sample_rate: float = 1.0
+    """アプリケーションがトレースを記録するリクエストの割合(0〜1)"""
+
+    profiling: bool = False
+    """Trueの場合、サンプリングプロファイラ(Excimer)入りのイメージを使い、プロファイルをS3へ転送する"""
+
+    profiling_image_suffix: str = "-profiling"
+    """プロファイリング用イメージのタグの接尾辞(devtools/webをPROFILER=excimerでビルドしたもの)"""
+
+    profiling_sample_hz: int = 99
+    """1秒あたりのサンプリング回数"""
+
+    profiling_request_rate: float = 1.0
+    """プロファイルするリクエストの割合(0〜1)"""
+
+    profiling_retention_days: int = 14
+    """S3に保存したプロファイルの保持期間(日)"""
+
+    profiling_sidecar_image: str = "public.ecr.aws/aws-cli/aws-cli:2.22.0"
+    """プロファイルをS3へ転送するサイドカーのイメージ"""
+
+    profiling_upload_interval: int = 60
+    """サイドカーがS3へ転送する間隔(秒)"""
+
+    export_worker: bool = False
+    """Trueの場合、エクスポートをSQS経由で実行するワーカーサービスを追加する。create_export_worker()を参照"""
+
+    export_worker_cpu: int = 512
+    """ワーカーのタスクのcpu"""
+
+    export_worker_memory: int = 1024
+    """ワーカーのタスクのmemory(MiB)"""
+
+    export_worker_max_capacity: int = 2
+    """ワーカーの最大タスク数。ジョブが無い間は0までスケールインする"""
+
+    export_job_timeout: int = 3600
+    """1ジョブの最長の処理時間(秒)。SQSの可視性タイムアウトになり、超えると別のタスクで再試行する"""
+
+    export_max_receive_count: int = 3
+    """ジョブの最大試行回数。超えたジョブはDLQに移す"""
+
+    export_retention_days: int = 7
+    """S3に保存したエクスポートファイルの保持期間(日)"""
+
+    export_url_ttl: int = 3600
+    """ダウンロード用の署名付きURLの有効期間(秒)"""
+
+    cdn: bool = False
+    """Trueの場合、CloudFrontディストリビューションを作成し、Route53のレコードをALBからCloudFrontに向ける。
+    create_distribution()を参照
+    """
+
+    cdn_certificate_arn: str = None
+    """CloudFrontに使うACM証明書(us-east-1)のarn。未指定の場合はIResource.cloudfront_certificate_arn"""
+
+    cdn_static_paths: tuple[str, ...] = CDN_STATIC_PATHS
+    """CloudFrontでキャッシュする静的ファイルのパスパターン"""
+
+    cdn_static_ttl: int = 86400
+    """静的ファイルのキャッシュの既定TTL(秒)。オリジンがCache-Controlを返さない場合に使う"""
+
+    cdn_origin_read_timeout: int = 60
+    """CloudFrontがオリジンの応答を待つ時間(秒)。既定の上限は60秒"""
+
+    monitoring: bool = True
+    """CloudWatchダッシュボードとアラームを作成する"""
+
+    monitoring_period: int = 60
+    """ダッシュボードとアラームのメトリクスの集計期間(秒)"""
+
+    alarm_latency_p99: float = 5
+    """TargetResponseTimeのp99のアラームしきい値(秒)。Noneの場合はアラームを作成しない"""
+
+    alarm_latency_p90: float = None
+    """TargetResponseTimeのp90のアラームしきい値(秒)。Noneの場合はアラームを作成しない"""
+
+    alarm_5xx_count: int = 10
+    """集計期間あたりのターゲットの5xxレスポンス数のアラームしきい値。Noneの場合はアラームを作成しない"""
+
+    alarm_evaluation_periods: int = 3
+    """アラーム状態にするまでの、しきい値を超えた連続期間数"""
+
+    vpc_endpoints: bool = False
+    """Trueの場合、タスクの起動に使うAWSサービスのVPCエンドポイントを用意し、サービスをその後に作成する。
+    lib.vpc_endpoints.VpcEndpointsを参照
+    """
+
+    pull_through_cache: bool = False
+    """Trueの場合、container_image()はIResource.pull_through_cache_prefixesにあるレジストリのイメージを
+    プルスルーキャッシュ経由でECRから取得する
+    """
+
+    soci_repository: str = None
+    """SOCIインデックス付きでイメージを公開したECRリポジトリ名(例: adminer-bigquery)。
+    指定した場合、soci_image()はレジストリのイメージと同じタグをこのリポジトリから取得する。
+    Fargateはインデックスのあるレイヤーを遅延読み込みし、イメージ全体のpullを待たずにコンテナを起動する。
+    イメージは devtools/web/publish-soci.sh で公開する
+    """
+
+    validate_image_architecture: bool = True
+    """synth時に、container_image()で指定したイメージがIResource.cpu_architectureに対応しているかを
+    レジストリに問い合わせて検証する。IResource.offlineの場合は検証しない
+    """
+
     def __init__(self, scope: Construct, id: str, **kwargs):
         """
         ルールベースのALBに紐づくFargate Serviceを構築するStack
@@ -72,28 +509,609 @@ class FargateServicePattern(Stack):
 
         """
         super().__init__(scope, id, **kwargs)
+        self.registry_images: list[str] = []
+        """container_image()で指定されたイメージ名のリスト"""
+        self.log_group: logs.LogGroup = None
+        """create_log_group()で作成したロググループ。サイドカーのログにも使う"""
+        self.log_archive_bucket: s3.Bucket = None
+        """create_log_router()で作成したログのアーカイブ先"""
+        self.log_routers: dict[str, ecs.FirelensLogRouter] = {}
+        """タスク定義のパス -> create_log_router()で追加したログルーター"""
+        self.profiles_bucket: s3.Bucket = None
+        """create_profiling()で作成したプロファイルの保存先"""
+        self.export_queue: sqs.Queue = None
+        """create_export_worker()で作成したジョブのキュー"""
+        self.distribution: cloudfront.Distribution = None
+        """create_distribution()で作成したCloudFrontディストリビューション"""
+        self.endpoints: VpcEndpoints = None
+        """create_vpc_endpoints()で用意したVPCエンドポイント"""
+        self.load_balancer: elb.IApplicationLoadBalancer = None
+        """shared_load_balancer()で参照した共通ALB"""
+        self.warmup_hook: lambda_.Function = None
+        """create_warmup_hook()で作成したBlue/Greenデプロイのライフサイクルフック"""
+
+    def container_image(self, image: str) -> ecs.ContainerImage:
+        """レジストリのイメージを取得する。
+        イメージはsynth時にタスクのCPUアーキテクチャに対応しているかが検証される。
+        self.pull_through_cacheの場合、IResource.pull_through_cache_prefixesにあるレジストリのイメージは
+        ECRのプルスルーキャッシュから取得する。
+
+        Args:
+            image (str): イメージ名(例: ghcr.io/owner/name:tag)
+
+        Returns:
+            ecs.ContainerImage: ContainerImage
+        """
+        self.registry_images.append(image)
+        if self.pull_through_cache:
+            prefix = (self.rs.pull_through_cache_prefixes or {}).get(parse_image(image)[0])
+            if prefix is not None:
+                return DefaultPatterns(self).pull_through_image(image, prefix)
+        return ecs.ContainerImage.from_registry(image)
+
+    def soci_image(self, image: str) -> ecs.ContainerImage:
+        """self.soci_repositoryの場合に、SOCIインデックス付きでECRに公開したイメージを取得する。
+        それ以外はcontainer_image()と同じ。
+
+        Args:
+            image (str): 公開元のイメージ名(例: ghcr.io/owner/name:tag)
+
+        Returns:
+            ecs.ContainerImage: ContainerImage
+        """
+        if not self.soci_repository:
+            return self.container_image(image)
+        # ECRのイメージは公開元から変換したものなので、CPUアーキテクチャは公開元で検証する
+        self.registry_images.append(image)
+        return DefaultPatterns(self).ecr_image(self.soci_repository, parse_image(image)[2])
+
+    def create_vpc_endpoints(self, id: str) -> VpcEndpoints:
+        """タスクの起動に使うAWSサービスのVPCエンドポイントを用意します(Stackで1度だけ作成)。
+
+        Args:
+            id (str): Stack固有のID
+
+        Returns:
+            VpcEndpoints: VPCエンドポイント。サービスはこれに依存させる
+        """
+        if self.endpoints is None:
+            self.endpoints = VpcEndpoints(self, f"{id}-endpoints", self.rs)
+        return self.endpoints
+
+    def task_size(self) -> tuple[int, int]:
+        """タスクのcpuとmemoryを返します。
+
+        Attributes:
+            self.sizing_tier (str): 指定した場合はIResourceのcpu_{tier}/memory_{tier}
+            self.cpu (int): sizing_tier未指定時のcpu
+            self.memory_limit_mib (int): sizing_tier未指定時のmemory
+
+        Returns:
+            tuple[int, int]: (cpu, memory_limit_mib)
+        """
+        if self.sizing_tier is None:
+            return self.cpu, self.memory_limit_mib
+        if self.sizing_tier not in ("small", "medium", "large"):
+            raise ValueError(f"unknown sizing_tier: {self.sizing_tier}")
+        return getattr(self.rs, f"cpu_{self.sizing_tier}"), getattr(self.rs, f"memory_{self.sizing_tier}")
+
+    def php_runtime_environment(self) -> dict[str, str]:
+        """タスクサイズから、PHP/Apacheのランタイム設定を算出してコンテナの環境変数として返します。
+        devtools/webのイメージは、これらの環境変数をphp.iniとApacheのMPM設定に反映します。
+
+        - APCu: メモリの1/8 (32〜512MiB)
+        - OPcache: メモリの1/16 (64〜256MiB)
+        - 残りをワーカーに割り当て、memory_limitはその1/2 (256〜1024MiB)
+        - ワーカー数は、残りのメモリとvCPU数の両方から上限を決める (4〜150)
+        - keep_alive_timeoutを指定した場合は、Apacheのkeep-aliveのタイムアウト
+        - warmupの場合は、起動時のウォームアップとそのリクエストのパス
+        - preload_datasets/preload_tablesを指定した場合は、デプロイ時にプリロードするメタデータ
+
+        Returns:
+            dict[str, str]: コンテナの環境変数
+        """
+        cpu, memory = self.task_size()
+
+        def clamp(value, lower, upper):
+            return max(lower, min(upper, value))
+
+        apcu = clamp(memory // 8, 32, 512)
+        opcache = clamp(memory // 16, 64, 256)
+        available = memory - apcu - opcache - APACHE_BASE_MEMORY
+        memory_limit = clamp(available // 2, 256, 1024)
+        workers = clamp(min(available // PHP_WORKER_MEMORY, cpu * PHP_WORKERS_PER_VCPU // 1024), 4, 150)
+        spare = max(2, workers // 4)
+
+        environment = {
+            "PHP_MEMORY_LIMIT": f"{memory_limit}M",
+            "PHP_APC_SHM_SIZE": f"{apcu}M",
+            "PHP_OPCACHE_MEMORY_CONSUMPTION": str(opcache),
+            # イメージ内のコードは変更されないため、タイムスタンプの検証を省く
+            "PHP_OPCACHE_VALIDATE_TIMESTAMPS": "0",
+            "APACHE_START_SERVERS": str(spare),
+            "APACHE_MIN_SPARE_SERVERS": str(spare),
+            "APACHE_MAX_SPARE_SERVERS": str(min(workers, spare * 2)),
+            "APACHE_MAX_REQUEST_WORKERS": str(workers),
+        }
+        if self.keep_alive_timeout is not None:
+            if self.keep_alive_timeout <= self.rs.alb_idle_timeout:
+                raise ValueError(
+                    f"keep_alive_timeout({self.keep_alive_timeout}) must be longer than "
+                    f"the ALB idle timeout ({self.rs.alb_idle_timeout}s)"
+                )
+            environment["APACHE_KEEPALIVE_TIMEOUT"] = str(self.keep_alive_timeout)
+        if self.warmup:
+            environment["ADMINER_WARMUP"] = "true"
+            if self.warmup_paths:
+                environment["ADMINER_WARMUP_PATHS"] = " ".join(self.warmup_paths)
+        if self.preload_datasets:
+            environment["ADMINER_PRELOAD_DATASETS"] = " ".join(self.preload_datasets)
+        if self.preload_tables:
+            environment["ADMINER_PRELOAD_TABLES"] = " ".join(self.preload_tables)
+        return environment
+
+    def create_log_group(self, id: str) -> logs.LogGroup:
+        """コンテナログのロググループを構築します。
+        EMFのログはCloudWatch Logsがメトリクスにするため、メトリクスフィルタは作成しません。
+
+        Attributes:
+            self.log_retention (logs.RetentionDays): 保持期間
+
+        Args:
+            id (str): Stack固有のID
+
+        Returns:
+            logs.LogGroup: ロググループ。container_logging()の送信先
+        """
+        log_group = logs.LogGroup(self, f"{id}-logs", retention=self.log_retention)
+        self.log_group = log_group
+        return log_group
+
+    def container_logging(self, id: str, task_def: ecs.TaskDefinition, name: str) -> ecs.LogDriver:
+        """コンテナのログ設定を返します。create_log_group()の後に呼び出します。
+        ログの送信が遅れても、アプリケーションのリクエストを待たせないようにします。
+
+        - awslogs: log_non_blockingの場合はnon-blockingモードで、log_max_buffer_sizeまでメモリに溜める
+        - firelens: タスク定義にログルーターを追加し(create_log_router())、ルーターに転送する
+
+        Attributes:
+            self.log_driver (str): "awslogs" または "firelens"
+            self.log_non_blocking (bool): awslogsをnon-blockingモードにする
+            self.log_max_buffer_size (int): non-blockingモードのバッファサイズ(MiB)
+            self.log_group (logs.LogGroup): 送信先のロググループ
+
+        Args:
+            id (str): Stack固有のID
+            task_def (ecs.TaskDefinition): コンテナを追加するタスク定義
+            name (str): コンテナの識別名。ログストリームのprefixに使う
+
+        Returns:
+            ecs.LogDriver: LogDriver
+        """
+        if self.log_driver not in LOG_DRIVERS:
+            raise ValueError(f"log_driver must be one of {LOG_DRIVERS}: {self.log_driver}")
+        if self.log_driver == "firelens":
+            self.create_log_router(id, task_def)
+            return ecs.LogDrivers.firelens(options={})
+        return self.aws_logs(f"{id}-container-{name}")
+
+    def aws_logs(self, stream_prefix: str) -> ecs.LogDriver:
+        """self.log_groupへ送るawslogsのログ設定を返します。
+
+        Args:
+            stream_prefix (str): ログストリームのprefix
+
+        Returns:
+            ecs.LogDriver: LogDriver
+        """
+        if not self.log_non_blocking:
+            return ecs.LogDriver.aws_logs(stream_prefix=stream_prefix, log_group=self.log_group)
+        return ecs.LogDriver.aws_logs(
+            stream_prefix=stream_prefix,
+            log_group=self.log_group,
+            mode=ecs.AwsLogDriverMode.NON_BLOCKING,
+            max_buffer_size=Size.mebibytes(self.log_max_buffer_size),
+        )
+
+    def create_log_router(self, id: str, task_def: ecs.TaskDefinition) -> ecs.FirelensLogRouter:
+        """タスク定義にFireLensのログルーター(Fluent Bit)を追加します(タスク定義ごとに1度だけ)。
+        ルーターはFLUENT_BIT_CONFIGの設定で、log_exclude_patternに一致する行を捨ててから
+        CloudWatch Logsへまとめて送信し、log_archive_s3の場合はS3にもアップロードします。
+        ルーター自身のログはawslogsで送ります。
+
+        Attributes:
+            self.log_router_image (str): Fluent Bitのイメージ
+            self.log_router_memory (int): メモリ予約(MiB)
+            self.log_exclude_pattern (str): 送信前に捨てるログ行の正規表現
+            self.log_archive_s3 (bool): S3にもログを保存する
+            self.log_archive_retention_days (int): S3に保存したログの保持期間(日)
+
+        Args:
+            id (str): Stack固有のID
+            task_def (ecs.TaskDefinition): ルーターを追加するタスク定義
+
+        Returns:
+            ecs.FirelensLogRouter: ログルーター
+        """
+        path = task_def.node.path
+        if path in self.log_routers:
+            return self.log_routers[path]
+
+        config = FLUENT_BIT_CONFIG.read_text()
+        environment = {
+            "AWS_REGION": self.region,
+            "LOG_GROUP_NAME": self.log_group.log_group_name,
+            "LOG_STREAM_PREFIX": f"{id}-",
+            "LOG_EXCLUDE_PATTERN": self.log_exclude_pattern,
+        }
+        if self.log_archive_s3:
+            if self.log_archive_bucket is None:
+                self.log_archive_bucket = s3.Bucket(
+                    self,
+                    f"{id}-log-archive",
+                    block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+                    encryption=s3.BucketEncryption.S3_MANAGED,
+                    enforce_ssl=True,
+                    lifecycle_rules=[s3.LifecycleRule(expiration=Duration.days(self.log_archive_retention_days))],
+                )
+            config += FLUENT_BIT_S3_CONFIG.read_text()
+            environment["LOG_ARCHIVE_BUCKET"] = self.log_archive_bucket.bucket_name
+            self.log_archive_bucket.grant_put(task_def.task_role)
+        environment["ADMINER_FLUENT_BIT_CONFIG"] = config
+        self.log_group.grant_write(task_def.task_role)
+
+        router = task_def.add_firelens_log_router(
+            f"{task_def.node.id}-log-router",
+            container_name="log-router",
+            image=self.container_image(self.log_router_image),
+            firelens_config=ecs.FirelensConfig(
+                type=ecs.FirelensLogRouterType.FLUENTBIT,
+                options=ecs.FirelensOptions(
+                    config_file_type=ecs.FirelensConfigFileType.FILE,
+                    config_file_value=FLUENT_BIT_CONFIG_PATH,
+                    enable_ecs_log_metadata=True,
+                ),
+            ),
+            # Fargateは設定ファイルをイメージ内からしか読めないため、環境変数の設定を書き出してから起動する
+            command=[
+                "/bin/sh",
+                "-c",
+                f'printf "%s" "$ADMINER_FLUENT_BIT_CONFIG" > {FLUENT_BIT_CONFIG_PATH} && exec /entrypoint.sh',
+            ],
+            environment=environment,
+            memory_reservation_mib=self.log_router_memory,
+            logging=self.aws_logs(f"{id}-container-log-router"),
+        )
+        self.log_routers[path] = router
+        return router
+
+    def metrics_environment(self, id: str) -> dict[str, str]:
+        """EMFでメトリクスを出力するための、コンテナの環境変数を返します。
+
+        Args:
+            id (str): Stack固有のID。メトリクスのディメンションServiceの値になる
+
+        Returns:
+            dict[str, str]: コンテナの環境変数。metrics_namespaceが未指定の場合は空
+        """
+        if self.metrics_namespace is None:
+            return {}
+        return {"BIGQUERY_METRICS_NAMESPACE": self.metrics_namespace, "BIGQUERY_METRICS_SERVICE": id}
+
+    def log_metric(self, id: str, name: str, **kwargs) -> cw.Metric:
+        """アプリケーションがEMFで出力したメトリクスを返します。
+
+        Args:
+            id (str): Stack固有のID。metrics_environment()で渡したディメンションServiceの値
+            name (str): メトリクス名
+            **kwargs: cw.Metricの引数(period, statistic, labelなど)
+
+        Returns:
+            cw.Metric: metrics_namespaceのメトリクス
+        """
+        return cw.Metric(namespace=self.metrics_namespace, metric_name=name, dimensions_map={"Service": id}, **kwargs)
+
+    def create_task_role(self, id: str) -> iam.IRole:
+        """タスクロールを返します。
+        self.task_roleが未指定で、IAM権限が必要な機能(tracing, profiling, export_worker, firelens)を使う場合は、
+        Stack固有のロールを作成します。
+        共通のIResource.task_roleは変更不可(mutable=False)としてimportしているため、権限を追加できません。
+
+        Attributes:
+            self.task_role (iam.Role): タスクに紐づけるIAMロール。作成したロールもここに格納する
+            self.tracing (bool): トレース用サイドカーを使う
+            self.profiling (bool): プロファイルをS3へ転送する
+            self.export_worker (bool): エクスポートのジョブをSQSに登録する
+            self.log_driver (str): "firelens"の場合はログルーターがCloudWatch Logs/S3へ書き込む
+
+        Args:
+            id (str): Stack固有のID
+
+        Returns:
+            iam.IRole: タスクロール
+        """
+        uses_role = self.tracing or self.profiling or self.export_worker or self.log_driver == "firelens"
+        if self.task_role is None and uses_role:
+            self.task_role = iam.Role(
+                self,
+                f"{id}-task-role",
+                assumed_by=iam.ServicePrincipal("ecs-tasks.amazonaws.com"),
+                description=f"{id} task role",
+            )
+        return self.task_role if self.task_role is not None else self.rs.task_role
 
     def create_ecs_task_def(self, id):
         """TaskDefinitionの構築
+        self.tracingの場合はトレース用サイドカーも追加します。
 
         Args:
             id (_type_): cdk上で一意のID
         """
 
+        cpu, memory_limit_mib = self.task_size()
         task_def = ecs.FargateTaskDefinition(
             self,
             f"{id}-def",
-            cpu=self.cpu,
-            memory_limit_mib=self.memory_limit_mib,
+            cpu=cpu,
+            memory_limit_mib=memory_limit_mib,
             execution_role=self.rs.execution_role,
-            task_role=self.task_role if self.task_role is not None else self.rs.task_role,
+            task_role=self.create_task_role(id),
             runtime_platform=ecs.RuntimePlatform(
                 operating_system_family=ecs.OperatingSystemFamily.LINUX,
                 cpu_architecture=self.rs.cpu_architecture,
             ),
         )
+        if self.tracing:
+            self.create_tracing_sidecar(id, task_def)
+        if self.validate_image_architecture and not self.rs.offline:
+            task_def.node.add_validation(ImageArchitectureValidation(self.registry_images, self.rs.cpu_architecture))
         return task_def
 
+    def create_tracing_sidecar(self, id: str, task_def: ecs.FargateTaskDefinition) -> ecs.ContainerDefinition:
+        """ADOT collectorのサイドカーを追加し、タスクロールにX-Rayへの書き込み権限を付与します。
+        collectorはOTEL_COLLECTOR_CONFIGの設定で、同じタスクのコンテナからlocalhostでOTLP/HTTPを受け付けます。
+        collectorが停止してもアプリケーションは止めないよう、essentialにはしません。
+
+        Attributes:
+            self.tracing_collector_image (str): ADOT collectorのイメージ
+            self.tracing_collector_memory (int): メモリ予約(MiB)
+            self.log_driver (str): collectorのログもcontainer_logging()の設定で送る
+
+        Args:
+            id (str): Stack固有のID
+            task_def (ecs.FargateTaskDefinition): タスク定義
+
+        Returns:
+            ecs.ContainerDefinition: collectorのコンテナ
+        """
+        task_def.task_role.add_managed_policy(iam.ManagedPolicy.from_aws_managed_policy_name("AWSXrayWriteOnlyAccess"))
+        return task_def.add_container(
+            f"{id}-otel",
+            container_name="otel-collector",
+            image=self.container_image(self.tracing_collector_image),
+            essential=False,
+            memory_reservation_mib=self.tracing_collector_memory,
+            environment={"AOT_CONFIG_CONTENT": OTEL_COLLECTOR_CONFIG.read_text()},
+            logging=self.container_logging(id, task_def, "otel"),
+            health_check=ecs.HealthCheck(command=["/healthcheck"]),
+        )
+
+    def profiling_image(self, image: str) -> str:
+        """profilingの場合に、プロファイリング用イメージの名前を返します。
+
+        Args:
+            image (str): 通常のイメージ名(例: ghcr.io/owner/name:tag)
+
+        Returns:
+            str: profilingの場合は<tag>にprofiling_image_suffixを付けたイメージ名。それ以外はimageのまま
+        """
+        return f"{image}{self.profiling_image_suffix}" if self.profiling else image
+
+    def create_profiling(
+        self, id: str, task_def: ecs.FargateTaskDefinition, container: ecs.ContainerDefinition
+    ) -> s3.Bucket:
+        """プロファイルの保存先バケットと、S3へ転送するサイドカーを構築します。
+        アプリケーションコンテナにはプロファイラの環境変数と、サイドカーと共有するボリュームを追加します。
+
+        Attributes:
+            self.profiling_sample_hz (int): 1秒あたりのサンプリング回数
+            self.profiling_request_rate (float): プロファイルするリクエストの割合
+            self.profiling_retention_days (int): 保持期間(日)
+            self.profiling_sidecar_image (str): サイドカーのイメージ
+            self.profiling_upload_interval (int): 転送間隔(秒)
+
+        Args:
+            id (str): Stack固有のID
+            task_def (ecs.FargateTaskDefinition): タスク定義
+            container (ecs.ContainerDefinition): プロファイラ入りのイメージのコンテナ
+
+        Returns:
+            s3.Bucket: プロファイルの保存先
+        """
+        bucket = s3.Bucket(
+            self,
+            f"{id}-profiles",
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            enforce_ssl=True,
+            lifecycle_rules=[s3.LifecycleRule(expiration=Duration.days(self.profiling_retention_days))],
+        )
+        bucket.grant_put(task_def.task_role)
+        self.profiles_bucket = bucket
+
+        task_def.add_volume(name="profiles")
+        mount = ecs.MountPoint(container_path=PROFILES_PATH, source_volume="profiles", read_only=False)
+        container.add_mount_points(mount)
+        container.add_environment("ADMINER_PROFILING_HZ", str(self.profiling_sample_hz))
+        container.add_environment("ADMINER_PROFILING_REQUEST_RATE", str(self.profiling_request_rate))
+        container.add_environment("ADMINER_PROFILING_DIR", PROFILES_PATH)
+
+        # 書き込み中の *.tmp を除き、転送済みのファイルはタスクのストレージから削除する
+        upload = (
+            f"while true; do sleep {self.profiling_upload_interval}; "
+            f"aws s3 mv {PROFILES_PATH} s3://{bucket.bucket_name}/{id}/ --recursive --exclude '*.tmp' --only-show-errors; "
+            "done"
+        )
+        sidecar = task_def.add_container(
+            f"{id}-profiles-upload",
+            container_name="profiles-upload",
+            image=self.container_image(self.profiling_sidecar_image),
+            essential=False,
+            memory_reservation_mib=64,
+            entry_point=["sh", "-c"],
+            command=[upload],
+            logging=self.container_logging(id, task_def, "profiles"),
+        )
+        sidecar.add_mount_points(mount)
+        return bucket
+
+    def tracing_environment(self, id: str) -> dict[str, str]:
+        """トレースを送信するための、アプリケーションコンテナの環境変数を返します。
+
+        Args:
+            id (str): Stack固有のID。service.nameになる
+
+        Returns:
+            dict[str, str]: コンテナの環境変数。tracingでない場合は空
+        """
+        if not self.tracing:
+            return {}
+        return {
+            "OTEL_EXPORTER_OTLP_ENDPOINT": f"http://localhost:{OTEL_COLLECTOR_PORT}",
+            "OTEL_SERVICE_NAME": id,
+            "OTEL_TRACES_SAMPLER_ARG": str(self.tracing_sample_rate),
+        }
+
+    def create_export_worker(
+        self, id: str, task_def: ecs.FargateTaskDefinition, image: ecs.ContainerImage, environment: dict[str, str]
+    ) -> dict[str, str]:
+        """エクスポートのジョブを処理するワーカーサービスと、ジョブのキュー・保存先バケットを構築します。
+        Webのタスクはジョブをキューに登録して署名付きURLを返し、ワーカー(export-worker.php)が
+        データを読み出してバケットに書き込みます。大きなエクスポートでWebのワーカーを占有しません。
+
+        ワーカーはキューのジョブ数(処理中を含む)でステップスケーリングし、ジョブが無い間は0タスクです。
+        失敗したジョブは可視性タイムアウト後に再試行し、export_max_receive_count回を超えるとDLQに移します。
+
+        Attributes:
+            self.export_worker_cpu (int): ワーカーのタスクのcpu
+            self.export_worker_memory (int): ワーカーのタスクのmemory
+            self.export_worker_max_capacity (int): ワーカーの最大タスク数
+            self.export_job_timeout (int): 1ジョブの最長の処理時間(秒)
+            self.export_max_receive_count (int): ジョブの最大試行回数
+            self.export_retention_days (int): エクスポートファイルの保持期間(日)
+            self.export_url_ttl (int): 署名付きURLの有効期間(秒)
+
+        Args:
+            id (str): Stack固有のID
+            task_def (ecs.FargateTaskDefinition): ジョブを登録するWebのタスク定義
+            image (ecs.ContainerImage): Webと同じイメージ
+            environment (dict[str, str]): Webのコンテナの環境変数。BigQueryの認証設定をワーカーでも使う
+
+        Returns:
+            dict[str, str]: Webのコンテナに追加する環境変数
+        """
+        dlq = sqs.Queue(
+            self,
+            f"{id}-export-dlq",
+            encryption=sqs.QueueEncryption.SQS_MANAGED,
+            enforce_ssl=True,
+            retention_period=Duration.days(14),
+        )
+        queue = sqs.Queue(
+            self,
+            f"{id}-export-queue",
+            encryption=sqs.QueueEncryption.SQS_MANAGED,
+            enforce_ssl=True,
+            visibility_timeout=Duration.seconds(self.export_job_timeout),
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=self.export_max_receive_count, queue=dlq),
+        )
+        self.export_queue = queue
+        bucket = s3.Bucket(
+            self,
+            f"{id}-exports",
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            enforce_ssl=True,
+            lifecycle_rules=[s3.LifecycleRule(expiration=Duration.days(self.export_retention_days))],
+        )
+        export_environment = {
+            "BIGQUERY_EXPORT_QUEUE_URL": queue.queue_url,
+            "BIGQUERY_EXPORT_BUCKET": bucket.bucket_name,
+            "BIGQUERY_EXPORT_REGION": self.region,
+            "BIGQUERY_EXPORT_URL_TTL": str(self.export_url_ttl),
+        }
+
+        worker_def = ecs.FargateTaskDefinition(
+            self,
+            f"{id}-export-def",
+            cpu=self.export_worker_cpu,
+            memory_limit_mib=self.export_worker_memory,
+            execution_role=self.rs.execution_role,
+            task_role=iam.Role(
+                self,
+                f"{id}-export-role",
+                assumed_by=iam.ServicePrincipal("ecs-tasks.amazonaws.com"),
+                description=f"{id} export worker task role",
+            ),
+            runtime_platform=ecs.RuntimePlatform(
+                operating_system_family=ecs.OperatingSystemFamily.LINUX,
+                cpu_architecture=self.rs.cpu_architecture,
+            ),
+        )
+        worker_def.add_container(
+            f"{id}-export-worker",
+            container_name="export-worker",
+            image=image,
+            command=["php", "/var/www/html/plugins/drivers/bigquery/export-worker.php"],
+            environment={**environment, **export_environment},
+            logging=self.container_logging(id, worker_def, "export"),
+            # SIGTERMを受けたワーカーが処理中のジョブをキューに戻す猶予(ジョブの完了は待たない)
+            stop_timeout=Duration.seconds(FARGATE_MAX_STOP_TIMEOUT),
+        )
+        queue.grant_consume_messages(worker_def.task_role)
+        bucket.grant_put(worker_def.task_role)
+        # Webのタスクロールの認証情報で署名付きURLを発行するため、読み取り権限も付与する
+        queue.grant_send_messages(task_def.task_role)
+        bucket.grant_read(task_def.task_role)
+
+        service = ecs.FargateService(
+            self,
+            f"{id}-export-service",
+            cluster=self.rs.cluster,
+            task_definition=worker_def,
+            security_groups=[self.rs.sg_default],
+            desired_count=0,
+            service_name=f"{id}-export-service",
+            vpc_subnets=self.rs.private_subnets,
+            enable_execute_command=True,
+            capacity_provider_strategies=self.capacity_provider_strategies(),
+        )
+        if self.vpc_endpoints:
+            service.node.add_dependency(self.create_vpc_endpoints(id))
+        # 処理中のジョブも数え、実行中のタスクをスケールインしない
+        period = Duration.seconds(self.monitoring_period)
+        backlog = cw.MathExpression(
+            expression="visible + inflight",
+            using_metrics={
+                "visible": queue.metric_approximate_number_of_messages_visible(period=period),
+                "inflight": queue.metric_approximate_number_of_messages_not_visible(period=period),
+            },
+            period=period,
+        )
+        steps = [appscaling.ScalingInterval(upper=0, change=0), appscaling.ScalingInterval(lower=1, change=1)]
+        if self.export_worker_max_capacity > 1:
+            steps.append(
+                appscaling.ScalingInterval(lower=self.export_worker_max_capacity, change=self.export_worker_max_capacity)
+            )
+        scaling = service.auto_scale_task_count(min_capacity=0, max_capacity=self.export_worker_max_capacity)
+        scaling.scale_on_metric(
+            f"{id}-export-scaling",
+            metric=backlog,
+            adjustment_type=appscaling.AdjustmentType.EXACT_CAPACITY,
+            scaling_steps=steps,
+        )
+        return export_environment
+
     def create_ecs_service_elb(self, id: str, task_def: ecs.FargateTaskDefinition, service_container_name: str):
         """ECSサービスと対応するターゲットグループを構築。
         ホスト名でルーティングするルールベースのALB Listenerに紐づけます。
@@ -104,9 +1122,17 @@ class FargateServicePattern(Stack):
             self.health_check_grace_period (int): 初回起動時の監視待機時間(秒)
             self.port (int): HTTPポート
             self.health_check_path (str): helth check対象のパス
+            self.health_check_interval など: ALBのヘルスチェックの設定。target_health_check()を参照
             self.deregistration_delay (int): targetを登録解除する前に Elastic Load Balancing が待機する時間。
             self.alb_priority (int): target ruleの優先順位
             self.fqdn (str): Route53に登録するホスト名
+            self.min_capacity (int): オートスケーリングの最小タスク数
+            self.max_capacity (int): オートスケーリングの最大タスク数
+            self.fargate_spot_weight (int): FARGATE_SPOTの重み
+            self.deployment_profile など: デプロイの設定。deployment_options()を参照
+            self.load_balancing_algorithm など: ターゲットグループの設定。target_group_options()を参照
+            self.vpc_endpoints (bool): VPCエンドポイントを用意し、サービスを依存させる
+            self.blue_green (bool): Blue/Greenデプロイにする。create_blue_green()を参照
 
         Args:
             id (str): Stak固有のID
@@ -124,61 +1150,710 @@ class FargateServicePattern(Stack):
             vpc_subnets=self.rs.private_subnets,
             enable_execute_command=True,
             health_check_grace_period=Duration.seconds(self.health_check_grace_period),
+            capacity_provider_strategies=self.capacity_provider_strategies(),
+            **self.deployment_options(),
         )
+        if self.vpc_endpoints:
+            service.node.add_dependency(self.create_vpc_endpoints(id))
+
+        target_group = self.create_target_group(f"{id}-tg", target_group_name(id, "target"))
 
-        targets = service.load_balancer_target(
-            container_name=service_container_name,
-            container_port=self.port,
+        if self.rs.offline:
+            listener_arn = self.rs.listener_arn
+        else:
+            listener_arn = ssm.StringParameter.value_from_lookup(self, self.rs.listener_name)
+        listerner = elb.ApplicationListener.from_application_listener_attributes(
+            self,
+            f"{id}-listener",
+            listener_arn=listener_arn,
+            security_group=self.rs.sg_alb,
         )
+        priority = self.listener_priority(listener_arn, self.host_headers)
+        if self.blue_green:
+            self.create_blue_green(id, service, service_container_name, target_group, listerner, priority)
+        else:
+            target_group.add_target(
+                service.load_balancer_target(container_name=service_container_name, container_port=self.port)
+            )
+            listerner.add_target_groups(
+                f"{id}-tg-list",
+                target_groups=[target_group],
+                conditions=[elb.ListenerCondition.host_headers(self.host_headers)],
+                priority=priority,
+            )
 
+        if self.max_capacity is not None:
+            self.create_auto_scaling(id, service, target_group)
+        elif self.scaling_schedules:
+            raise ValueError("scaling_schedules requires max_capacity")
+        if self.monitoring:
+            self.create_monitoring(id, service, target_group)
+        return service
+
+    def create_target_group(self, construct_id: str, target_group_name: str) -> elb.ApplicationTargetGroup:
+        """サービスのタスクを登録するターゲットグループを構築します。
+
+        Attributes:
+            self.port (int): HTTPポート
+            self.health_check_path など: ALBのヘルスチェックの設定。target_health_check()を参照
+            self.load_balancing_algorithm など: ルーティングの設定。target_group_options()を参照
+            self.target_group_attributes (dict[str, str]): 追加で設定する属性
+
+        Args:
+            construct_id (str): Construct ID
+            target_group_name (str): ターゲットグループ名
+
+        Returns:
+            elb.ApplicationTargetGroup: ターゲットグループ
+        """
         target_group = elb.ApplicationTargetGroup(
             self,
-            f"{id}-tg",
-            target_group_name=f"{id}-target",
-            targets=[targets],
-            health_check=elb.HealthCheck(
-                path=self.health_check_path,
-                healthy_http_codes="200,302",
-            ),
+            construct_id,
+            target_group_name=target_group_name,
+            target_type=elb.TargetType.IP,
+            health_check=self.target_health_check(),
             port=self.port,
             protocol=elb.ApplicationProtocol.HTTP,
             vpc=self.rs.vpc,
-            deregistration_delay=Duration.seconds(self.deregistration_delay),
+            deregistration_delay=Duration.seconds(self.drain_delay()),
+            **self.target_group_options(),
         )
+        for key, value in (self.target_group_attributes or {}).items():
+            target_group.set_attribute(key, value)
+        return target_group
 
-        listener_arn = ssm.StringParameter.value_from_lookup(self, self.rs.listener_name)
-        listerner = elb.ApplicationListener.from_application_listener_attributes(
+    def create_blue_green(
+        self,
+        id: str,
+        service: ecs.FargateService,
+        container_name: str,
+        target_group: elb.ApplicationTargetGroup,
+        listener: elb.IApplicationListener,
+        priority: int,
+    ) -> lambda_.Function:
+        """ECSのBlue/Greenデプロイを構築します。
+
+        - 新しいタスクは2つ目のターゲットグループ(`<id>-green`)に起動し、デプロイごとに役割が入れ替わる
+        - テスト用listener(blue_green_test_port)のルールを先に新しいタスクへ切り替え、
+          POST_TEST_TRAFFIC_SHIFTでcreate_warmup_hook()のフックが各タスクのキャッシュを温める
+        - フックが成功した後に本番のルールを切り替え、失敗した場合は旧タスクのままロールバックする
+
+        Attributes:
+            self.blue_green_test_port (int): テスト用listenerのポート
+            self.host_headers (list[str]): 本番/テスト用のルールのホスト名
+            self.scaling_requests_per_target (int): 指定できない。RequestCountPerTargetは片方のターゲットグループしか計測しないため
+
+        Args:
+            id (str): Stack固有のID
+            service (ecs.FargateService): 対象のECSサービス
+            container_name (str): HTTPポートを開放しているコンテナの名前
+            target_group (elb.ApplicationTargetGroup): 初回に本番のトラフィックを受けるターゲットグループ
+            listener (elb.IApplicationListener): 共通ALBの本番のlistener
+            priority (int): 本番のルールの優先順位
+
+        Returns:
+            lambda_.Function: ライフサイクルフック
+        """
+        if self.blue_green_test_port is None:
+            raise ValueError("blue_green requires blue_green_test_port")
+        if self.max_capacity is not None and self.scaling_requests_per_target is not None:
+            raise ValueError("scaling_requests_per_target cannot be combined with blue_green")
+
+        green_target_group = self.create_target_group(f"{id}-tg-green", target_group_name(id, "green"))
+        conditions = [elb.ListenerCondition.host_headers(self.host_headers)]
+        production_rule = elb.ApplicationListenerRule(
             self,
-            f"{id}-listener",
-            listener_arn=listener_arn,
-            security_group=self.rs.sg_alb,
-        )
-        listerner.add_target_groups(
             f"{id}-tg-list",
+            listener=listener,
+            priority=priority,
+            conditions=conditions,
             target_groups=[target_group],
-            conditions=[elb.ListenerCondition.host_headers(self.host_headers)],
-            priority=self.listener_priority(listener_arn, self.host_headers),
         )
-        return service
+        test_listener = self.shared_load_balancer(id).add_listener(
+            f"{id}-test-listener",
+            port=self.blue_green_test_port,
+            protocol=elb.ApplicationProtocol.HTTP,
+            # 共通ALBのセキュリティグループは変更しない。テスト用listenerへのアクセスは個別に許可する
+            open=False,
+            default_action=elb.ListenerAction.fixed_response(404),
+        )
+        test_rule = elb.ApplicationListenerRule(
+            self,
+            f"{id}-test-rule",
+            listener=test_listener,
+            priority=1,
+            conditions=conditions,
+            target_groups=[target_group],
+        )
+        target_group.add_target(
+            service.load_balancer_target(
+                container_name=container_name,
+                container_port=self.port,
+                alternate_target=ecs.AlternateTarget(
+                    f"{id}-alternate-target",
+                    alternate_target_group=green_target_group,
+                    production_listener=ecs.ListenerRuleConfiguration.application_listener_rule(production_rule),
+                    test_listener=ecs.ListenerRuleConfiguration.application_listener_rule(test_rule),
+                ),
+            )
+        )
+
+        hook = self.create_warmup_hook(id, test_rule)
+        service.add_lifecycle_hook(
+            ecs.DeploymentLifecycleLambdaTarget(
+                hook,
+                f"{id}-warmup-hook",
+                lifecycle_stages=[ecs.DeploymentLifecycleStage.POST_TEST_TRAFFIC_SHIFT],
+            )
+        )
+        return hook
+
+    def create_warmup_hook(self, id: str, test_rule: elb.ApplicationListenerRule) -> lambda_.Function:
+        """Blue/Greenデプロイで、本番のトラフィックを切り替える前に新しいタスクを温めるLambdaを構築します。
+        (functions/blue_green_warmup)
+
+        テスト用listenerのルールが転送しているターゲットグループから新しいタスクを特定し、
+        ALBを経由せずに各タスクの `/warmup?preload=1` をApacheの起動済みワーカー数だけ並列に呼び出します。
+        OPcacheに加え、BigQueryのデータセット一覧・テーブル一覧・スキーマ(preload_datasets/preload_tables)と、
+        各ワーカーの接続プールのクライアント・サービスアカウントのアクセストークンが用意されます。
+        Lambdaはprivate subnetで実行し、sg_defaultにLambdaからのHTTPポートへのアクセスを許可します。
+
+        Attributes:
+            self.rs (IResource): 既存リソース(vpc, private_subnets, sg_default を使う)
+            self.port (int): タスクのHTTPポート
+            self.log_retention (logs.RetentionDays): Lambdaのログの保持期間
+
+        Args:
+            id (str): Stack固有のID
+            test_rule (elb.ApplicationListenerRule): テスト用listenerのルール
+
+        Returns:
+            lambda_.Function: ライフサイクルフック
+        """
+        security_group = ec2.SecurityGroup(
+            self,
+            f"{id}-warmup-hook-sg",
+            vpc=self.rs.vpc,
+            description=f"{id} blue/green warm-up hook",
+        )
+        self.rs.sg_default.add_ingress_rule(security_group, ec2.Port.tcp(self.port), f"{id} warm-up hook")
+
+        hook = lambda_.Function(
+            self,
+            f"{id}-warmup-hook",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            handler="index.handler",
+            code=lambda_.Code.from_asset(str(WARMUP_HOOK_CODE)),
+            timeout=Duration.seconds(WARMUP_HOOK_TIMEOUT),
+            vpc=self.rs.vpc,
+            vpc_subnets=self.rs.private_subnets,
+            security_groups=[security_group],
+            log_group=logs.LogGroup(self, f"{id}-warmup-hook-logs", retention=self.log_retention),
+            environment={
+                "TEST_RULE_ARN": test_rule.listener_rule_arn,
+                "WARMUP_PATH": "/warmup?preload=1",
+                "WARMUP_REQUESTS": self.php_runtime_environment()["APACHE_START_SERVERS"],
+                "WARMUP_TIMEOUT": str(WARMUP_REQUEST_TIMEOUT),
+            },
+        )
+        hook.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["elasticloadbalancing:DescribeRules", "elasticloadbalancing:DescribeTargetHealth"],
+                resources=["*"],
+            )
+        )
+        self.warmup_hook = hook
+        return hook
+
+    def target_health_check(self) -> elb.HealthCheck:
+        """ターゲットグループ(ALB)のヘルスチェック設定を返します。
+
+        Attributes:
+            self.health_check_path (str): ヘルスチェック対象のパス
+            self.healthy_http_codes (str): 正常とみなすHTTPステータス
+            self.health_check_interval (int): ヘルスチェック間隔(秒)
+            self.health_check_timeout (int): タイムアウト(秒)
+            self.healthy_threshold_count (int): 正常とみなすまでの連続成功回数
+            self.unhealthy_threshold_count (int): 異常とみなすまでの連続失敗回数
+
+        Returns:
+            elb.HealthCheck: ヘルスチェック設定
+        """
+        if (
+            self.health_check_interval is not None
+            and self.health_check_timeout is not None
+            and self.health_check_timeout >= self.health_check_interval
+        ):
+            raise ValueError(
+                f"health_check_timeout({self.health_check_timeout}) must be shorter than "
+                f"health_check_interval({self.health_check_interval})"
+            )
+        return elb.HealthCheck(
+            path=self.health_check_path,
+            healthy_http_codes=self.healthy_http_codes,
+            interval=Duration.seconds(self.health_check_interval) if self.health_check_interval is not None else None,
+            timeout=Duration.seconds(self.health_check_timeout) if self.health_check_timeout is not None else None,
+            healthy_threshold_count=self.healthy_threshold_count,
+            unhealthy_threshold_count=self.unhealthy_threshold_count,
+        )
+
+    def container_health_check(self) -> ecs.HealthCheck:
+        """add_containerに渡すコンテナのヘルスチェックを返します。
+        コンテナ内からcurlでcontainer_health_check_pathを取得し、失敗が続いたタスクはECSが置き換えます。
+
+        Attributes:
+            self.container_health_check_path (str): 対象のパス
+            self.port (int): コンテナのHTTPポート
+            self.container_health_check_interval (int): 間隔(秒)
+            self.container_health_check_timeout (int): タイムアウト(秒)
+            self.container_health_check_retries (int): UNHEALTHYとみなすまでの連続失敗回数
+            self.container_health_check_start_period (int): 起動直後に失敗を数えない期間(秒)
+
+        Returns:
+            ecs.HealthCheck: ヘルスチェック。container_health_check_pathが未指定の場合はNone
+        """
+        if self.container_health_check_path is None:
+            return None
+        start_period = self.container_health_check_start_period
+        return ecs.HealthCheck(
+            command=["CMD-SHELL", f"curl -fsS http://localhost:{self.port}{self.container_health_check_path} || exit 1"],
+            interval=Duration.seconds(self.container_health_check_interval),
+            timeout=Duration.seconds(self.container_health_check_timeout),
+            retries=self.container_health_check_retries,
+            start_period=Duration.seconds(start_period) if start_period is not None else None,
+        )
+
+    def target_group_options(self) -> dict:
+        """ApplicationTargetGroupに渡す、ルーティングとスティッキーセッションの設定を返します。
+
+        Attributes:
+            self.load_balancing_algorithm (elb.TargetGroupLoadBalancingAlgorithmType): ルーティングアルゴリズム
+            self.slow_start (int): スロースタートの期間(秒)
+            self.stickiness (str): "app_cookie" または "lb_cookie"
+            self.stickiness_cookie_name (str): app_cookieの場合のCookie名
+            self.stickiness_duration (int): スティッキーセッションの有効期間(秒)
+            self.target_protocol_version (elb.ApplicationProtocolVersion): タスクへのプロトコルバージョン
+
+        Returns:
+            dict: ApplicationTargetGroupのキーワード引数
+        """
+        options = {}
+        if self.load_balancing_algorithm is not None:
+            options["load_balancing_algorithm_type"] = self.load_balancing_algorithm
+        if self.slow_start is not None:
+            # ALBはLEAST_OUTSTANDING_REQUESTSとスロースタートの併用を受け付けない
+            if self.load_balancing_algorithm == elb.TargetGroupLoadBalancingAlgorithmType.LEAST_OUTSTANDING_REQUESTS:
+                raise ValueError("slow_start cannot be combined with LEAST_OUTSTANDING_REQUESTS routing")
+            options["slow_start"] = Duration.seconds(self.slow_start)
+        if self.stickiness is not None:
+            if self.stickiness not in STICKINESS_TYPES:
+                raise ValueError(f"unknown stickiness: {self.stickiness}")
+            if self.stickiness == "app_cookie":
+                if not self.stickiness_cookie_name:
+                    raise ValueError("stickiness_cookie_name is required for app_cookie stickiness")
+                options["stickiness_cookie_name"] = self.stickiness_cookie_name
+            options["stickiness_cookie_duration"] = Duration.seconds(self.stickiness_duration)
+        if self.target_protocol_version is not None:
+            options["protocol_version"] = self.target_protocol_version
+        return options
+
+    def deployment_setting(self, name: str):
+        """デプロイ関連の属性値を返します。Noneの場合はdeployment_profileのプリセットの値を使います。
+
+        Args:
+            name (str): 属性名
+
+        Returns:
+            属性値。属性とプリセットのどちらにも無い場合はNone
+        """
+        value = getattr(self, name)
+        if value is not None or self.deployment_profile is None:
+            return value
+        if self.deployment_profile not in DEPLOYMENT_PROFILES:
+            raise ValueError(f"unknown deployment_profile: {self.deployment_profile}")
+        return DEPLOYMENT_PROFILES[self.deployment_profile].get(name)
+
+    def deployment_options(self) -> dict:
+        """FargateServiceに渡すデプロイ設定を返します。
+
+        Attributes:
+            self.deployment_profile (str): デプロイプロファイル
+            self.min_healthy_percent (int): デプロイ中の最小タスク数(%)
+            self.max_healthy_percent (int): デプロイ中の最大タスク数(%)
+            self.circuit_breaker (bool): サーキットブレーカー(ロールバック付き)
+            self.blue_green (bool): Blue/Greenデプロイ
+            self.blue_green_bake_time (int): 本番の切り替えから旧タスクを停止するまでの時間(分)
+
+        Returns:
+            dict: FargateServiceのキーワード引数
+        """
+        options = {}
+        min_healthy_percent = self.deployment_setting("min_healthy_percent")
+        max_healthy_percent = self.deployment_setting("max_healthy_percent")
+        if min_healthy_percent is not None:
+            options["min_healthy_percent"] = min_healthy_percent
+        if max_healthy_percent is not None:
+            options["max_healthy_percent"] = max_healthy_percent
+        if self.deployment_setting("circuit_breaker"):
+            options["circuit_breaker"] = ecs.DeploymentCircuitBreaker(enable=True, rollback=True)
+        if self.blue_green:
+            options["deployment_strategy"] = ecs.DeploymentStrategy.BLUE_GREEN
+            if self.blue_green_bake_time is not None:
+                options["bake_time"] = Duration.minutes(self.blue_green_bake_time)
+        return options
+
+    def request_duration(self) -> int:
+        """最長のリクエストの処理時間(秒)を返します。
+        deployment_profileの値を使い、export_workerが無い場合は、Webで実行するエクスポートの完了まで待ちます。
+
+        Attributes:
+            self.max_request_duration (int): 指定した場合はその値
+            self.export_worker (bool): Falseの場合、プリセットの値をEXPORT_REQUEST_DURATION以上にする
+
+        Returns:
+            int: 最長のリクエストの処理時間(秒)。未指定の場合はNone
+        """
+        if self.max_request_duration is not None:
+            return self.max_request_duration
+        duration = self.deployment_setting("max_request_duration")
+        if duration is not None and not self.export_worker:
+            return max(duration, EXPORT_REQUEST_DURATION)
+        return duration
+
+    def drain_delay(self) -> int:
+        """ALBからタスクを登録解除する際の待ち時間(秒)を返します。
+        max_request_duration(request_duration()を参照)がある場合は、処理中のリクエストが完了するまで待ちます。
+        ALBは処理中のリクエストが無くなった時点で登録解除を完了するため、通常のデプロイでこの時間を待つことはありません。
+
+        Attributes:
+            self.deregistration_delay (int): 登録解除の待ち時間(秒)
+            self.max_request_duration (int): 最長のリクエストの処理時間(秒)
+
+        Returns:
+            int: deregistration_delayとmax_request_duration + DRAIN_MARGINの大きい方
+        """
+        max_request_duration = self.request_duration()
+        if max_request_duration is None:
+            return self.deregistration_delay
+        return max(self.deregistration_delay, max_request_duration + DRAIN_MARGIN)
+
+    def capacity_provider_strategies(self) -> list[ecs.CapacityProviderStrategy]:
+        """ECSサービスのキャパシティプロバイダー戦略を返します。
+        fargate_spot_weightが0の場合はNone(launch typeがFARGATE)を返します。
+
+        Spot使用時は、中断通知から停止までの猶予内にALBからの登録解除(deregistration_delay)が
+        終わる必要があるため、超過する設定はエラーにします。
+        クラスタにFARGATE/FARGATE_SPOTのキャパシティプロバイダーが関連付けられている必要があります。
+
+        Attributes:
+            self.fargate_base (int): 常にオンデマンドで起動するタスク数
+            self.fargate_weight (int): オンデマンドの重み
+            self.fargate_spot_weight (int): Spotの重み
+            self.deregistration_delay (int): ALBからの登録解除の待ち時間(秒)。drain_delay()を参照
+
+        Returns:
+            list[ecs.CapacityProviderStrategy]: キャパシティプロバイダー戦略
+        """
+        if not self.fargate_spot_weight:
+            return None
+        if self.drain_delay() >= SPOT_INTERRUPTION_NOTICE:
+            raise ValueError(
+                f"deregistration_delay({self.drain_delay()}) must be shorter than "
+                f"the Fargate Spot interruption notice ({SPOT_INTERRUPTION_NOTICE}s)"
+            )
+        return [
+            ecs.CapacityProviderStrategy(capacity_provider="FARGATE", base=self.fargate_base, weight=self.fargate_weight),
+            ecs.CapacityProviderStrategy(capacity_provider="FARGATE_SPOT", weight=self.fargate_spot_weight),
+        ]
+
+    def container_stop_timeout(self) -> Duration:
+        """add_containerに渡すstop_timeoutを返します。
+
+        Attributes:
+            self.stop_timeout (int): コンテナのstopTimeout(秒)
+            self.fargate_spot_weight (int): Spot使用時、未指定ならSPOT_STOP_TIMEOUTを使う
+            self.max_request_duration (int): 未指定ならmax_request_duration + DRAIN_MARGIN(上限はFARGATE_MAX_STOP_TIMEOUT)
+
+        Returns:
+            Duration: stop_timeout。未指定の場合はNone(ECSの既定値)
+        """
+        stop_timeout = self.stop_timeout
+        max_request_duration = self.request_duration()
+        if stop_timeout is None and self.fargate_spot_weight:
+            stop_timeout = SPOT_STOP_TIMEOUT
+        elif stop_timeout is None and max_request_duration is not None:
+            stop_timeout = min(max_request_duration + DRAIN_MARGIN, FARGATE_MAX_STOP_TIMEOUT)
+        return Duration.seconds(stop_timeout) if stop_timeout is not None else None
+
+    def create_auto_scaling(
+        self, id: str, service: ecs.FargateService, target_group: elb.ApplicationTargetGroup
+    ) -> ecs.ScalableTaskCount:
+        """ECSサービスのターゲット追跡スケーリングを構築します。
+
+        Attributes:
+            self.min_capacity (int): 最小タスク数。未指定の場合はdesired_count
+            self.max_capacity (int): 最大タスク数
+            self.scaling_cpu_target (int): CPU使用率のターゲット値(%)
+            self.scaling_memory_target (int): メモリ使用率のターゲット値(%)
+            self.scaling_requests_per_target (int): タスクあたりのリクエスト数のターゲット値
+            self.scale_in_cooldown (int): スケールインのクールダウン(秒)
+            self.scale_out_cooldown (int): スケールアウトのクールダウン(秒)
+            self.scaling_schedules (dict[str, dict]): 時間帯ごとの最小/最大タスク数
+            self.scaling_timezone (str): scaling_schedulesのタイムゾーン
+
+        Args:
+            id (str): Stack固有のID
+            service (ecs.FargateService): 対象のECSサービス
+            target_group (elb.ApplicationTargetGroup): RequestCountPerTargetの計測対象となるターゲットグループ
+
+        Returns:
+            ecs.ScalableTaskCount: スケーラブルターゲット
+        """
+        min_capacity = self.min_capacity if self.min_capacity is not None else self.desired_count
+        if min_capacity > self.max_capacity:
+            raise ValueError(f"min_capacity({min_capacity}) must not exceed max_capacity({self.max_capacity})")
+
+        scaling = service.auto_scale_task_count(min_capacity=min_capacity, max_capacity=self.max_capacity)
+        scale_in_cooldown = Duration.seconds(self.scale_in_cooldown)
+        scale_out_cooldown = Duration.seconds(self.scale_out_cooldown)
+
+        if self.scaling_cpu_target is not None:
+            scaling.scale_on_cpu_utilization(
+                f"{id}-scaling-cpu",
+                target_utilization_percent=self.scaling_cpu_target,
+                scale_in_cooldown=scale_in_cooldown,
+                scale_out_cooldown=scale_out_cooldown,
+            )
+
+        if self.scaling_memory_target is not None:
+            scaling.scale_on_memory_utilization(
+                f"{id}-scaling-memory",
+                target_utilization_percent=self.scaling_memory_target,
+                scale_in_cooldown=scale_in_cooldown,
+                scale_out_cooldown=scale_out_cooldown,
+            )
+
+        if self.scaling_requests_per_target is not None:
+            scaling.scale_on_request_count(
+                f"{id}-scaling-requests",
+                requests_per_target=self.scaling_requests_per_target,
+                target_group=target_group,
+                scale_in_cooldown=scale_in_cooldown,
+                scale_out_cooldown=scale_out_cooldown,
+            )
+
+        for name, schedule in (self.scaling_schedules or {}).items():
+            schedule_min = schedule.get("min_capacity")
+            schedule_max = schedule.get("max_capacity")
+            if schedule_min is not None and schedule_max is not None and schedule_min > schedule_max:
+                raise ValueError(
+                    f"scaling_schedules[{name}]: min_capacity({schedule_min}) must not exceed max_capacity({schedule_max})"
+                )
+            scaling.scale_on_schedule(
+                f"{id}-schedule-{name}",
+                schedule=appscaling.Schedule.cron(**schedule["cron"]),
+                min_capacity=schedule_min,
+                max_capacity=schedule_max,
+                time_zone=TimeZone.of(self.scaling_timezone),
+            )
+        return scaling
+
+    def create_monitoring(
+        self, id: str, service: ecs.FargateService, target_group: elb.ApplicationTargetGroup
+    ) -> cw.Dashboard:
+        """サービスの性能を確認するCloudWatchダッシュボードと、レイテンシ・5xxのアラームを構築します。
+
+        タスク数はContainer Insightsのメトリクス(RunningTaskCount)のため、
+        クラスタでContainer Insightsが有効な場合のみ表示されます。
+
+        Attributes:
+            self.rs (IResource): 既存リソース。alarm_topic_arnが指定されている場合はアラームを通知する
+            self.monitoring_period (int): メトリクスの集計期間(秒)
+            self.alarm_latency_p99 (float): p99レイテンシのしきい値(秒)
+            self.alarm_latency_p90 (float): p90レイテンシのしきい値(秒)
+            self.alarm_5xx_count (int): 5xxレスポンス数のしきい値
+            self.alarm_evaluation_periods (int): アラーム状態にするまでの連続期間数
+
+        Args:
+            id (str): Stack固有のID
+            service (ecs.FargateService): 対象のECSサービス
+            target_group (elb.ApplicationTargetGroup): 対象のターゲットグループ
+
+        Returns:
+            cw.Dashboard: ダッシュボード
+        """
+        period = Duration.seconds(self.monitoring_period)
+        # ラベルを付けたメトリクスはアラームでMetrics(メトリクス計算)として出力されるため、ラベルはグラフにのみ付ける
+        latency = {
+            x: target_group.metrics.target_response_time(statistic=x, period=period) for x in ("p50", "p90", "p99")
+        }
+        requests = target_group.metrics.request_count(period=period, label="requests")
+        errors = target_group.metrics.http_code_target(elb.HttpCodeTarget.TARGET_5XX_COUNT, period=period)
+        client_errors = target_group.metrics.http_code_target(
+            elb.HttpCodeTarget.TARGET_4XX_COUNT, period=period, label="target 4xx"
+        )
+        running_tasks = cw.Metric(
+            namespace="ECS/ContainerInsights",
+            metric_name="RunningTaskCount",
+            dimensions_map={"ClusterName": self.rs.cluster.cluster_name, "ServiceName": service.service_name},
+            statistic="Average",
+            period=period,
+            label="running",
+        )
+
+        alarms = []
+        for label, metric, threshold in (
+            ("latency-p99", latency["p99"], self.alarm_latency_p99),
+            ("latency-p90", latency["p90"], self.alarm_latency_p90),
+            ("5xx", errors, self.alarm_5xx_count),
+        ):
+            if threshold is None:
+                continue
+            alarms.append(
+                metric.create_alarm(
+                    self,
+                    f"{id}-alarm-{label}",
+                    alarm_name=f"{id}-{label}",
+                    threshold=threshold,
+                    evaluation_periods=self.alarm_evaluation_periods,
+                    comparison_operator=cw.ComparisonOperator.GREATER_THAN_THRESHOLD,
+                    # リクエストが無い期間はメトリクスが欠落するため、正常とみなす
+                    treat_missing_data=cw.TreatMissingData.NOT_BREACHING,
+                )
+            )
+        if self.rs.alarm_topic_arn is not None:
+            topic = sns.Topic.from_topic_arn(self, f"{id}-alarm-topic", self.rs.alarm_topic_arn)
+            for alarm in alarms:
+                alarm.add_alarm_action(cw_actions.SnsAction(topic))
+                alarm.add_ok_action(cw_actions.SnsAction(topic))
+
+        dashboard = cw.Dashboard(self, f"{id}-dashboard", dashboard_name=f"{id}-performance")
+        dashboard.add_widgets(
+            cw.GraphWidget(
+                title="TargetResponseTime",
+                left=[metric.with_(label=x) for x, metric in latency.items()],
+                left_annotations=[
+                    cw.HorizontalAnnotation(value=threshold, label=f"{label} alarm")
+                    for label, threshold in (("p99", self.alarm_latency_p99), ("p90", self.alarm_latency_p90))
+                    if threshold is not None
+                ],
+                width=12,
+            ),
+            cw.GraphWidget(
+                title="Requests / Errors",
+                left=[requests],
+                right=[errors.with_(label="target 5xx"), client_errors],
+                width=12,
+            ),
+        )
+        dashboard.add_widgets(
+            cw.GraphWidget(
+                title="CPU / Memory (%)",
+                left=[
+                    service.metric_cpu_utilization(period=period, statistic="Average", label="cpu avg"),
+                    service.metric_cpu_utilization(period=period, statistic="Maximum", label="cpu max"),
+                    service.metric_memory_utilization(period=period, statistic="Average", label="memory avg"),
+                    service.metric_memory_utilization(period=period, statistic="Maximum", label="memory max"),
+                ],
+                left_y_axis=cw.YAxisProps(min=0, max=100),
+                width=12,
+            ),
+            cw.GraphWidget(
+                title="Tasks",
+                left=[
+                    running_tasks,
+                    target_group.metrics.healthy_host_count(period=period, label="healthy"),
+                    target_group.metrics.unhealthy_host_count(period=period, label="unhealthy"),
+                ],
+                width=12,
+            ),
+        )
+        if self.metrics_namespace is not None and self.log_metrics:
+            widgets = []
+            for name, unit in self.log_metrics.items():
+                # 件数やバイト数は合計、時間はばらつきを見るため平均とp90を表示する
+                if unit in (cw.Unit.COUNT, cw.Unit.BYTES):
+                    metrics = [self.log_metric(id, name, period=period, statistic="Sum", label="sum")]
+                else:
+                    metrics = [self.log_metric(id, name, period=period, statistic=x, label=x) for x in ("Average", "p90")]
+                widgets.append(cw.GraphWidget(title=name, left=metrics, width=8))
+            dashboard.add_widgets(*widgets)
+        if alarms:
+            dashboard.add_widgets(cw.AlarmStatusWidget(alarms=alarms, width=24))
+        return dashboard
+
+    def create_shared_cache(self, id: str) -> dict[str, str]:
+        """タスク間で共有するキャッシュ層を接続し、コンテナに渡す環境変数を返します。
+        サービスのセキュリティグループ(sg_default)からキャッシュへの経路も開放します。
+
+        Attributes:
+            self.rs (IResource): 既存リソース
+            self.shared_cache (str): "existing" または "serverless"
+            self.shared_cache_ttl (int): 共有キャッシュのTTL(秒)
+            self.shared_cache_local_ttl (int): タスク内キャッシュのTTL上限(秒)
+            self.shared_cache_port (int): 共有キャッシュのポート
+
+        Args:
+            id (str): Stack固有のID
+
+        Returns:
+            dict[str, str]: コンテナの環境変数
+        """
+        port = ec2.Port.tcp(self.shared_cache_port)
+        if self.shared_cache == "existing":
+            url = self.rs.multipurpose_redis_url
+            # 経路を開けないまま接続すると、各タスクが接続のタイムアウトを待ち続ける
+            if self.rs.sg_multipurpose_redis is None:
+                raise ValueError('shared_cache="existing" requires IResource.sg_multipurpose_redis')
+            self.rs.sg_multipurpose_redis.add_ingress_rule(self.rs.sg_default, port, f"{id} shared cache")
+        elif self.shared_cache == "serverless":
+            sg = ec2.SecurityGroup(
+                self,
+                f"{id}-cache-sg",
+                vpc=self.rs.vpc,
+                description=f"{id} shared cache",
+                allow_all_outbound=False,
+            )
+            sg.add_ingress_rule(self.rs.sg_default, port, f"{id} service")
+            cache = elasticache.CfnServerlessCache(
+                self,
+                f"{id}-cache",
+                engine="valkey",
+                major_engine_version="8",
+                serverless_cache_name=f"{id}-cache".lower(),
+                security_group_ids=[sg.security_group_id],
+                subnet_ids=[x.subnet_id for x in self.rs.private_subnets.subnets],
+            )
+            # ElastiCache ServerlessはTLS接続のみ
+            url = f"rediss://{cache.attr_endpoint_address}:{cache.attr_endpoint_port}"
+        else:
+            raise ValueError(f"unknown shared_cache: {self.shared_cache}")
+
+        environment = {"BIGQUERY_CACHE_REDIS_URL": url}
+        if self.shared_cache_ttl is not None:
+            environment["BIGQUERY_CACHE_TTL"] = str(self.shared_cache_ttl)
+        if self.shared_cache_local_ttl is not None:
+            environment["BIGQUERY_CACHE_LOCAL_TTL"] = str(self.shared_cache_local_ttl)
+        return environment
 
     def create_route53_record(self, id):
         """albをaliasとするroute53レコードを作成します。
+        self.cdnの場合は、ALBをオリジンとするCloudFrontディストリビューションを作成し、そちらをaliasにします。
 
         Attributes:
             self.rs (IResource): 既存リソース
             self.fqdn (str): Aレコードの値
+            self.cdn (bool): CloudFrontを経由する
 
         Args:
             id (_type_): Stack固有のID
         """
-        load_balancer_arn = ssm.StringParameter.value_from_lookup(self, self.rs.load_balancer_name)
-        load_balancer = elb.ApplicationLoadBalancer.from_lookup(
-            self,
-            f"{id}-alb",
-            load_balancer_arn=load_balancer_arn,
-        )
-
+        load_balancer = self.shared_load_balancer(id)
         arecord = self.arecord if self.arecord is not None else self.fqdn
+        if self.cdn:
+            target = r53_targets.CloudFrontTarget(self.create_distribution(id, load_balancer))
+        else:
+            target = r53_targets.LoadBalancerTarget(load_balancer)
 
         route53.ARecord(
             self,
@@ -186,30 +1861,131 @@ class FargateServicePattern(Stack):
             zone=self.zone,
             record_name=arecord,
             ttl=Duration.seconds(60),
-            target=route53.RecordTarget.from_alias(r53_targets.LoadBalancerTarget(load_balancer)),
+            target=route53.RecordTarget.from_alias(target),
+        )
+
+    def shared_load_balancer(self, id: str) -> elb.IApplicationLoadBalancer:
+        """共通ALBを参照します。Stack内で1度だけ参照し、以降は同じものを返します。
+
+        Attributes:
+            self.rs (IResource): 既存リソース。offlineの場合はload_balancer_arnなどを、それ以外はload_balancer_nameを使う
+
+        Args:
+            id (str): Stack固有のID
+
+        Returns:
+            elb.IApplicationLoadBalancer: 共通ALB
+        """
+        if self.load_balancer is not None:
+            return self.load_balancer
+        if self.rs.offline:
+            self.load_balancer = elb.ApplicationLoadBalancer.from_application_load_balancer_attributes(
+                self,
+                f"{id}-alb",
+                load_balancer_arn=self.rs.load_balancer_arn,
+                security_group_id=self.rs.sg_alb.security_group_id,
+                load_balancer_canonical_hosted_zone_id=self.rs.load_balancer_canonical_hosted_zone_id,
+                load_balancer_dns_name=self.rs.load_balancer_dns_name,
+            )
+        else:
+            load_balancer_arn = ssm.StringParameter.value_from_lookup(self, self.rs.load_balancer_name)
+            self.load_balancer = elb.ApplicationLoadBalancer.from_lookup(
+                self,
+                f"{id}-alb",
+                load_balancer_arn=load_balancer_arn,
+            )
+        return self.load_balancer
+
+    def create_distribution(self, id: str, load_balancer: elb.IApplicationLoadBalancer) -> cloudfront.Distribution:
+        """共通ALBをオリジンとするCloudFrontディストリビューションを構築します。
+
+        - cdn_static_pathsの静的ファイルは、エッジで長時間キャッシュする(クエリ文字列はキャッシュキーに含める)
+        - それ以外(Adminerの画面、OAuth2コールバック `/?oauth2=callback` など)はキャッシュせず、
+          Cookie・クエリ文字列・ヘッダをすべてオリジンへ転送する
+        - どちらもビューアのHostヘッダ(fqdn)をALBへ転送し、host_headersのリスナールールに一致させる。
+          ALBの証明書はfqdnを含む必要がある
+
+        Attributes:
+            self.fqdn (str): ディストリビューションの代替ドメイン名
+            self.cdn_certificate_arn (str): us-east-1のACM証明書。未指定の場合はIResource.cloudfront_certificate_arn
+            self.cdn_static_paths (tuple[str, ...]): キャッシュする静的ファイルのパスパターン
+            self.cdn_static_ttl (int): 静的ファイルの既定TTL(秒)
+            self.cdn_origin_read_timeout (int): オリジンの応答を待つ時間(秒)
+
+        Args:
+            id (str): Stack固有のID
+            load_balancer (elb.IApplicationLoadBalancer): オリジンにする共通ALB
+
+        Returns:
+            cloudfront.Distribution: ディストリビューション
+        """
+        certificate_arn = self.cdn_certificate_arn or self.rs.cloudfront_certificate_arn
+        if certificate_arn is None:
+            raise ValueError("cdn requires cdn_certificate_arn or IResource.cloudfront_certificate_arn (us-east-1)")
+
+        origin = origins.LoadBalancerV2Origin(
+            load_balancer,
+            protocol_policy=cloudfront.OriginProtocolPolicy.HTTPS_ONLY,
+            read_timeout=Duration.seconds(self.cdn_origin_read_timeout),
+        )
+        static_cache_policy = cloudfront.CachePolicy(
+            self,
+            f"{id}-static-cache",
+            comment=f"{id} static assets",
+            default_ttl=Duration.seconds(self.cdn_static_ttl),
+            min_ttl=Duration.seconds(0),
+            max_ttl=Duration.days(365),
+            # HostはキャッシュキーとしてALBにも転送される
+            header_behavior=cloudfront.CacheHeaderBehavior.allow_list("Host"),
+            query_string_behavior=cloudfront.CacheQueryStringBehavior.all(),
+            cookie_behavior=cloudfront.CacheCookieBehavior.none(),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True,
+        )
+        static_behavior = cloudfront.BehaviorOptions(
+            origin=origin,
+            viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+            allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD,
+            cache_policy=static_cache_policy,
+            compress=True,
         )
+        distribution = cloudfront.Distribution(
+            self,
+            f"{id}-cdn",
+            comment=f"{id} {self.fqdn}",
+            domain_names=[self.fqdn],
+            certificate=acm.Certificate.from_certificate_arn(self, f"{id}-cdn-cert", certificate_arn),
+            default_behavior=cloudfront.BehaviorOptions(
+                origin=origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+                cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
+                origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER,
+            ),
+            additional_behaviors={path: static_behavior for path in self.cdn_static_paths},
+            http_version=cloudfront.HttpVersion.HTTP2_AND_3,
+            price_class=cloudfront.PriceClass.PRICE_CLASS_ALL,
+        )
+        self.distribution = distribution
+        return distribution
 
     def listener_priority(self, listener_arn, host_headers):
         """alb listernerの番号を自動採番する
 
+        self.priorityが指定されている場合はその値を使う。
+        採番結果はcdk.listener-priority.jsonにキャッシュされる。
+        `cdk synth -c listener-priority:refresh=true` でキャッシュを破棄してAWSから再取得する。
+        self.rs.offlineの場合はAWSへ問い合わせず、キャッシュのみで採番する。
+
         Args:
             listener_arn (str):
             host_headers (str): ホスト名の配列
         """
+        if self.priority is not None:
+            return self.priority
         if listener_arn.startswith("dummy"):
             return 1
 
-        client = boto3.client("elbv2")
-        response = client.describe_rules(
-            ListenerArn=listener_arn,
-        )
-        p = {
-            x["Conditions"][0]["HostHeaderConfig"]["Values"][0]: int(x["Priority"])
-            for x in response["Rules"]
-            if x["Priority"] != "default"
-        }
-        if len(p.values()) == 0:
-            return 1
-        ret = p[host_headers[0]] if host_headers[0] in p else max(p.values()) + 1
-        # print(host_headers[0],':',ret)
-        return ret
\ No newline at end of file
+        refresh = str(self.node.try_get_context(REFRESH_CONTEXT_KEY)).lower() == "true"
+        allocator = ListenerPriorityAllocator.for_listener(listener_arn, refresh=refresh, offline=self.rs.offline)
+        return allocator.priority(host_headers)
@@ -0,0 +1,136 @@
+import functools
+import json
+import re
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import jsii
+from aws_cdk import Stack, aws_ecs as ecs
+from constructs import IValidation
+
+MANIFEST_TYPES = ",".join(
+    [
+        "application/vnd.oci.image.index.v1+json",
+        "application/vnd.docker.distribution.manifest.list.v2+json",
+        "application/vnd.oci.image.manifest.v1+json",
+        "application/vnd.docker.distribution.manifest.v2+json",
+    ]
+)
+
+DOCKER_HUB = "registry-1.docker.io"
+
+ARCHITECTURES = {"X86_64": "amd64", "ARM64": "arm64"}
+"""ECSのcpuArchitectureとOCIイメージのarchitecture名の対応"""
+
+
+def architecture_name(cpu_architecture: ecs.CpuArchitecture) -> str:
+    """ecs.CpuArchitectureをOCIイメージのarchitecture名に変換する
+
+    jsiiの静的プロパティは参照するたびに別のオブジェクトを返し、値も公開されていないため、
+    作業用のStackでタスク定義に描画したcpuArchitectureの値で判定する。
+    """
+    task_def = ecs.FargateTaskDefinition(
+        Stack(), "TaskDef", runtime_platform=ecs.RuntimePlatform(cpu_architecture=cpu_architecture)
+    )
+    platform = task_def.stack.resolve(task_def.node.default_child.runtime_platform)
+    return ARCHITECTURES[platform["cpuArchitecture"]]
+
+
+def parse_image(image: str) -> tuple[str, str, str]:
+    """イメージ名をregistry, repository, reference(タグまたはdigest)に分解する
+
+    Examples:
+        >>> parse_image("ghcr.io/takemi-ohama/adminer-bigquery:master-3431413")
+        ('ghcr.io', 'takemi-ohama/adminer-bigquery', 'master-3431413')
+    """
+    if "@" in image:
+        name, reference = image.split("@", 1)
+    else:
+        name, reference = image, "latest"
+        m = re.match(r"^(.*):([^/:]+)$", image)
+        if m:
+            name, reference = m.group(1), m.group(2)
+
+    first, _, rest = name.partition("/")
+    if rest and ("." in first or ":" in first or first == "localhost"):
+        registry, repository = first, rest
+    else:
+        registry, repository = DOCKER_HUB, name if "/" in name else f"library/{name}"
+    return registry, repository, reference
+
+
+def _request(url: str, accept: str, token: str = None):
+    headers = {"Accept": accept}
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=10) as res:
+        return json.load(res)
+
+
+def _token(challenge: str) -> str:
+    """WWW-Authenticateヘッダ(Bearer realm=...,service=...,scope=...)から匿名トークンを取得する"""
+    params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    realm = params.pop("realm")
+    res = _request(f"{realm}?{urllib.parse.urlencode(params)}", "application/json")
+    return res.get("token") or res.get("access_token")
+
+
+def _get(registry: str, path: str, accept: str, token: str = None) -> tuple[dict, str]:
+    url = f"https://{registry}/v2/{path}"
+    try:
+        return _request(url, accept, token), token
+    except urllib.error.HTTPError as e:
+        if e.code != 401 or token is not None:
+            raise
+        token = _token(e.headers["WWW-Authenticate"])
+        return _request(url, accept, token), token
+
+
+@functools.lru_cache(maxsize=None)
+def image_architectures(image: str) -> frozenset[str]:
+    """レジストリのマニフェストからイメージが対応するarchitectureを取得する
+
+    マルチアーキテクチャのイメージはmanifest listから、単一アーキテクチャのイメージはconfigから判定する。
+    結果はプロセス内でキャッシュする。
+    """
+    registry, repository, reference = parse_image(image)
+    manifest, token = _get(registry, f"{repository}/manifests/{reference}", MANIFEST_TYPES)
+    if "manifests" in manifest:
+        # buildxのattestation manifestはplatformが unknown/unknown になるため除外する
+        return frozenset(
+            x["platform"]["architecture"]
+            for x in manifest["manifests"]
+            if x.get("platform", {}).get("architecture", "unknown") != "unknown"
+        )
+
+    config, _ = _get(registry, f"{repository}/blobs/{manifest['config']['digest']}", "*/*", token)
+    return frozenset([config["architecture"]])
+
+
+@jsii.implements(IValidation)
+class ImageArchitectureValidation:
+    """synth時に、コンテナイメージがタスクのCPUアーキテクチャに対応しているかを検証する"""
+
+    def __init__(self, images: list[str], cpu_architecture: ecs.CpuArchitecture):
+        """
+        Args:
+            images (list[str]): 検証するイメージ名のリスト。synth時点の内容を検証する
+            cpu_architecture (ecs.CpuArchitecture): タスクのCPUアーキテクチャ
+        """
+        self.images = images
+        self.architecture = architecture_name(cpu_architecture)
+
+    def validate(self) -> list[str]:
+        errors = []
+        for image in self.images:
+            try:
+                architectures = image_architectures(image)
+            except (OSError, ValueError, KeyError) as e:
+                errors.append(f"{image}: failed to inspect image manifest ({e})")
+                continue
+            if self.architecture not in architectures:
+                errors.append(
+                    f"{image} does not support {self.architecture} (available: {', '.join(sorted(architectures))})"
+                )
+        return errors
@@ -0,0 +1,173 @@
+import json
+from pathlib import Path
+
+import boto3
+
+CACHE_FILE = Path(__file__).resolve().parent.parent / "cdk.listener-priority.json"
+"""優先順位キャッシュの保存先。cdk.context.jsonと同じディレクトリに置く"""
+
+REFRESH_CONTEXT_KEY = "listener-priority:refresh"
+"""`cdk synth -c listener-priority:refresh=true` でキャッシュを破棄してAWSから再取得する"""
+
+
+class ListenerPriorityAllocator:
+    """ALB listenerのルール優先順位を採番する。
+
+    describe_rulesを全ページ取得し、host-header条件でルールを索引化する。
+    索引と採番結果はプロセス内ではlistenerごとに1度だけ構築し、
+    ディスク(CACHE_FILE)にも保存するため、以降のsynthではAWSへの問い合わせを行わない。
+
+    1つのappで複数のStackをsynthする場合も、同じlistenerには同じインスタンスが使われるため、
+    新規ホストへの採番が重複することはない。
+    """
+
+    _instances: dict[str, "ListenerPriorityAllocator"] = {}
+    """listener arnごとのインスタンス(プロセス内キャッシュ)"""
+
+    def __init__(self, listener_arn: str, client=None, cache_path: Path = None, offline: bool = False):
+        """
+        Args:
+            listener_arn (str): 対象のlistener arn
+            client (optional): elbv2クライアント。未指定の場合はlistener arnのリージョンで作成する
+            cache_path (Path, optional): キャッシュファイルのパス。未指定の場合はCACHE_FILE
+            offline (bool): Trueの場合、AWSへ問い合わせずディスクのキャッシュのみで採番し、キャッシュも更新しない
+        """
+        self.listener_arn = listener_arn
+        self.offline = offline
+        self.cache_path = Path(cache_path) if cache_path is not None else CACHE_FILE
+        self._client = client
+        self.rules: dict[str, int] = None
+        """ホスト名 -> 既存ルールの優先順位"""
+        self.used: set[int] = None
+        """既存ルールが使用している優先順位(host-header条件を持たないルールも含む)"""
+        self.allocated: dict[str, int] = {}
+        """ホスト名 -> 未デプロイのホストに採番した優先順位"""
+
+    @classmethod
+    def for_listener(
+        cls, listener_arn: str, client=None, cache_path: Path = None, refresh: bool = False, offline: bool = False
+    ) -> "ListenerPriorityAllocator":
+        """listenerに対応するプロセス内で共有のインスタンスを返す
+
+        Args:
+            listener_arn (str): 対象のlistener arn
+            client (optional): elbv2クライアント
+            cache_path (Path, optional): キャッシュファイルのパス
+            refresh (bool): Trueの場合、キャッシュを破棄してAWSから再取得する(プロセス内で1度のみ)
+            offline (bool): Trueの場合、AWSへ問い合わせずディスクのキャッシュのみで採番する
+        """
+        allocator = cls._instances.get(listener_arn)
+        if allocator is None:
+            allocator = cls(listener_arn, client=client, cache_path=cache_path, offline=offline)
+            cls._instances[listener_arn] = allocator
+            if refresh and not offline:
+                allocator.invalidate()
+        return allocator
+
+    @classmethod
+    def reset(cls):
+        """プロセス内キャッシュを破棄する"""
+        cls._instances = {}
+
+    def priority(self, host_headers: list[str]) -> int:
+        """ホスト名に対応する優先順位を返す。
+        既存ルールがあればその優先順位を、無ければ未使用の番号を新たに採番する。
+
+        Args:
+            host_headers (list[str]): ホスト名の配列。先頭のホスト名で判定する
+        """
+        self._load()
+        host = host_headers[0]
+        if host in self.allocated:
+            return self.allocated[host]
+        if host in self.rules:
+            return self.rules[host]
+
+        taken = self.used | set(self.allocated.values())
+        ret = max(taken) + 1 if taken else 1
+        self.allocated[host] = ret
+        self._save()
+        return ret
+
+    def invalidate(self):
+        """ディスクとプロセス内のルール索引を破棄する。次回のpriority()でAWSから再取得する。
+        未デプロイのホストへの採番結果は、再取得した既存ルールと衝突しない限り引き継ぐ
+        """
+        cache = self._read_cache()
+        entry = cache.pop(self.listener_arn, None)
+        if entry is not None:
+            self.allocated = {k: int(v) for k, v in entry["allocated"].items()}
+            self._write_cache(cache)
+        self.rules = None
+        self.used = None
+
+    def _load(self):
+        if self.rules is not None:
+            return
+
+        entry = self._read_cache().get(self.listener_arn)
+        if entry is not None:
+            self.rules = {k: int(v) for k, v in entry["rules"].items()}
+            self.used = {int(x) for x in entry["used"]}
+            self.allocated = {k: int(v) for k, v in entry["allocated"].items()}
+            return
+
+        if self.offline:
+            self.rules, self.used = {}, set()
+            return
+
+        self.rules, self.used = self._describe_rules()
+        # 再取得した既存ルールと衝突する採番結果は破棄する
+        self.allocated = {
+            k: v for k, v in self.allocated.items() if k not in self.rules and v not in self.used
+        }
+        self._save()
+
+    def _describe_rules(self) -> tuple[dict[str, int], set[int]]:
+        """listenerのルールを全ページ取得し、ホスト名で索引化する"""
+        client = self._client
+        if client is None:
+            client = boto3.client("elbv2", region_name=self.listener_arn.split(":")[3])
+
+        rules = {}
+        used = set()
+        params = {"ListenerArn": self.listener_arn, "PageSize": 400}
+        while True:
+            response = client.describe_rules(**params)
+            for rule in response["Rules"]:
+                if rule["Priority"] == "default":
+                    continue
+                priority = int(rule["Priority"])
+                used.add(priority)
+                for condition in rule.get("Conditions", []):
+                    if condition.get("Field") != "host-header":
+                        continue
+                    values = condition.get("HostHeaderConfig", {}).get("Values") or condition.get("Values", [])
+                    for host in values:
+                        rules.setdefault(host, priority)
+            if not response.get("NextMarker"):
+                break
+            params["Marker"] = response["NextMarker"]
+        return rules, used
+
+    def _save(self):
+        if self.offline:
+            return
+        cache = self._read_cache()
+        cache[self.listener_arn] = {
+            "rules": dict(sorted(self.rules.items())),
+            "used": sorted(self.used),
+            "allocated": dict(sorted(self.allocated.items())),
+        }
+        self._write_cache(cache)
+
+    def _read_cache(self) -> dict:
+        if not self.cache_path.exists():
+            return {}
+        with self.cache_path.open() as f:
+            return json.load(f)
+
+    def _write_cache(self, cache: dict):
+        with self.cache_path.open("w") as f:
+            json.dump(cache, f, indent=2)
+            f.write("\n")
@@ -0,0 +1,390 @@
+"""FargateServicePatternでデプロイしたサービスのタスクサイズとスケーリングの推奨値を算出する
+
+CloudWatchから数週間分のタスクのCPU/メモリ使用率とALBのリクエスト数・レイテンシを取得し、
+cpu / memory_limit_mib / desired_count / min_capacity / max_capacity / スケーリングのターゲット値を推奨する。
+推奨値はStackクラスのソースに対するunified diffとして出力する。
+
+使い方:
+    python -m lib.rightsizing --stack AdminerGbqDevStack --cluster development-ecs > rightsizing.diff
+    patch -p1 < rightsizing.diff
+"""
+
+import argparse
+import ast
+import difflib
+import functools
+import math
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import boto3
+
+from lib.fargate_service_pattern import FargateServicePattern
+
+FARGATE_TASK_SIZES = {
+    256: (512, 1024, 2048),
+    512: tuple(range(1024, 4096 + 1, 1024)),
+    1024: tuple(range(2048, 8192 + 1, 1024)),
+    2048: tuple(range(4096, 16384 + 1, 1024)),
+    4096: tuple(range(8192, 30720 + 1, 1024)),
+    8192: tuple(range(16384, 61440 + 1, 4096)),
+    16384: tuple(range(32768, 122880 + 1, 8192)),
+}
+"""Fargateで指定できるcpu -> memory(MiB)の組み合わせ"""
+
+METRIC_PERIOD = 300
+"""メトリクスの集計期間(秒)。CloudWatchは15日より古い1分値を保持しないため5分にする"""
+
+DEMAND_PERCENTILE = 99
+"""ピークとみなす需要のパーセンタイル。まれなスパイクで過大なサイズにならないよう最大値は使わない"""
+
+BASELINE_PERCENTILE = 50
+"""min_capacityで常に賄う需要のパーセンタイル"""
+
+SCALE_OUT_HEADROOM = 1.25
+"""max_capacityの算出で、ピーク時の需要に掛ける余裕"""
+
+LATENCY_TARGET_STEP = 10
+"""p99レイテンシがしきい値を超えている場合に、CPU使用率のターゲット値を下げる幅(%)"""
+
+MIN_CPU_TARGET = 40
+"""CPU使用率のターゲット値の下限(%)"""
+
+TUNED_ATTRIBUTES = (
+    "cpu",
+    "memory_limit_mib",
+    "desired_count",
+    "min_capacity",
+    "max_capacity",
+    "scaling_cpu_target",
+    "scaling_requests_per_target",
+)
+"""推奨値を算出し、差分に含める属性"""
+
+def setting_value(settings: dict[str, object], attr: str) -> object:
+    """Stackのソースで設定されている属性の値。未設定の場合はFargateServicePatternのクラス属性の既定値"""
+    return settings[attr] if attr in settings else getattr(FargateServicePattern, attr, None)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """nearest-rank法のパーセンタイル。値が無い場合は0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def arn_suffix(arn: str, resource: str) -> str:
+    """ALBのメトリクスのディメンションに使う、arnの`<resource>/`以降の部分を返す
+
+    Examples:
+        >>> arn_suffix("arn:aws:elasticloadbalancing:ap-northeast-1:1:targetgroup/a-target/0123", "targetgroup")
+        'targetgroup/a-target/0123'
+    """
+    return arn[arn.index(f":{resource}/") + 1 :]
+
+
+def task_size(cpu_needed: float, memory_needed: float) -> tuple[int, int]:
+    """必要なcpuとメモリを満たす、最小のFargateのタスクサイズを返す"""
+    for cpu, memories in FARGATE_TASK_SIZES.items():
+        if cpu < cpu_needed:
+            continue
+        for memory in memories:
+            if memory >= memory_needed:
+                return cpu, memory
+    raise ValueError(f"no Fargate task size fits cpu={cpu_needed:.0f} memory={memory_needed:.0f}MiB")
+
+
+def stack_settings(source: str, class_name: str) -> dict[str, tuple[int, object]]:
+    """Stackクラスの`__init__`で定数を代入している属性を返す
+
+    Returns:
+        dict[str, tuple[int, object]]: 属性名 -> (行番号, 値)。定数以外を代入している属性の値はNone
+    """
+    tree = ast.parse(source)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            break
+    else:
+        raise ValueError(f"class {class_name} not found")
+
+    settings = {}
+    for func in node.body:
+        if not (isinstance(func, ast.FunctionDef) and func.name == "__init__"):
+            continue
+        for stmt in func.body:
+            if not (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1):
+                continue
+            target = stmt.targets[0]
+            if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == "self":
+                try:
+                    value = ast.literal_eval(stmt.value)
+                except ValueError:
+                    value = None
+                settings[target.attr] = (stmt.lineno, value)
+    return settings
+
+
+def stack_diff(source_path: Path, class_name: str, values: dict[str, int]) -> str:
+    """Stackクラスのソースに推奨値を反映するunified diffを返す。
+    代入済みの属性は値を置き換え(行末のコメントは残す)、未設定の属性はmemory_limit_mib(無ければsizing_tier、max_capacity)の代入の後に追加する。
+
+    Args:
+        source_path (Path): Stackクラスのソース
+        class_name (str): Stackクラスの名前
+        values (dict[str, int]): 属性名 -> 推奨値
+
+    Returns:
+        str: `patch -p1` で適用できる差分。変更が無い場合は空文字列
+    """
+    source = source_path.read_text()
+    settings = stack_settings(source, class_name)
+    lines = source.splitlines(keepends=True)
+
+    inserted = []
+    for attr, value in values.items():
+        if attr in settings:
+            index = settings[attr][0] - 1
+            # 行末のコメントは残す
+            lines[index] = re.sub(r"=[^#\n]*?([ \t]*#.*)?$", rf"= {value!r}\1", lines[index], count=1)
+        else:
+            inserted.append((attr, value))
+    if inserted:
+        anchor = settings.get("memory_limit_mib") or settings.get("sizing_tier") or settings.get("max_capacity")
+        if anchor is None:
+            raise ValueError(f"{class_name} assigns none of memory_limit_mib, sizing_tier and max_capacity")
+        index = anchor[0] - 1
+        indent = re.match(r"\s*", lines[index]).group(0)
+        lines[index + 1 : index + 1] = [f"{indent}self.{attr} = {value!r}\n" for attr, value in inserted]
+
+    name = source_path.as_posix()
+    return "".join(difflib.unified_diff(source.splitlines(keepends=True), lines, f"a/{name}", f"b/{name}"))
+
+
+class RightsizingAdvisor:
+    """デプロイ済みのサービスのメトリクスから、タスクサイズとスケーリングの推奨値を算出する。
+
+    サービスはFargateServicePatternの命名規則(`<Stack ID>-service`)で特定し、ターゲットグループはサービスの設定から参照する。
+    CPU/メモリ使用率はデプロイ中のタスク定義のcpu/memoryに対する割合のため、ECSから現在のタスク定義を取得して換算する。
+    """
+
+    def __init__(
+        self,
+        stack_id: str,
+        cluster: str,
+        weeks: int = 4,
+        region: str = None,
+        cloudwatch=None,
+        ecs=None,
+        elbv2=None,
+        now: datetime = None,
+    ):
+        """
+        Args:
+            stack_id (str): デプロイしたStackのID(例: AdminerGbqDevStack)
+            cluster (str): サービスのECSクラスタ名
+            weeks (int): メトリクスを取得する期間(週)
+            region (str, optional): リージョン。クライアント未指定時に使う
+            cloudwatch (optional): cloudwatchクライアント
+            ecs (optional): ecsクライアント
+            elbv2 (optional): elbv2クライアント
+            now (datetime, optional): 取得期間の終わり。未指定の場合は現在時刻
+        """
+        self.stack_id = stack_id
+        self.cluster = cluster
+        self.weeks = weeks
+        self.cloudwatch = cloudwatch or boto3.client("cloudwatch", region_name=region)
+        self.ecs = ecs or boto3.client("ecs", region_name=region)
+        self.elbv2 = elbv2 or boto3.client("elbv2", region_name=region)
+        self.now = now or datetime.now(timezone.utc)
+
+    @functools.cached_property
+    def service(self) -> dict:
+        """デプロイ中のサービス(DescribeServices)"""
+        service_name = f"{self.stack_id}-service"
+        services = self.ecs.describe_services(cluster=self.cluster, services=[service_name])["services"]
+        if not services:
+            raise ValueError(f"service {service_name} not found in {self.cluster}")
+        return services[0]
+
+    def deployed(self) -> dict[str, int]:
+        """デプロイ中のサービスのcpu/memory_limit_mib/desired_countを返す"""
+        service = self.service
+        task_def = self.ecs.describe_task_definition(taskDefinition=service["taskDefinition"])["taskDefinition"]
+        return {
+            "cpu": int(task_def["cpu"]),
+            "memory_limit_mib": int(task_def["memory"]),
+            "desired_count": service["desiredCount"],
+        }
+
+    def metric_queries(self) -> list[dict]:
+        """GetMetricDataのクエリ。ECSはサービス、ALBはサービスに登録したターゲットグループ単位で取得する
+
+        ターゲットグループ名は長いStack IDでは短縮されるため、サービスの設定から参照する。
+        """
+        target_group_arn = self.service["loadBalancers"][0]["targetGroupArn"]
+        target_group = self.elbv2.describe_target_groups(TargetGroupArns=[target_group_arn])["TargetGroups"][0]
+        elb_dimensions = [
+            {"Name": "TargetGroup", "Value": arn_suffix(target_group["TargetGroupArn"], "targetgroup")},
+            {"Name": "LoadBalancer", "Value": arn_suffix(target_group["LoadBalancerArns"][0], "loadbalancer")},
+        ]
+        ecs_dimensions = [
+            {"Name": "ClusterName", "Value": self.cluster},
+            {"Name": "ServiceName", "Value": f"{self.stack_id}-service"},
+        ]
+
+        def query(id, namespace, metric_name, dimensions, stat):
+            return {
+                "Id": id,
+                "MetricStat": {
+                    "Metric": {"Namespace": namespace, "MetricName": metric_name, "Dimensions": dimensions},
+                    "Period": METRIC_PERIOD,
+                    "Stat": stat,
+                },
+                "ReturnData": True,
+            }
+
+        return [
+            query("cpu_avg", "AWS/ECS", "CPUUtilization", ecs_dimensions, "Average"),
+            query("cpu_max", "AWS/ECS", "CPUUtilization", ecs_dimensions, "Maximum"),
+            query("mem_max", "AWS/ECS", "MemoryUtilization", ecs_dimensions, "Maximum"),
+            query("tasks", "ECS/ContainerInsights", "RunningTaskCount", ecs_dimensions, "Average"),
+            query("requests", "AWS/ApplicationELB", "RequestCount", elb_dimensions, "Sum"),
+            query("latency_p99", "AWS/ApplicationELB", "TargetResponseTime", elb_dimensions, "p99"),
+        ]
+
+    def metrics(self) -> dict[str, dict[datetime, float]]:
+        """weeks週間分のメトリクスを全ページ取得する
+
+        Returns:
+            dict[str, dict[datetime, float]]: クエリのId -> 時刻 -> 値
+        """
+        params = {
+            "MetricDataQueries": self.metric_queries(),
+            "StartTime": self.now - timedelta(weeks=self.weeks),
+            "EndTime": self.now,
+            "ScanBy": "TimestampAscending",
+        }
+        series = {x["Id"]: {} for x in params["MetricDataQueries"]}
+        while True:
+            response = self.cloudwatch.get_metric_data(**params)
+            for result in response["MetricDataResults"]:
+                series[result["Id"]].update(zip(result["Timestamps"], result["Values"]))
+            if not response.get("NextToken"):
+                break
+            params["NextToken"] = response["NextToken"]
+        return series
+
+    def recommend(self, settings: dict[str, object]) -> tuple[dict[str, int], list[str]]:
+        """推奨値を算出する
+
+        - memory_limit_mib: タスクのメモリ使用率の最大値(p99)がscaling_memory_target(未指定なら75%)に収まる量
+        - cpu: 1タスクのCPU使用量の最大値(p99)。1つの重いリクエストは他のタスクに分散できないため
+        - min_capacity / desired_count: 中央値の需要をscaling_cpu_targetで賄うタスク数(最低1)
+        - max_capacity: p99の需要にSCALE_OUT_HEADROOMを掛けた量をscaling_cpu_targetで賄うタスク数
+        - scaling_cpu_target: p99レイテンシがalarm_latency_p99を超える期間が1%を超える場合は下げる
+        - scaling_requests_per_target: CPU使用量あたりの1分間のリクエスト数から、ターゲットのCPU使用率に相当する値
+
+        Args:
+            settings (dict[str, object]): Stackのソースで設定されている属性名 -> 値
+
+        Returns:
+            tuple[dict[str, int], list[str]]: (属性名 -> 推奨値, 算出の根拠)
+        """
+        deployed = self.deployed()
+        series = self.metrics()
+        if not series["cpu_avg"]:
+            raise ValueError(f"no CPUUtilization datapoints for {self.stack_id}-service in the last {self.weeks} weeks")
+
+        setting = functools.partial(setting_value, settings)
+        cpu_target = setting("scaling_cpu_target") or 60
+        memory_target = setting("scaling_memory_target") or 75
+        notes = [
+            "deployed: cpu={cpu} memory={memory_limit_mib} desired={desired_count}".format(**deployed),
+            f"datapoints: {len(series['cpu_avg'])} x {METRIC_PERIOD}s over {self.weeks} weeks",
+        ]
+
+        # サービス全体のCPU需要(cpuユニット)。Container Insightsが無効な場合はdesired_countで換算する
+        demand = {
+            t: v / 100 * deployed["cpu"] * series["tasks"].get(t, deployed["desired_count"])
+            for t, v in series["cpu_avg"].items()
+        }
+        peak_demand = percentile(list(demand.values()), DEMAND_PERCENTILE)
+        base_demand = percentile(list(demand.values()), BASELINE_PERCENTILE)
+        task_peak_cpu = percentile(list(series["cpu_max"].values()), DEMAND_PERCENTILE) / 100 * deployed["cpu"]
+        task_peak_memory = (
+            percentile(list(series["mem_max"].values()), DEMAND_PERCENTILE) / 100 * deployed["memory_limit_mib"]
+        )
+        notes.append(
+            f"cpu demand p{BASELINE_PERCENTILE}={base_demand:.0f} p{DEMAND_PERCENTILE}={peak_demand:.0f} "
+            f"per-task p{DEMAND_PERCENTILE}={task_peak_cpu:.0f}"
+        )
+        notes.append(f"memory per-task p{DEMAND_PERCENTILE}={task_peak_memory:.0f}MiB")
+
+        latency = list(series["latency_p99"].values())
+        if setting("alarm_latency_p99") is not None and latency:
+            slow = sum(1 for x in latency if x > setting("alarm_latency_p99")) / len(latency)
+            notes.append(f"p99 latency above {setting('alarm_latency_p99')}s in {slow:.1%} of periods")
+            if slow > 0.01:
+                cpu_target = max(MIN_CPU_TARGET, cpu_target - LATENCY_TARGET_STEP)
+
+        cpu, memory = task_size(task_peak_cpu, task_peak_memory / (memory_target / 100))
+        capacity = cpu * cpu_target / 100
+        min_capacity = max(1, math.ceil(base_demand / capacity))
+        max_capacity = max(min_capacity + 1, math.ceil(peak_demand * SCALE_OUT_HEADROOM / capacity))
+
+        values = {
+            "cpu": cpu,
+            "memory_limit_mib": memory,
+            "desired_count": min_capacity,
+            "min_capacity": min_capacity,
+            "max_capacity": max_capacity,
+            "scaling_cpu_target": cpu_target,
+        }
+
+        # 1分間のリクエスト数とCPU使用量の比から、ターゲットのCPU使用率に相当するタスクあたりのリクエスト数を求める
+        used = sum(demand[t] for t in series["requests"] if t in demand)
+        requests = sum(v for t, v in series["requests"].items() if t in demand) / (METRIC_PERIOD / 60)
+        if setting("scaling_requests_per_target") is not None and used > 0 and requests > 0:
+            values["scaling_requests_per_target"] = max(1, int(requests / used * capacity))
+            notes.append(f"requests per minute per cpu unit: {requests / used:.3f}")
+        return values, notes
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m lib.rightsizing",
+        description="CloudWatchのメトリクスからFargateServicePatternのタスクサイズとスケーリングの推奨値を差分で出力する",
+    )
+    parser.add_argument("--stack", required=True, help="デプロイしたStackのID (例: AdminerGbqDevStack)")
+    parser.add_argument("--cluster", required=True, help="ECSクラスタ名 (例: development-ecs)")
+    parser.add_argument("--stack-class", default="AdminerGbqStack", help="差分を出力するStackクラス")
+    parser.add_argument("--source", type=Path, default=Path("adminer_gbq.py"), help="Stackクラスのソース")
+    parser.add_argument("--weeks", type=int, default=4, help="メトリクスを取得する期間(週)")
+    parser.add_argument("--region", default="ap-northeast-1")
+    args = parser.parse_args(argv)
+
+    settings = {k: v for k, (_, v) in stack_settings(args.source.read_text(), args.stack_class).items()}
+    advisor = RightsizingAdvisor(args.stack, args.cluster, weeks=args.weeks, region=args.region)
+    values, notes = advisor.recommend(settings)
+
+    for note in notes:
+        print(f"# {note}", file=sys.stderr)
+    for attr in TUNED_ATTRIBUTES:
+        if attr in values:
+            print(f"# {attr}: {setting_value(settings, attr)} -> {values[attr]}", file=sys.stderr)
+    # 変更の無い属性は差分に含めない
+    changed = {k: v for k, v in values.items() if setting_value(settings, k) != v}
+    if settings.get("sizing_tier") is not None:
+        # タスクサイズは環境ごとのIResource(cpu_<tier>/memory_<tier>)で決まるため、差分はスケーリングの属性のみ
+        print(f"# sizing_tier={settings['sizing_tier']}: apply cpu/memory to IResource, not the stack", file=sys.stderr)
+        changed = {k: v for k, v in changed.items() if k not in ("cpu", "memory_limit_mib")}
+    sys.stdout.write(stack_diff(args.source, args.stack_class, changed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
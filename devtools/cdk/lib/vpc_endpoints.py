@@ -0,0 +1,84 @@
+from aws_cdk import Annotations, Stack, aws_ec2 as ec2
+from constructs import Construct
+
+from lib.base_resource import IResource
+
+INTERFACE_SERVICES = ("ecr.api", "ecr.dkr", "logs", "ssm", "ssmmessages", "secretsmanager")
+"""タスクの起動に使うインターフェイスエンドポイント(イメージのpull、ログ、シークレット)と、
+ECS Exec(enable_execute_command)のセッションに使うssmmessages"""
+
+GATEWAY_SERVICES = ("s3",)
+"""ゲートウェイエンドポイント。ECRのイメージレイヤーはS3から取得される"""
+
+DEFAULT_SERVICES = INTERFACE_SERVICES + GATEWAY_SERVICES
+
+
+class VpcEndpoints(Construct):
+    """Fargateタスクの起動に必要なAWSサービスのVPCエンドポイント
+
+    private subnetのタスクがNATを経由せずにイメージのpull・ログ出力・シークレット取得を行えるようにする。
+    IResource.vpc_endpoint_idsにあるサービスは作成済みのエンドポイントをそのまま使い、それ以外を作成する。
+    同じVPCに同じサービスのプライベートDNS付きエンドポイントは1つしか作れないため、
+    別のStackで作成済みの場合はvpc_endpoint_idsに登録すること。
+
+    インターフェイスエンドポイントは、IResource.sg_defaultからのHTTPSのみを許可するセキュリティグループを使う。
+    ゲートウェイエンドポイント(S3)はIResource.private_route_table_idsのルートテーブルに関連付ける。
+    private_route_table_idsが無い場合はS3のエンドポイントを作成せず(イメージレイヤーはNAT経由になる)、synth時に警告する。
+    """
+
+    def __init__(self, scope: Construct, id: str, rs: IResource, services: tuple[str, ...] = DEFAULT_SERVICES):
+        """
+        Args:
+            scope (Construct): 親のConstruct
+            id (str): Construct ID
+            rs (IResource): 環境別の既存リソース(vpc, private_subnets, sg_default を使う)
+            services (tuple[str, ...]): エンドポイントを用意するサービス(com.amazonaws.<region>. に続く名前)
+        """
+        super().__init__(scope, id)
+        self.endpoint_ids: dict[str, str] = {}
+        """サービス名 -> VPCエンドポイントID(作成したものはトークン)"""
+
+        region = Stack.of(self).region
+        existing = rs.vpc_endpoint_ids or {}
+        security_group = None
+        for service in services:
+            if service in existing:
+                self.endpoint_ids[service] = existing[service]
+                continue
+            if service in GATEWAY_SERVICES:
+                if not rs.private_route_table_ids:
+                    Annotations.of(self).add_warning_v2(
+                        f"vpc-endpoints:{service}-skipped",
+                        f"{service} gateway endpoint is not created: set IResource.private_route_table_ids "
+                        "or register the existing endpoint in IResource.vpc_endpoint_ids",
+                    )
+                    continue
+                endpoint = ec2.CfnVPCEndpoint(
+                    self,
+                    service,
+                    vpc_id=rs.vpc.vpc_id,
+                    service_name=f"com.amazonaws.{region}.{service}",
+                    vpc_endpoint_type="Gateway",
+                    route_table_ids=rs.private_route_table_ids,
+                )
+            else:
+                if security_group is None:
+                    security_group = ec2.SecurityGroup(
+                        self,
+                        "sg",
+                        vpc=rs.vpc,
+                        description=f"{id} interface endpoints",
+                        allow_all_outbound=False,
+                    )
+                    security_group.add_ingress_rule(rs.sg_default, ec2.Port.tcp(443), "ecs tasks")
+                endpoint = ec2.CfnVPCEndpoint(
+                    self,
+                    service,
+                    vpc_id=rs.vpc.vpc_id,
+                    service_name=f"com.amazonaws.{region}.{service}",
+                    vpc_endpoint_type="Interface",
+                    subnet_ids=[x.subnet_id for x in rs.private_subnets.subnets],
+                    security_group_ids=[security_group.security_group_id],
+                    private_dns_enabled=True,
+                )
+            self.endpoint_ids[service] = endpoint.ref
@@ -0,0 +1,19 @@
+import pytest
+
+import lib.image_platform as image_platform
+import lib.listener_priority as listener_priority
+
+
+@pytest.fixture(autouse=True)
+def isolated_listener_priority_cache(tmp_path, monkeypatch):
+    """テストがリポジトリのcdk.listener-priority.jsonを読み書きしないようにする"""
+    monkeypatch.setattr(listener_priority, "CACHE_FILE", tmp_path / "cdk.listener-priority.json")
+    listener_priority.ListenerPriorityAllocator.reset()
+    yield
+    listener_priority.ListenerPriorityAllocator.reset()
+
+
+@pytest.fixture(autouse=True)
+def offline_image_registry(monkeypatch):
+    """イメージのアーキテクチャ検証でレジストリへ問い合わせないようにする"""
+    monkeypatch.setattr(image_platform, "image_architectures", lambda image: frozenset(["amd64", "arm64"]))
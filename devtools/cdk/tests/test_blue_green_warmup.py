@@ -0,0 +1,94 @@
+import importlib.util
+import json
+from pathlib import Path
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+RULE_ARN = "arn:aws:elasticloadbalancing:ap-northeast-1:422746423551:listener-rule/app/dev-ecs-alb/e79b8893be6c0522/1/2"
+BLUE_ARN = "arn:aws:elasticloadbalancing:ap-northeast-1:422746423551:targetgroup/AdminerGbqStack-target/0123"
+GREEN_ARN = "arn:aws:elasticloadbalancing:ap-northeast-1:422746423551:targetgroup/AdminerGbqStack-green/4567"
+HOOK_SOURCE = Path(__file__).resolve().parent.parent / "functions" / "blue_green_warmup" / "index.py"
+
+
+def load_hook():
+    spec = importlib.util.spec_from_file_location("blue_green_warmup", HOOK_SOURCE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def hook(monkeypatch):
+    monkeypatch.setenv("TEST_RULE_ARN", RULE_ARN)
+    monkeypatch.setenv("WARMUP_REQUESTS", "2")
+    return load_hook()
+
+
+@pytest.fixture
+def elbv2():
+    client = boto3.client(
+        "elbv2", region_name="ap-northeast-1", aws_access_key_id="testing", aws_secret_access_key="testing"
+    )
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def stub_green(stubber, states):
+    # テスト用listenerのルールは、新しいタスクのターゲットグループへ全量を転送している
+    forward = {"TargetGroups": [{"TargetGroupArn": BLUE_ARN, "Weight": 0}, {"TargetGroupArn": GREEN_ARN, "Weight": 100}]}
+    stubber.add_response(
+        "describe_rules",
+        {"Rules": [{"RuleArn": RULE_ARN, "Actions": [{"Type": "forward", "ForwardConfig": forward}]}]},
+        {"RuleArns": [RULE_ARN]},
+    )
+    stubber.add_response(
+        "describe_target_health",
+        {
+            "TargetHealthDescriptions": [
+                {"Target": {"Id": f"10.0.0.{i}", "Port": 80}, "TargetHealth": {"State": state}}
+                for i, state in enumerate(states, 1)
+            ]
+        },
+        {"TargetGroupArn": GREEN_ARN},
+    )
+
+
+def test_warms_every_green_task(hook, elbv2, monkeypatch):
+    client, stubber = elbv2
+    stub_green(stubber, ["healthy", "initial", "draining"])
+    urls = []
+    monkeypatch.setattr(hook, "warmup", lambda url, timeout: urls.append(url) or {"status": "ok"})
+
+    assert hook.handler({"lifecycleStage": "POST_TEST_TRAFFIC_SHIFT"}, None, elbv2=client) == {
+        "hookStatus": "SUCCEEDED"
+    }
+    # 停止中のタスクは除き、各タスクのApacheワーカー数だけ呼び出す
+    assert sorted(urls) == [
+        "http://10.0.0.1:80/warmup?preload=1",
+        "http://10.0.0.1:80/warmup?preload=1",
+        "http://10.0.0.2:80/warmup?preload=1",
+        "http://10.0.0.2:80/warmup?preload=1",
+    ]
+
+
+def test_fails_when_warmup_fails(hook, elbv2, monkeypatch, capsys):
+    client, stubber = elbv2
+    stub_green(stubber, ["healthy"])
+
+    def warmup(url, timeout):
+        raise TimeoutError("timed out")
+
+    monkeypatch.setattr(hook, "warmup", warmup)
+
+    assert hook.handler({}, None, elbv2=client) == {"hookStatus": "FAILED"}
+    summary = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert summary["failed"] == 2
+
+
+def test_fails_without_green_targets(hook, elbv2):
+    client, stubber = elbv2
+    stub_green(stubber, [])
+    assert hook.handler({}, None, elbv2=client) == {"hookStatus": "FAILED"}
@@ -0,0 +1,65 @@
+"""エクスポートのジョブ(plugins/drivers/bigquery/BigQueryExportJob.php)のテスト。PHPが無い環境ではスキップする"""
+
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+PLUGIN_DIR = Path(__file__).resolve().parents[3] / "plugins" / "drivers" / "bigquery"
+
+pytestmark = pytest.mark.skipif(shutil.which("php") is None, reason="php is not installed")
+
+
+def run_php(code: str, stdin: str) -> str:
+    """codeを実行して標準出力を返す。stdinは $input で参照する"""
+    prelude = (
+        "namespace Adminer;"
+        "$input = file_get_contents('php://stdin');"
+        f"require '{PLUGIN_DIR / 'bigquery-utils.php'}';"
+        f"require '{PLUGIN_DIR / 'BigQueryExportJob.php'}';"
+    )
+    return subprocess.run(
+        ["php", "-r", prelude + code], input=stdin, check=True, capture_output=True, text=True
+    ).stdout
+
+
+JOB = {
+    "id": "0123456789abcdef",
+    "project": "example-project",
+    "dataset": "sales",
+    "table": "orders",
+    "query": "SELECT `id`, `total` FROM `orders` WHERE `total` > 100 ORDER BY `id`",
+    "format": "csv",
+    "key": "exports/sales/0123456789abcdef/orders.csv.gz",
+}
+
+
+def test_message_contains_no_credentials():
+    job = {**JOB, "access_token": "ya29.secret", "refresh_token": "1//secret"}
+    message = json.loads(run_php("echo BigQueryExportJob::create(json_decode($input, true));", json.dumps(job)))
+
+    assert message == JOB
+    assert "secret" not in json.dumps(message)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "not json",
+        json.dumps("orders"),
+        json.dumps({**JOB, "query": None}),
+        json.dumps({**JOB, "format": "sql"}),
+        json.dumps({**JOB, "key": "../outside"}),
+        json.dumps({**JOB, "query": "DROP TABLE `orders`"}),
+    ],
+)
+def test_malformed_message_is_rejected(body):
+    assert run_php("var_export(BigQueryExportJob::parse($input));", body) == "NULL"
+
+
+def test_message_round_trip():
+    code = "echo json_encode(BigQueryExportJob::parse(BigQueryExportJob::create(json_decode($input, true))));"
+    out = run_php(code, json.dumps(JOB))
+    assert json.loads(out) == JOB
@@ -0,0 +1,926 @@
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import aws_cdk as cdk
+import pytest
+from aws_cdk.assertions import Match, Template
+
+import config.env.dev as dev_env
+import config.env.local as local_env
+from adminer_gbq import AdminerGbqStack
+
+ENV = cdk.Environment(account="422746423551", region="ap-northeast-1")
+# 現行のdevtools/webからビルドしたイメージのタグ。イメージに依存する機能も有効になる
+REBUILT_IMAGE = {"image_tag": "master-0123abc"}
+
+
+def synth_adminer_gbq() -> Template:
+    app = cdk.App(context=REBUILT_IMAGE)
+    stack = AdminerGbqStack(app, "AdminerGbqTestStack", site_module=dev_env, env=ENV)
+    return Template.from_stack(stack)
+
+
+def web_service(template: Template, stack_id: str) -> dict:
+    """エクスポートワーカーのサービスと区別して、Webのサービスを論理IDで選ぶ"""
+    (service,) = [
+        x
+        for logical_id, x in template.find_resources("AWS::ECS::Service").items()
+        if logical_id.startswith(f"{stack_id}serviceService")
+    ]
+    return service
+
+
+def test_scalable_target():
+    template = synth_adminer_gbq()
+    # Webのサービスとエクスポートのワーカー
+    template.resource_count_is("AWS::ApplicationAutoScaling::ScalableTarget", 2)
+    template.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalableTarget",
+        {
+            "MinCapacity": 1,
+            "MaxCapacity": 4,
+            "ScalableDimension": "ecs:service:DesiredCount",
+            "ServiceNamespace": "ecs",
+        },
+    )
+
+
+def test_target_tracking_policies():
+    template = synth_adminer_gbq()
+    policies = template.find_resources(
+        "AWS::ApplicationAutoScaling::ScalingPolicy", {"Properties": {"PolicyType": "TargetTrackingScaling"}}
+    )
+    assert len(policies) == 3
+    for metric_type, target in (
+        ("ECSServiceAverageCPUUtilization", 60),
+        ("ECSServiceAverageMemoryUtilization", 75),
+        ("ALBRequestCountPerTarget", 300),
+    ):
+        template.has_resource_properties(
+            "AWS::ApplicationAutoScaling::ScalingPolicy",
+            {
+                "PolicyType": "TargetTrackingScaling",
+                "TargetTrackingScalingPolicyConfiguration": Match.object_like(
+                    {
+                        "PredefinedMetricSpecification": Match.object_like({"PredefinedMetricType": metric_type}),
+                        "TargetValue": target,
+                    }
+                ),
+            },
+        )
+
+
+def test_scheduled_scaling_and_warmup():
+    template = synth_adminer_gbq()
+    template.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalableTarget",
+        {
+            "MinCapacity": 1,
+            "MaxCapacity": 4,
+            "ScheduledActions": [
+                Match.object_like(
+                    {
+                        "Schedule": "cron(30 8 ? * MON-FRI *)",
+                        "ScalableTargetAction": {"MinCapacity": 2, "MaxCapacity": 4},
+                        "Timezone": "Asia/Tokyo",
+                    }
+                ),
+                Match.object_like(
+                    {
+                        "Schedule": "cron(0 20 ? * MON-FRI *)",
+                        "ScalableTargetAction": {"MinCapacity": 1, "MaxCapacity": 2},
+                        "Timezone": "Asia/Tokyo",
+                    }
+                ),
+            ],
+        },
+    )
+    # 起動したタスクはコンテナ内からウォームアップする
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "ContainerDefinitions": Match.array_with(
+                [
+                    Match.object_like(
+                        {"Name": "app", "Environment": Match.array_with([{"Name": "ADMINER_WARMUP", "Value": "true"}])}
+                    )
+                ]
+            )
+        },
+    )
+
+
+def test_offline_synth_has_no_lookups(tmp_path):
+    app = cdk.App(outdir=str(tmp_path))
+    stack = AdminerGbqStack(app, "AdminerGbqOfflineStack", site_module=local_env, env=ENV)
+    template = Template.from_stack(stack)
+
+    # 未解決のcontext lookupはmanifest.jsonのmissingに記録される
+    # (CloudAssembly.manifest.missingはjsiiで読み出せない)
+    assembly = app.synth()
+    manifest = json.loads((Path(assembly.directory) / "manifest.json").read_text())
+    assert not manifest.get("missing")
+    template.has_resource_properties(
+        "AWS::Route53::RecordSet",
+        {
+            "Name": "adminer-g.dev.car-mo.jp.",
+            "HostedZoneId": "ZTQOB3LUF1EAW",
+        },
+    )
+    template.has_resource_properties(
+        "AWS::ElasticLoadBalancingV2::ListenerRule",
+        {"ListenerArn": Match.string_like_regexp("listener/app/dev-ecs-alb/")},
+    )
+
+
+def test_unused_resources_are_not_constructed():
+    app = cdk.App()
+    stack = AdminerGbqStack(app, "AdminerGbqLazyStack", site_module=dev_env, env=ENV)
+
+    assert stack.rs.is_evaluated("zone_car_mo")
+    assert stack.rs.is_evaluated("cluster")
+    for name, construct_id in (
+        ("zone_carmo_kun", "zone_carmo_kun_jp"),
+        ("zone_app_carmo_kun", "zone_app_carmo_kun"),
+        ("zone_system_carmo_kun", "zone_system_carmo_kun"),
+        ("public_subnets", "carmo_system_public1-a"),
+        ("s3bucket_role", "s3bucket_role"),
+        ("elb_log_bucket", "log"),
+    ):
+        assert not stack.rs.is_evaluated(name)
+        assert stack.node.try_find_child(construct_id) is None
+
+
+def test_shared_cache_environment():
+    template = synth_adminer_gbq()
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "ContainerDefinitions": Match.array_with(
+                [
+                    Match.object_like(
+                        {
+                            "Name": "app",
+                            "Environment": Match.array_with(
+                                [
+                                    {
+                                        "Name": "BIGQUERY_CACHE_REDIS_URL",
+                                        "Value": "rediss://multipurpose-redis-vduj6j.serverless.apne1.cache.amazonaws.com:6379",
+                                    },
+                                    {"Name": "BIGQUERY_CACHE_LOCAL_TTL", "Value": "60"},
+                                ]
+                            ),
+                        }
+                    )
+                ]
+            )
+        },
+    )
+    # sg_defaultから汎用redisへの経路を開ける
+    template.has_resource_properties(
+        "AWS::EC2::SecurityGroupIngress",
+        {"FromPort": 6379, "ToPort": 6379, "SourceSecurityGroupId": "sg-0ab24e2d8fe967682"},
+    )
+
+
+def test_pinned_image_disables_image_features():
+    app = cdk.App()
+    stack = AdminerGbqStack(app, "AdminerGbqPinnedStack", site_module=dev_env, env=ENV)
+
+    assert stack.shared_cache is None
+    assert not stack.export_worker
+    assert not stack.warmup
+    template = Template.from_stack(stack)
+    assert not template.find_resources("AWS::EC2::SecurityGroupIngress", {"Properties": {"FromPort": 6379}})
+    template.resource_count_is("AWS::SQS::Queue", 0)
+    (container,) = [
+        x
+        for x in template.find_resources("AWS::ECS::TaskDefinition").values()
+        for x in x["Properties"]["ContainerDefinitions"]
+        if x["Name"] == "app"
+    ]
+    assert container["Image"] == "ghcr.io/takemi-ohama/adminer-bigquery:master-3431413"
+    names = [x["Name"] for x in container["Environment"]]
+    assert "BIGQUERY_CACHE_REDIS_URL" not in names
+    assert "APACHE_KEEPALIVE_TIMEOUT" not in names
+    assert "BIGQUERY_EXPORT_QUEUE_URL" not in names
+    assert "ADMINER_WARMUP" not in names
+
+
+class NoRedisSgResource(dev_env.Resource):
+    sg_multipurpose_redis = None
+
+
+def test_existing_shared_cache_requires_security_group():
+    site_module = SimpleNamespace(Resource=NoRedisSgResource)
+    with pytest.raises(ValueError, match="sg_multipurpose_redis"):
+        AdminerGbqStack(cdk.App(context=REBUILT_IMAGE), "AdminerGbqNoRedisSgStack", site_module=site_module, env=ENV)
+
+
+def test_on_demand_by_default():
+    template = synth_adminer_gbq()
+    template.has_resource_properties(
+        "AWS::ECS::Service", {"LaunchType": "FARGATE", "CapacityProviderStrategy": Match.absent()}
+    )
+
+
+class SpotAdminerGbqStack(AdminerGbqStack):
+    fargate_spot_weight = 3
+    # Spotの中断通知(120秒)内に登録解除を終えるため、fastプロファイルの300秒より短くする
+    max_request_duration = 90
+
+
+def test_fargate_spot_capacity_provider_strategy():
+    app = cdk.App()
+    stack = SpotAdminerGbqStack(app, "AdminerGbqSpotStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties(
+        "AWS::ECS::Service",
+        {
+            "LaunchType": Match.absent(),
+            "CapacityProviderStrategy": [
+                {"CapacityProvider": "FARGATE", "Base": 1, "Weight": 1},
+                {"CapacityProvider": "FARGATE_SPOT", "Weight": 3},
+            ],
+        },
+    )
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {"ContainerDefinitions": Match.array_with([Match.object_like({"Name": "app", "StopTimeout": 120})])},
+    )
+
+
+def test_php_runtime_environment_follows_task_size():
+    template = synth_adminer_gbq()
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "Cpu": "1024",
+            "Memory": "2048",
+            "ContainerDefinitions": Match.array_with(
+                [
+                    Match.object_like(
+                        {
+                            "Name": "app",
+                            "Environment": Match.array_with(
+                                [
+                                    {"Name": "PHP_MEMORY_LIMIT", "Value": "704M"},
+                                    {"Name": "PHP_APC_SHM_SIZE", "Value": "256M"},
+                                    {"Name": "PHP_OPCACHE_MEMORY_CONSUMPTION", "Value": "128"},
+                                ]
+                            ),
+                        }
+                    )
+                ]
+            ),
+        },
+    )
+
+
+def test_sizing_tier_uses_resource_sizes():
+    app = cdk.App()
+    stack = AdminerGbqStack(app, "AdminerGbqTierStack", site_module=dev_env, env=ENV)
+
+    # 開発環境のlargeは1024/2048
+    assert stack.sizing_tier == "large"
+    assert stack.task_size() == (1024, 2048)
+    assert stack.php_runtime_environment()["APACHE_MAX_REQUEST_WORKERS"] == "22"
+
+
+def test_target_group_routing_and_stickiness():
+    template = synth_adminer_gbq()
+    # CDKが出力する属性の順序には依存しない
+    for attribute in (
+        {"Key": "load_balancing.algorithm.type", "Value": "least_outstanding_requests"},
+        {"Key": "stickiness.enabled", "Value": "true"},
+        {"Key": "stickiness.type", "Value": "app_cookie"},
+        {"Key": "stickiness.app_cookie.cookie_name", "Value": "adminer_sid"},
+        {"Key": "stickiness.app_cookie.duration_seconds", "Value": "86400"},
+    ):
+        template.has_resource_properties(
+            "AWS::ElasticLoadBalancingV2::TargetGroup", {"TargetGroupAttributes": Match.array_with([attribute])}
+        )
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "ContainerDefinitions": Match.array_with(
+                [
+                    Match.object_like(
+                        {
+                            "Name": "app",
+                            "Environment": Match.array_with([{"Name": "APACHE_KEEPALIVE_TIMEOUT", "Value": "65"}]),
+                        }
+                    )
+                ]
+            )
+        },
+    )
+
+
+class SlowStartAdminerGbqStack(AdminerGbqStack):
+    slow_start = 60
+
+
+def test_slow_start_requires_compatible_routing():
+    app = cdk.App()
+    with pytest.raises(ValueError, match="slow_start"):
+        SlowStartAdminerGbqStack(app, "AdminerGbqSlowStartStack", site_module=dev_env, env=ENV)
+
+
+def test_health_checks_follow_pinned_image():
+    template = synth_adminer_gbq()
+    # 固定しているイメージには /healthz とcurlが無いため、Adminer本体を監視する
+    template.has_resource_properties(
+        "AWS::ElasticLoadBalancingV2::TargetGroup",
+        {
+            "HealthCheckPath": "/",
+            "Matcher": {"HttpCode": "200,302"},
+            "HealthCheckIntervalSeconds": 10,
+            "HealthCheckTimeoutSeconds": 5,
+            "HealthyThresholdCount": 2,
+            "UnhealthyThresholdCount": 2,
+        },
+    )
+    for task_def in template.find_resources("AWS::ECS::TaskDefinition").values():
+        for container in task_def["Properties"]["ContainerDefinitions"]:
+            assert "HealthCheck" not in container
+    template.has_resource_properties("AWS::ECS::Service", {"HealthCheckGracePeriodSeconds": 60})
+
+
+class HealthzAdminerGbqStack(AdminerGbqStack):
+    def create_ecs_task_def(self, id):
+        self.health_check_path = "/healthz"
+        self.healthy_http_codes = "200"
+        self.container_health_check_path = "/healthz"
+        self.container_health_check_start_period = 10
+        return super().create_ecs_task_def(id)
+
+
+def test_container_health_check_uses_static_endpoint():
+    stack = HealthzAdminerGbqStack(cdk.App(), "AdminerGbqHealthzStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+    template.has_resource_properties(
+        "AWS::ElasticLoadBalancingV2::TargetGroup", {"HealthCheckPath": "/healthz", "Matcher": {"HttpCode": "200"}}
+    )
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "ContainerDefinitions": Match.array_with(
+                [
+                    Match.object_like(
+                        {
+                            "Name": "app",
+                            "HealthCheck": {
+                                "Command": ["CMD-SHELL", "curl -fsS http://localhost:80/healthz || exit 1"],
+                                "Interval": 10,
+                                "Timeout": 2,
+                                "Retries": 3,
+                                "StartPeriod": 10,
+                            },
+                        }
+                    )
+                ]
+            )
+        },
+    )
+
+
+def test_fast_deployment_profile():
+    template = synth_adminer_gbq()
+    template.has_resource_properties(
+        "AWS::ECS::Service",
+        {
+            "DeploymentConfiguration": {
+                "MinimumHealthyPercent": 50,
+                "MaximumPercent": 200,
+                "DeploymentCircuitBreaker": {"Enable": True, "Rollback": True},
+            }
+        },
+    )
+    # エクスポートはワーカーで実行するため、Webは通常のリクエストの完了まで待つ
+    template.has_resource_properties(
+        "AWS::ElasticLoadBalancingV2::TargetGroup",
+        {
+            "TargetGroupAttributes": Match.array_with(
+                [{"Key": "deregistration_delay.timeout_seconds", "Value": "65"}]
+            )
+        },
+    )
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {"ContainerDefinitions": Match.array_with([Match.object_like({"Name": "app", "StopTimeout": 65})])},
+    )
+
+
+class WebExportAdminerGbqStack(AdminerGbqStack):
+    def create_ecs_task_def(self, id):
+        self.export_worker = False
+        return super().create_ecs_task_def(id)
+
+
+def test_fast_deployment_profile_waits_for_web_exports():
+    stack = WebExportAdminerGbqStack(cdk.App(), "AdminerGbqWebExportStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+    template.has_resource_properties(
+        "AWS::ElasticLoadBalancingV2::TargetGroup",
+        {
+            "TargetGroupAttributes": Match.array_with(
+                [{"Key": "deregistration_delay.timeout_seconds", "Value": "605"}]
+            )
+        },
+    )
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {"ContainerDefinitions": Match.array_with([Match.object_like({"Name": "app", "StopTimeout": 120})])},
+    )
+
+
+def test_spot_rejects_drain_longer_than_interruption_notice():
+    class LongDrainSpotStack(SpotAdminerGbqStack):
+        max_request_duration = 300
+
+    with pytest.raises(ValueError, match="interruption notice"):
+        LongDrainSpotStack(cdk.App(), "AdminerGbqLongDrainStack", site_module=dev_env, env=ENV)
+
+
+def test_dashboard_and_alarms():
+    template = synth_adminer_gbq()
+    template.resource_count_is("AWS::CloudWatch::Dashboard", 1)
+    template.has_resource_properties("AWS::CloudWatch::Dashboard", {"DashboardName": "AdminerGbqTestStack-performance"})
+    assert len(template.find_resources("AWS::CloudWatch::Alarm", {"Properties": {"Namespace": "AWS/ApplicationELB"}})) == 2
+    template.has_resource_properties(
+        "AWS::CloudWatch::Alarm",
+        {
+            "MetricName": "TargetResponseTime",
+            "ExtendedStatistic": "p99",
+            "Threshold": 10,
+            "EvaluationPeriods": 3,
+            "TreatMissingData": "notBreaching",
+        },
+    )
+    template.has_resource_properties(
+        "AWS::CloudWatch::Alarm", {"MetricName": "HTTPCode_Target_5XX_Count", "Threshold": 10}
+    )
+
+
+class UnmonitoredAdminerGbqStack(AdminerGbqStack):
+    monitoring = False
+
+
+def test_monitoring_can_be_disabled():
+    stack = UnmonitoredAdminerGbqStack(cdk.App(), "AdminerGbqUnmonitoredStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+    template.resource_count_is("AWS::CloudWatch::Dashboard", 0)
+    assert not template.find_resources("AWS::CloudWatch::Alarm", {"Properties": {"Namespace": "AWS/ApplicationELB"}})
+    # 32文字を超えるターゲットグループ名は、Stack IDを切り詰めてハッシュを付ける
+    template.has_resource_properties(
+        "AWS::ElasticLoadBalancingV2::TargetGroup", {"Name": "AdminerGbqUnmonito-acdb2e-target"}
+    )
+
+
+def test_emf_metrics():
+    template = synth_adminer_gbq()
+    template.resource_count_is("AWS::Logs::LogGroup", 1)
+    # CloudWatch LogsがEMFからメトリクスを作るため、メトリクスフィルタで二重に発行しない
+    template.resource_count_is("AWS::Logs::MetricFilter", 0)
+    (dashboard,) = template.find_resources("AWS::CloudWatch::Dashboard").values()
+    body = json.dumps(dashboard["Properties"]["DashboardBody"])
+    assert '[\\"AdminerBigQuery\\",\\"QueryLatency\\",\\"Service\\",\\"AdminerGbqTestStack\\"' in body
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "ContainerDefinitions": Match.array_with(
+                [
+                    Match.object_like(
+                        {
+                            "Name": "app",
+                            "Environment": Match.array_with(
+                                [{"Name": "BIGQUERY_METRICS_NAMESPACE", "Value": "AdminerBigQuery"}]
+                            ),
+                        }
+                    )
+                ]
+            )
+        },
+    )
+
+
+class TracingAdminerGbqStack(AdminerGbqStack):
+    tracing = True
+    tracing_sample_rate = 0.5
+
+
+def test_tracing_sidecar():
+    stack = TracingAdminerGbqStack(cdk.App(), "AdminerGbqTracingStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "TaskRoleArn": {"Fn::GetAtt": [Match.string_like_regexp("taskrole"), "Arn"]},
+            "ContainerDefinitions": Match.array_with(
+                [
+                    Match.object_like(
+                        {
+                            "Name": "otel-collector",
+                            "Essential": False,
+                            "Environment": [{"Name": "AOT_CONFIG_CONTENT", "Value": Match.string_like_regexp("awsxray")}],
+                        }
+                    ),
+                    Match.object_like(
+                        {
+                            "Name": "app",
+                            "Environment": Match.array_with(
+                                [
+                                    {"Name": "OTEL_EXPORTER_OTLP_ENDPOINT", "Value": "http://localhost:4318"},
+                                    {"Name": "OTEL_TRACES_SAMPLER_ARG", "Value": "0.5"},
+                                ]
+                            ),
+                        }
+                    ),
+                ]
+            ),
+        },
+    )
+    template.has_resource_properties(
+        "AWS::IAM::Role",
+        {
+            "ManagedPolicyArns": Match.array_with(
+                [{"Fn::Join": ["", ["arn:", {"Ref": "AWS::Partition"}, ":iam::aws:policy/AWSXrayWriteOnlyAccess"]]}]
+            )
+        },
+    )
+
+
+def test_tracing_is_off_by_default():
+    template = synth_adminer_gbq()
+    for task_def in template.find_resources("AWS::ECS::TaskDefinition").values():
+        names = [x["Name"] for x in task_def["Properties"]["ContainerDefinitions"]]
+        assert "otel-collector" not in names
+    assert not template.find_resources("AWS::IAM::Role", {"Properties": {"ManagedPolicyArns": Match.any_value()}})
+
+
+def test_profiling_uses_image_variant_and_uploads_to_s3():
+    app = cdk.App(context={"profiling": "true", **REBUILT_IMAGE})
+    stack = AdminerGbqStack(app, "AdminerGbqProfilingStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+
+    # プロファイルとエクスポートの保存先
+    template.resource_count_is("AWS::S3::Bucket", 2)
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "Volumes": [{"Name": "profiles"}],
+            "ContainerDefinitions": Match.array_with(
+                [
+                    Match.object_like(
+                        {
+                            "Name": "app",
+                            "Image": "ghcr.io/takemi-ohama/adminer-bigquery:master-0123abc-profiling",
+                            "Environment": Match.array_with(
+                                [
+                                    {"Name": "ADMINER_PROFILING_HZ", "Value": "99"},
+                                    {"Name": "ADMINER_PROFILING_DIR", "Value": "/tmp/profiles"},
+                                ]
+                            ),
+                            "MountPoints": [{"ContainerPath": "/tmp/profiles", "SourceVolume": "profiles", "ReadOnly": False}],
+                        }
+                    ),
+                    Match.object_like({"Name": "profiles-upload", "Essential": False}),
+                ]
+            ),
+        },
+    )
+    template.has_resource_properties(
+        "AWS::IAM::Policy",
+        {
+            "PolicyDocument": {
+                "Statement": Match.array_with([Match.object_like({"Action": Match.array_with(["s3:PutObject"])})])
+            }
+        },
+    )
+
+
+def test_profiling_is_off_by_default():
+    template = synth_adminer_gbq()
+    template.resource_count_is("AWS::S3::Bucket", 1)
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "ContainerDefinitions": Match.array_with(
+                [Match.object_like({"Name": "app", "Image": "ghcr.io/takemi-ohama/adminer-bigquery:master-0123abc"})]
+            )
+        },
+    )
+
+
+def test_export_worker():
+    template = synth_adminer_gbq()
+
+    template.resource_count_is("AWS::SQS::Queue", 2)
+    template.has_resource_properties(
+        "AWS::SQS::Queue",
+        {
+            "VisibilityTimeout": 3600,
+            "SqsManagedSseEnabled": True,
+            "RedrivePolicy": {"deadLetterTargetArn": Match.any_value(), "maxReceiveCount": 3},
+        },
+    )
+    template.has_resource_properties(
+        "AWS::ECS::Service", {"ServiceName": "AdminerGbqTestStack-export-service", "DesiredCount": 0}
+    )
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "Cpu": "512",
+            "Memory": "1024",
+            "ContainerDefinitions": [
+                Match.object_like(
+                    {
+                        "Name": "export-worker",
+                        "Command": ["php", "/var/www/html/plugins/drivers/bigquery/export-worker.php"],
+                        "Environment": Match.array_with(
+                            [{"Name": "GOOGLE_CLOUD_PROJECT", "Value": "nyle-carmo-analysis"}]
+                        ),
+                    }
+                )
+            ],
+        },
+    )
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "ContainerDefinitions": Match.array_with(
+                [
+                    Match.object_like(
+                        {
+                            "Name": "app",
+                            "Environment": Match.array_with(
+                                [
+                                    {"Name": "BIGQUERY_EXPORT_QUEUE_URL", "Value": Match.any_value()},
+                                    {"Name": "BIGQUERY_EXPORT_REGION", "Value": "ap-northeast-1"},
+                                ]
+                            ),
+                        }
+                    )
+                ]
+            )
+        },
+    )
+    # ジョブが無い間は0タスクまでスケールインする
+    template.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalableTarget", {"MinCapacity": 0, "MaxCapacity": 2}
+    )
+    template.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalingPolicy",
+        {
+            "PolicyType": "StepScaling",
+            "StepScalingPolicyConfiguration": Match.object_like({"AdjustmentType": "ExactCapacity"}),
+        },
+    )
+
+
+class CdnAdminerGbqStack(AdminerGbqStack):
+    cdn = True
+    cdn_certificate_arn = "arn:aws:acm:us-east-1:422746423551:certificate/00000000-0000-0000-0000-000000000000"
+
+
+def test_cdn_caches_static_paths_and_passes_through_pages():
+    stack = CdnAdminerGbqStack(cdk.App(), "AdminerGbqCdnStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties(
+        "AWS::CloudFront::Distribution",
+        {
+            "DistributionConfig": Match.object_like(
+                {
+                    "Aliases": ["adminer-g.dev.car-mo.jp"],
+                    # CachingDisabled / AllViewer
+                    "DefaultCacheBehavior": Match.object_like(
+                        {
+                            "CachePolicyId": "4135ea2d-6df8-44a3-9df3-4b5a84be39ad",
+                            "OriginRequestPolicyId": "216adef6-5c7f-47e4-b989-5492eafa07d3",
+                        }
+                    ),
+                    "CacheBehaviors": Match.array_with(
+                        [Match.object_like({"PathPattern": "/adminer/static/*"})]
+                    ),
+                    "Origins": [
+                        Match.object_like(
+                            {"CustomOriginConfig": Match.object_like({"OriginProtocolPolicy": "https-only"})}
+                        )
+                    ],
+                }
+            )
+        },
+    )
+    template.has_resource_properties(
+        "AWS::CloudFront::CachePolicy",
+        {
+            "CachePolicyConfig": Match.object_like(
+                {
+                    "DefaultTTL": 86400,
+                    "ParametersInCacheKeyAndForwardedToOrigin": Match.object_like(
+                        {"HeadersConfig": Match.object_like({"HeaderBehavior": "whitelist"})}
+                    ),
+                }
+            )
+        },
+    )
+    template.has_resource_properties(
+        "AWS::Route53::RecordSet",
+        {"AliasTarget": Match.object_like({"DNSName": {"Fn::GetAtt": [Match.any_value(), "DomainName"]}})},
+    )
+
+
+def test_cdn_requires_certificate():
+    class NoCertificateStack(AdminerGbqStack):
+        cdn = True
+
+    with pytest.raises(ValueError, match="cloudfront_certificate_arn"):
+        NoCertificateStack(cdk.App(), "AdminerGbqNoCertStack", site_module=dev_env, env=ENV)
+
+
+def test_cdn_is_off_by_default():
+    template = synth_adminer_gbq()
+    template.resource_count_is("AWS::CloudFront::Distribution", 0)
+
+
+class PullThroughResource(dev_env.Resource):
+    def __init__(self, scope):
+        super().__init__(scope)
+        self.pull_through_cache_prefixes = {"ghcr.io": "ghcr"}
+        self.vpc_endpoint_ids = {"s3": "vpce-0123456789abcdef0"}
+
+
+class PrivateNetworkAdminerGbqStack(AdminerGbqStack):
+    vpc_endpoints = True
+    pull_through_cache = True
+
+
+def test_pull_through_cache_and_vpc_endpoints():
+    site_module = SimpleNamespace(Resource=PullThroughResource)
+    stack = PrivateNetworkAdminerGbqStack(cdk.App(), "AdminerGbqPrivateStack", site_module=site_module, env=ENV)
+    template = Template.from_stack(stack)
+
+    # ghcr.ioのイメージをECRのプルスルーキャッシュ(ghcr/)から取得する
+    images = [
+        json.dumps(x["Image"])
+        for task_def in template.find_resources("AWS::ECS::TaskDefinition").values()
+        for x in task_def["Properties"]["ContainerDefinitions"]
+    ]
+    assert any("/ghcr/takemi-ohama/adminer-bigquery:master-3431413" in x for x in images)
+    assert not any("ghcr.io" in x for x in images)
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 6)
+    # タスクはVPCエンドポイントの作成後に起動する
+    for service in template.find_resources("AWS::ECS::Service").values():
+        assert any("endpoints" in x for x in service["DependsOn"])
+
+
+class SociAdminerGbqStack(AdminerGbqStack):
+    soci_repository = "adminer-bigquery"
+
+
+def test_soci_image_from_ecr():
+    stack = SociAdminerGbqStack(cdk.App(context=REBUILT_IMAGE), "AdminerGbqSociStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+
+    # Webとエクスポートワーカーは、公開元と同じタグのイメージをECRから取得する
+    images = [
+        json.dumps(x["Image"])
+        for task_def in template.find_resources("AWS::ECS::TaskDefinition").values()
+        for x in task_def["Properties"]["ContainerDefinitions"]
+        if x["Name"] in ("app", "export-worker")
+    ]
+    assert len(images) == 2
+    assert all(".dkr.ecr." in x and "/adminer-bigquery:master-0123abc" in x for x in images)
+    assert "ghcr.io/takemi-ohama/adminer-bigquery:master-0123abc" in stack.registry_images
+    # 共通の実行ロールはmutable=Falseで参照するため、ECRのpull権限はStackから追加しない
+    policies = json.dumps(template.find_resources("AWS::IAM::Policy"))
+    assert "ecr:BatchGetImage" not in policies
+
+
+def test_awslogs_is_non_blocking_by_default():
+    template = synth_adminer_gbq()
+    for task_def in template.find_resources("AWS::ECS::TaskDefinition").values():
+        for container in task_def["Properties"]["ContainerDefinitions"]:
+            options = container["LogConfiguration"]["Options"]
+            assert container["LogConfiguration"]["LogDriver"] == "awslogs"
+            assert options["mode"] == "non-blocking"
+            # Size.mebibytes(25)はバイト単位で出力される
+            assert options["max-buffer-size"] == "26214400b"
+
+
+class FirelensAdminerGbqStack(AdminerGbqStack):
+    log_driver = "firelens"
+    log_archive_s3 = True
+
+
+def test_firelens_log_router():
+    stack = FirelensAdminerGbqStack(cdk.App(context=REBUILT_IMAGE), "AdminerGbqFirelensStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+
+    # Webとエクスポートワーカーのタスク定義に、それぞれルーターを追加する
+    task_defs = template.find_resources("AWS::ECS::TaskDefinition").values()
+    for task_def in task_defs:
+        containers = {x["Name"]: x for x in task_def["Properties"]["ContainerDefinitions"]}
+        router = containers.pop("log-router")
+        assert router["FirelensConfiguration"]["Type"] == "fluentbit"
+        assert router["FirelensConfiguration"]["Options"]["config-file-type"] == "file"
+        assert router["LogConfiguration"]["LogDriver"] == "awslogs"
+        environment = {x["Name"]: x["Value"] for x in router["Environment"]}
+        assert environment["LOG_EXCLUDE_PATTERN"] == "ELB-HealthChecker"
+        assert "[OUTPUT]\n    Name              s3" in environment["ADMINER_FLUENT_BIT_CONFIG"]
+        for container in containers.values():
+            assert container["LogConfiguration"]["LogDriver"] == "awsfirelens"
+    assert len(task_defs) == 2
+    # エクスポートとログのアーカイブ
+    template.resource_count_is("AWS::S3::Bucket", 2)
+
+
+class UnknownLogDriverAdminerGbqStack(AdminerGbqStack):
+    log_driver = "syslog"
+
+
+def test_unknown_log_driver():
+    with pytest.raises(ValueError, match="log_driver"):
+        UnknownLogDriverAdminerGbqStack(cdk.App(), "AdminerGbqSyslogStack", site_module=dev_env, env=ENV)
+
+
+
+class BlueGreenAdminerGbqStack(AdminerGbqStack):
+    preload_datasets = ["analytics"]
+    preload_tables = ["analytics.events"]
+
+
+def test_blue_green_with_warmup_hook():
+    app = cdk.App(context={"blue_green": "true", **REBUILT_IMAGE})
+    stack = BlueGreenAdminerGbqStack(app, "AdminerGbqBlueGreenStack", site_module=dev_env, env=ENV)
+    template = Template.from_stack(stack)
+
+    template.has_resource_properties(
+        "AWS::ECS::Service",
+        {"DeploymentConfiguration": Match.object_like({"Strategy": "BLUE_GREEN", "BakeTimeInMinutes": 10})},
+    )
+    # 本番とテスト用listenerのルールを、2つのターゲットグループで切り替える
+    target_groups = template.find_resources("AWS::ElasticLoadBalancingV2::TargetGroup").values()
+    assert sorted(x["Properties"]["Name"] for x in target_groups) == [
+        "AdminerGbqBlueGreenStack-green",
+        "AdminerGbqBlueGreenStack-target",
+    ]
+    template.has_resource_properties("AWS::ElasticLoadBalancingV2::Listener", {"Port": 10080, "Protocol": "HTTP"})
+    template.resource_count_is("AWS::ElasticLoadBalancingV2::ListenerRule", 2)
+    # RequestCountPerTargetのポリシーは作らない
+    policies = template.find_resources("AWS::ApplicationAutoScaling::ScalingPolicy")
+    assert "ALBRequestCountPerTarget" not in json.dumps(policies)
+
+    service = web_service(template, "AdminerGbqBlueGreenStack")
+    (hook,) = service["Properties"]["DeploymentConfiguration"]["LifecycleHooks"]
+    assert hook["LifecycleStages"] == ["POST_TEST_TRAFFIC_SHIFT"]
+    (load_balancer,) = service["Properties"]["LoadBalancers"]
+    assert "AdvancedConfiguration" in load_balancer
+
+    functions = template.find_resources("AWS::Lambda::Function", {"Properties": {"Handler": "index.handler"}})
+    (function,) = functions.values()
+    environment = function["Properties"]["Environment"]["Variables"]
+    assert environment["WARMUP_PATH"] == "/warmup?preload=1"
+    assert environment["WARMUP_REQUESTS"] == stack.php_runtime_environment()["APACHE_START_SERVERS"]
+    assert "VpcConfig" in function["Properties"]
+
+    app_containers = [
+        c
+        for x in template.find_resources("AWS::ECS::TaskDefinition").values()
+        for c in x["Properties"]["ContainerDefinitions"]
+        if c["Name"] == "app"
+    ]
+    variables = {x["Name"]: x["Value"] for x in app_containers[0]["Environment"]}
+    assert variables["ADMINER_PRELOAD_DATASETS"] == "analytics"
+    assert variables["ADMINER_PRELOAD_TABLES"] == "analytics.events"
+
+
+def test_blue_green_requires_rebuilt_image():
+    app = cdk.App(context={"blue_green": "true"})
+    with pytest.raises(ValueError, match="image_tag"):
+        AdminerGbqStack(app, "AdminerGbqBlueGreenPinnedStack", site_module=dev_env, env=ENV)
+
+
+def test_rolling_update_by_default():
+    template = synth_adminer_gbq()
+    service = web_service(template, "AdminerGbqTestStack")
+    assert "Strategy" not in service["Properties"]["DeploymentConfiguration"]
+    template.resource_count_is("AWS::ElasticLoadBalancingV2::TargetGroup", 1)
+    assert not template.find_resources("AWS::Lambda::Function", {"Properties": {"Handler": "index.handler"}})
+
+
+class BlueGreenRequestScalingAdminerGbqStack(AdminerGbqStack):
+    def create_ecs_service_elb(self, *args, **kwargs):
+        self.scaling_requests_per_target = 300
+        return super().create_ecs_service_elb(*args, **kwargs)
+
+
+def test_blue_green_rejects_request_count_scaling():
+    app = cdk.App(context={"blue_green": "true", **REBUILT_IMAGE})
+    with pytest.raises(ValueError, match="scaling_requests_per_target"):
+        BlueGreenRequestScalingAdminerGbqStack(app, "AdminerGbqBlueGreenRpsStack", site_module=dev_env, env=ENV)
@@ -0,0 +1,78 @@
+"""FargateServicePatternが出力するテンプレートのスナップショットテスト
+
+スナップショットは tests/snapshots/<name>.template.json に保存する。
+意図した変更でテンプレートが変わった場合は `UPDATE_SNAPSHOTS=1 pytest` で更新し、差分をレビューしてコミットする。
+スナップショットが存在しない場合は失敗する(新しいスナップショットも `UPDATE_SNAPSHOTS=1` で記録する)。
+"""
+
+import json
+import os
+from pathlib import Path
+
+import aws_cdk as cdk
+import pytest
+from aws_cdk import aws_ecs as ecs
+from aws_cdk.assertions import Template
+
+import config.env.local as local_env
+from adminer_gbq import AdminerGbqStack
+from lib.default_patterns import DefaultPatterns
+from lib.fargate_service_pattern import FargateServicePattern
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent / "snapshots"
+ENV = cdk.Environment(account="422746423551", region="ap-northeast-1")
+
+
+class MinimalServiceStack(FargateServicePattern):
+    """パターンの既定値のみで構築する最小構成のStack"""
+
+    def __init__(self, scope, id, **kwargs):
+        super().__init__(scope, id, **kwargs)
+
+        self.rs = DefaultPatterns(self).newResource(local_env)
+        self.cpu = 256
+        self.memory_limit_mib = 512
+        self.zone = self.rs.zone_car_mo
+        self.fqdn = f"minimal.{self.zone.zone_name}"
+        self.host_headers = [self.fqdn]
+        self.port = 80
+        self.health_check_path = "/"
+
+        task_def = self.create_ecs_task_def(id)
+        task_def.add_container(
+            f"{id}-app",
+            container_name="app",
+            image=ecs.ContainerImage.from_registry("public.ecr.aws/nginx/nginx:latest"),
+            port_mappings=[ecs.PortMapping(container_port=80)],
+        )
+        self.create_ecs_service_elb(id, task_def, service_container_name="app")
+        self.create_route53_record(id)
+
+
+def assert_matches_snapshot(name: str, template: Template):
+    actual = template.to_json()
+    path = SNAPSHOT_DIR / f"{name}.template.json"
+    if os.environ.get("UPDATE_SNAPSHOTS"):
+        SNAPSHOT_DIR.mkdir(exist_ok=True)
+        with path.open("w") as f:
+            json.dump(actual, f, indent=2, sort_keys=True)
+            f.write("\n")
+        pytest.skip(f"snapshot recorded: {path.name}")
+    if not path.exists():
+        pytest.fail(f"snapshot {path.name} is missing; run with UPDATE_SNAPSHOTS=1 and commit it")
+
+    with path.open() as f:
+        expected = json.load(f)
+    assert actual == expected, f"template differs from {path.name}; run with UPDATE_SNAPSHOTS=1 if intended"
+
+
+def test_adminer_gbq_template():
+    app = cdk.App()
+    stack = AdminerGbqStack(app, "AdminerGbqSnapshotStack", site_module=local_env, env=ENV)
+    assert_matches_snapshot("AdminerGbqStack", Template.from_stack(stack))
+
+
+def test_minimal_pattern_template():
+    app = cdk.App()
+    stack = MinimalServiceStack(app, "MinimalServiceStack", env=ENV)
+    assert_matches_snapshot("MinimalServiceStack", Template.from_stack(stack))
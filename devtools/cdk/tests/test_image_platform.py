@@ -0,0 +1,34 @@
+import pytest
+from aws_cdk import aws_ecs as ecs
+
+import lib.image_platform as image_platform
+from lib.image_platform import ImageArchitectureValidation, architecture_name, parse_image
+
+
+@pytest.mark.parametrize(
+    "image, expected",
+    [
+        (
+            "ghcr.io/takemi-ohama/adminer-bigquery:master-3431413",
+            ("ghcr.io", "takemi-ohama/adminer-bigquery", "master-3431413"),
+        ),
+        ("public.ecr.aws/nginx/nginx", ("public.ecr.aws", "nginx/nginx", "latest")),
+        ("php:8.3-apache", ("registry-1.docker.io", "library/php", "8.3-apache")),
+        ("localhost:5000/adminer@sha256:abc", ("localhost:5000", "adminer", "sha256:abc")),
+    ],
+)
+def test_parse_image(image, expected):
+    assert parse_image(image) == expected
+
+
+def test_architecture_name():
+    assert architecture_name(ecs.CpuArchitecture.X86_64) == "amd64"
+    assert architecture_name(ecs.CpuArchitecture.ARM64) == "arm64"
+
+
+def test_validation_reports_missing_architecture(monkeypatch):
+    monkeypatch.setattr(image_platform, "image_architectures", lambda image: frozenset(["amd64"]))
+
+    assert ImageArchitectureValidation(["example/app:1"], ecs.CpuArchitecture.X86_64).validate() == []
+    errors = ImageArchitectureValidation(["example/app:1"], ecs.CpuArchitecture.ARM64).validate()
+    assert errors == ["example/app:1 does not support arm64 (available: amd64)"]
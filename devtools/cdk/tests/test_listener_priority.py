@@ -0,0 +1,128 @@
+import json
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from lib.listener_priority import ListenerPriorityAllocator
+
+LISTENER_ARN = (
+    "arn:aws:elasticloadbalancing:ap-northeast-1:422746423551:listener/app/dev-ecs-alb/e79b8893be6c0522/d85c476404caddb1"
+)
+
+
+def host_rule(priority, *hosts):
+    return {
+        "RuleArn": f"{LISTENER_ARN}/rule-{priority}",
+        "Priority": str(priority),
+        "Conditions": [{"Field": "host-header", "HostHeaderConfig": {"Values": list(hosts)}}],
+        "Actions": [],
+        "IsDefault": False,
+    }
+
+
+def path_rule(priority, path):
+    return {
+        "RuleArn": f"{LISTENER_ARN}/rule-{priority}",
+        "Priority": str(priority),
+        "Conditions": [{"Field": "path-pattern", "PathPatternConfig": {"Values": [path]}}],
+        "Actions": [],
+        "IsDefault": False,
+    }
+
+
+DEFAULT_RULE = {"RuleArn": f"{LISTENER_ARN}/default", "Priority": "default", "Conditions": [], "IsDefault": True}
+
+
+@pytest.fixture
+def client():
+    return boto3.client(
+        "elbv2", region_name="ap-northeast-1", aws_access_key_id="testing", aws_secret_access_key="testing"
+    )
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return tmp_path / "cdk.listener-priority.json"
+
+
+def stub_pages(stubber, *pages):
+    marker = None
+    for i, rules in enumerate(pages):
+        params = {"ListenerArn": LISTENER_ARN, "PageSize": 400}
+        if marker is not None:
+            params["Marker"] = marker
+        response = {"Rules": rules}
+        if i < len(pages) - 1:
+            marker = f"page-{i + 1}"
+            response["NextMarker"] = marker
+        stubber.add_response("describe_rules", response, params)
+
+
+def test_paginates_and_skips_non_host_rules(client, cache_path):
+    with Stubber(client) as stubber:
+        stub_pages(
+            stubber,
+            [DEFAULT_RULE, host_rule(1, "a.dev.car-mo.jp"), path_rule(7, "/api/*")],
+            [host_rule(3, "b.dev.car-mo.jp", "b2.dev.car-mo.jp")],
+        )
+        allocator = ListenerPriorityAllocator(LISTENER_ARN, client=client, cache_path=cache_path)
+
+        assert allocator.priority(["b2.dev.car-mo.jp"]) == 3
+        assert allocator.priority(["a.dev.car-mo.jp"]) == 1
+        # パスベースのルールが使用している7とも衝突しない
+        assert allocator.priority(["new.dev.car-mo.jp"]) == 8
+        stubber.assert_no_pending_responses()
+
+
+def test_new_hosts_do_not_collide_across_stacks(client, cache_path):
+    with Stubber(client) as stubber:
+        stub_pages(stubber, [host_rule(5, "a.dev.car-mo.jp")])
+
+        first = ListenerPriorityAllocator.for_listener(LISTENER_ARN, client=client, cache_path=cache_path)
+        second = ListenerPriorityAllocator.for_listener(LISTENER_ARN, client=client, cache_path=cache_path)
+
+        assert first is second
+        assert first.priority(["x.dev.car-mo.jp"]) == 6
+        assert second.priority(["y.dev.car-mo.jp"]) == 7
+        assert second.priority(["x.dev.car-mo.jp"]) == 6
+        stubber.assert_no_pending_responses()
+
+
+def test_disk_cache_is_reused_by_next_process(client, cache_path):
+    with Stubber(client) as stubber:
+        stub_pages(stubber, [host_rule(2, "a.dev.car-mo.jp")])
+        ListenerPriorityAllocator(LISTENER_ARN, client=client, cache_path=cache_path).priority(["x.dev.car-mo.jp"])
+
+    cached = json.loads(cache_path.read_text())[LISTENER_ARN]
+    assert cached == {"rules": {"a.dev.car-mo.jp": 2}, "used": [2], "allocated": {"x.dev.car-mo.jp": 3}}
+
+    # Stubberに応答を登録しないため、AWSへ問い合わせると失敗する
+    with Stubber(client):
+        allocator = ListenerPriorityAllocator(LISTENER_ARN, client=client, cache_path=cache_path)
+        assert allocator.priority(["x.dev.car-mo.jp"]) == 3
+        assert allocator.priority(["a.dev.car-mo.jp"]) == 2
+
+
+def test_refresh_drops_colliding_allocations(client, cache_path):
+    with Stubber(client) as stubber:
+        stub_pages(stubber, [host_rule(2, "a.dev.car-mo.jp")])
+        ListenerPriorityAllocator(LISTENER_ARN, client=client, cache_path=cache_path).priority(["x.dev.car-mo.jp"])
+
+    with Stubber(client) as stubber:
+        # 別のStackが3番を先にデプロイした
+        stub_pages(stubber, [host_rule(2, "a.dev.car-mo.jp"), host_rule(3, "z.dev.car-mo.jp")])
+        allocator = ListenerPriorityAllocator.for_listener(
+            LISTENER_ARN, client=client, cache_path=cache_path, refresh=True
+        )
+
+        assert allocator.priority(["x.dev.car-mo.jp"]) == 4
+        assert allocator.priority(["z.dev.car-mo.jp"]) == 3
+        stubber.assert_no_pending_responses()
+
+
+def test_empty_listener(client, cache_path):
+    with Stubber(client) as stubber:
+        stub_pages(stubber, [DEFAULT_RULE])
+        allocator = ListenerPriorityAllocator(LISTENER_ARN, client=client, cache_path=cache_path)
+        assert allocator.priority(["a.dev.car-mo.jp"]) == 1
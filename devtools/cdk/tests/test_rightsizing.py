@@ -0,0 +1,181 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import boto3
+import pytest
+from botocore.stub import ANY, Stubber
+
+from lib.rightsizing import RightsizingAdvisor, percentile, stack_diff, stack_settings, task_size
+
+STACK_ID = "AdminerGbqDevStack"
+CLUSTER = "development-ecs"
+NOW = datetime(2026, 10, 1, tzinfo=timezone.utc)
+SOURCE = Path(__file__).resolve().parent.parent / "adminer_gbq.py"
+TASK_DEF_ARN = "arn:aws:ecs:ap-northeast-1:422746423551:task-definition/AdminerGbqDevStack:12"
+TARGET_GROUP_ARN = (
+    "arn:aws:elasticloadbalancing:ap-northeast-1:422746423551:targetgroup/AdminerGbqDevStack-target/0123456789abcdef"
+)
+LOAD_BALANCER_ARN = (
+    "arn:aws:elasticloadbalancing:ap-northeast-1:422746423551:loadbalancer/app/dev-ecs-alb/e79b8893be6c0522"
+)
+SETTINGS = {
+    "scaling_cpu_target": 60,
+    "scaling_memory_target": 75,
+    "scaling_requests_per_target": 300,
+    "alarm_latency_p99": 10,
+}
+
+
+def make_client(service):
+    return boto3.client(
+        service, region_name="ap-northeast-1", aws_access_key_id="testing", aws_secret_access_key="testing"
+    )
+
+
+@pytest.fixture
+def clients():
+    return {x: make_client(x) for x in ("cloudwatch", "ecs", "elbv2")}
+
+
+def stub_deployment(stubbers, cpu="1024", memory="2048", desired_count=2):
+    stubbers["ecs"].add_response(
+        "describe_services",
+        {
+            "services": [
+                {
+                    "serviceName": f"{STACK_ID}-service",
+                    "taskDefinition": TASK_DEF_ARN,
+                    "desiredCount": desired_count,
+                    "loadBalancers": [{"targetGroupArn": TARGET_GROUP_ARN, "containerName": "app", "containerPort": 80}],
+                }
+            ]
+        },
+        {"cluster": CLUSTER, "services": [f"{STACK_ID}-service"]},
+    )
+    stubbers["ecs"].add_response(
+        "describe_task_definition",
+        {"taskDefinition": {"taskDefinitionArn": TASK_DEF_ARN, "cpu": cpu, "memory": memory}},
+        {"taskDefinition": TASK_DEF_ARN},
+    )
+    stubbers["elbv2"].add_response(
+        "describe_target_groups",
+        {"TargetGroups": [{"TargetGroupArn": TARGET_GROUP_ARN, "LoadBalancerArns": [LOAD_BALANCER_ARN]}]},
+        {"TargetGroupArns": [TARGET_GROUP_ARN]},
+    )
+
+
+def stub_metric_pages(stubbers, weeks, *pages):
+    """pagesは {クエリのId: 値の配列} のページ。時刻は5分間隔で振る"""
+    start = NOW - timedelta(weeks=weeks)
+    offset = 0
+    for i, page in enumerate(pages):
+        params = {"MetricDataQueries": ANY, "StartTime": start, "EndTime": NOW, "ScanBy": "TimestampAscending"}
+        if i > 0:
+            params["NextToken"] = f"page-{i}"
+        results = []
+        for id, values in page.items():
+            timestamps = [start + timedelta(minutes=5 * (offset + n)) for n in range(len(values))]
+            results.append({"Id": id, "Timestamps": timestamps, "Values": values, "StatusCode": "Complete"})
+        response = {"MetricDataResults": results}
+        if i < len(pages) - 1:
+            response["NextToken"] = f"page-{i + 1}"
+        stubbers["cloudwatch"].add_response("get_metric_data", response, params)
+        offset += max(len(x) for x in page.values())
+
+
+def series(n, **values):
+    return {id: [value] * n for id, value in values.items()}
+
+
+def recommend(clients, weeks, *pages, settings=SETTINGS, **deployment):
+    stubbers = {name: Stubber(client) for name, client in clients.items()}
+    stub_deployment(stubbers, **deployment)
+    stub_metric_pages(stubbers, weeks, *pages)
+    for stubber in stubbers.values():
+        stubber.activate()
+    advisor = RightsizingAdvisor(STACK_ID, CLUSTER, weeks=weeks, now=NOW, **clients)
+    values, notes = advisor.recommend(settings)
+    for stubber in stubbers.values():
+        stubber.assert_no_pending_responses()
+        stubber.deactivate()
+    return values, notes
+
+
+def test_downsizes_idle_tasks(clients):
+    # 2ページに分けて、半分はCPU20%、残りは50%で2タスクが稼働
+    quiet = series(50, cpu_avg=20.0, cpu_max=40.0, mem_max=30.0, tasks=2.0, requests=600.0, latency_p99=1.0)
+    busy = series(50, cpu_avg=50.0, cpu_max=40.0, mem_max=30.0, tasks=2.0, requests=600.0, latency_p99=1.0)
+    values, notes = recommend(clients, 4, quiet, busy)
+
+    # 1タスクの最大は1024の40%(410)、メモリは2048の30%(614MiB)を75%に収める
+    assert values["cpu"] == 512
+    assert values["memory_limit_mib"] == 1024
+    # 中央値410ユニットと、p99の1024ユニットの1.25倍を、512の60%(307ユニット)で賄う
+    assert values["min_capacity"] == 2
+    assert values["desired_count"] == 2
+    assert values["max_capacity"] == 5
+    assert values["scaling_cpu_target"] == 60
+    # 1分あたり12000リクエスト / CPU使用量71680ユニット * 307ユニット
+    assert values["scaling_requests_per_target"] == 51
+    assert "datapoints: 100 x 300s over 4 weeks" in notes
+
+
+def test_slow_latency_lowers_cpu_target(clients):
+    fast = series(95, cpu_avg=30.0, cpu_max=60.0, mem_max=50.0, tasks=1.0, requests=100.0, latency_p99=2.0)
+    slow = series(5, cpu_avg=30.0, cpu_max=60.0, mem_max=50.0, tasks=1.0, requests=100.0, latency_p99=12.0)
+    fast = {k: v + slow[k] for k, v in fast.items()}
+    values, notes = recommend(clients, 2, fast, desired_count=1)
+
+    assert values["scaling_cpu_target"] == 50
+    assert values["cpu"] == 1024
+    # 2048の50%(1024MiB)を75%に収める
+    assert values["memory_limit_mib"] == 2048
+    assert values["min_capacity"] == 1
+    assert values["max_capacity"] == 2
+    assert "p99 latency above 10s in 5.0% of periods" in notes
+
+
+def test_no_datapoints(clients):
+    with pytest.raises(ValueError, match="no CPUUtilization datapoints"):
+        recommend(clients, 4, series(0, cpu_avg=0.0, cpu_max=0.0, mem_max=0.0, tasks=0.0))
+
+
+def test_task_size():
+    assert task_size(100, 300) == (256, 512)
+    # 256のメモリ上限(2048)を超えると512に上げる
+    assert task_size(100, 3000) == (512, 3072)
+    with pytest.raises(ValueError):
+        task_size(20000, 1024)
+
+
+def test_percentile():
+    assert percentile([], 99) == 0.0
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile([5, 1, 3], 50) == 3
+
+
+def test_stack_settings_reads_adminer_gbq():
+    settings = stack_settings(SOURCE.read_text(), "AdminerGbqStack")
+    assert settings["sizing_tier"][1] == "large"
+    assert "cpu" not in settings
+    assert settings["scaling_cpu_target"][1] == 60
+    assert "desired_count" not in settings
+
+
+def test_stack_diff(tmp_path):
+    source = tmp_path / "adminer_gbq.py"
+    source.write_text(SOURCE.read_text())
+    diff = stack_diff(source, "AdminerGbqStack", {"max_capacity": 6, "desired_count": 2})
+
+    # 未設定の属性はsizing_tierの後に追加する
+    assert '         self.sizing_tier = "large"\n+        self.desired_count = 2\n' in diff
+    assert "-        self.max_capacity = 4\n+        self.max_capacity = 6\n" in diff
+    assert stack_diff(source, "AdminerGbqStack", {}) == ""
+
+
+def test_stack_diff_keeps_trailing_comments(tmp_path):
+    source = tmp_path / "adminer_gbq.py"
+    source.write_text(SOURCE.read_text().replace("self.max_capacity = 4\n", "self.max_capacity = 4  # 業務時間のピーク\n"))
+    diff = stack_diff(source, "AdminerGbqStack", {"max_capacity": 6})
+
+    assert "+        self.max_capacity = 6  # 業務時間のピーク\n" in diff
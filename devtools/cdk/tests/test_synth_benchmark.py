@@ -0,0 +1,86 @@
+"""app.pyのimport/construct tree構築/synthの所要時間と、テンプレートの規模を計測する
+
+計測値が tests/benchmark_budget.json の予算を超えた場合に失敗する。
+所要時間は実行環境の負荷で揺れるため `timing` マーカーを付け、`pytest -m timing` で個別に実行する。
+construct数とテンプレートサイズは決定的なため、通常のテストで検証する。
+環境モジュールにはAWSへ接続しない config/env/local.py を使う。
+
+`CDK_BENCHMARK_REPORT=<path>` を指定すると計測結果をJSONで書き出す。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import aws_cdk as cdk
+import pytest
+
+import config.env.local as local_env
+from adminer_gbq import AdminerGbqStack
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+BUDGET_FILE = Path(__file__).resolve().parent / "benchmark_budget.json"
+ENV = cdk.Environment(account="422746423551", region="ap-northeast-1")
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import adminer_gbq
+import config.env.local
+print(time.perf_counter() - start)
+"""
+
+
+def measure_import() -> float:
+    """新しいプロセスでスタック定義をimportする時間(jsiiランタイムの起動を含む)"""
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=PROJECT_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope="module")
+def budget() -> dict:
+    with BUDGET_FILE.open() as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def results(tmp_path_factory) -> dict:
+    ret = {"import_seconds": measure_import()}
+
+    app = cdk.App(outdir=str(tmp_path_factory.mktemp("cdk.out")))
+    start = time.perf_counter()
+    stack = AdminerGbqStack(app, "AdminerGbqBenchmarkStack", site_module=local_env, env=ENV)
+    ret["build_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assembly = app.synth()
+    ret["synth_seconds"] = time.perf_counter() - start
+
+    ret["construct_count"] = len(stack.node.find_all())
+    ret["template_bytes"] = Path(assembly.get_stack_artifact(stack.artifact_id).template_full_path).stat().st_size
+
+    report = os.environ.get("CDK_BENCHMARK_REPORT")
+    if report:
+        with open(report, "w") as f:
+            json.dump(ret, f, indent=2)
+    return ret
+
+
+@pytest.mark.parametrize("metric", ["construct_count", "template_bytes"])
+def test_size_within_budget(results, budget, metric):
+    assert results[metric] <= budget[metric], f"{metric}: {results[metric]} exceeds budget {budget[metric]}"
+
+
+@pytest.mark.timing
+@pytest.mark.parametrize("metric", ["import_seconds", "build_seconds", "synth_seconds"])
+def test_time_within_budget(results, budget, metric):
+    assert results[metric] <= budget[metric], f"{metric}: {results[metric]} exceeds budget {budget[metric]}"
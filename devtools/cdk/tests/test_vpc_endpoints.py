@@ -0,0 +1,65 @@
+import aws_cdk as cdk
+from aws_cdk.assertions import Annotations, Match, Template
+
+import config.env.dev as dev_env
+from lib.vpc_endpoints import VpcEndpoints
+
+ENV = cdk.Environment(account="422746423551", region="ap-northeast-1")
+
+
+def synth_endpoints(**attributes) -> Template:
+    stack = cdk.Stack(cdk.App(), "VpcEndpointsTestStack", env=ENV)
+    rs = dev_env.Resource(stack)
+    for name, value in attributes.items():
+        setattr(rs, name, value)
+    VpcEndpoints(stack, "endpoints", rs)
+    return Template.from_stack(stack)
+
+
+def test_creates_interface_and_gateway_endpoints():
+    template = synth_endpoints(private_route_table_ids=["rtb-0123456789abcdef0"])
+
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 7)
+    for service in ("ecr.api", "ecr.dkr", "logs", "ssm", "ssmmessages", "secretsmanager"):
+        template.has_resource_properties(
+            "AWS::EC2::VPCEndpoint",
+            {
+                "ServiceName": f"com.amazonaws.ap-northeast-1.{service}",
+                "VpcEndpointType": "Interface",
+                "PrivateDnsEnabled": True,
+                "SubnetIds": ["subnet-01475de3064a44ca9", "subnet-0ab6f6bcfac7c33e2"],
+            },
+        )
+    template.has_resource_properties(
+        "AWS::EC2::VPCEndpoint",
+        {
+            "ServiceName": "com.amazonaws.ap-northeast-1.s3",
+            "VpcEndpointType": "Gateway",
+            "RouteTableIds": ["rtb-0123456789abcdef0"],
+        },
+    )
+    # タスクのセキュリティグループからのHTTPSのみ許可する
+    template.has_resource_properties(
+        "AWS::EC2::SecurityGroupIngress",
+        {"FromPort": 443, "ToPort": 443, "SourceSecurityGroupId": "sg-0ab24e2d8fe967682"},
+    )
+
+
+def test_existing_endpoints_are_imported():
+    template = synth_endpoints(vpc_endpoint_ids={"s3": "vpce-0a", "logs": "vpce-0b"})
+
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 5)
+    assert not template.find_resources(
+        "AWS::EC2::VPCEndpoint", {"Properties": {"ServiceName": Match.string_like_regexp(r"\.(s3|logs)$")}}
+    )
+
+
+def test_gateway_endpoint_is_skipped_without_route_tables():
+    stack = cdk.Stack(cdk.App(), "VpcEndpointsTestStack", env=ENV)
+    VpcEndpoints(stack, "endpoints", dev_env.Resource(stack))
+    template = Template.from_stack(stack)
+
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 6)
+    assert not template.find_resources("AWS::EC2::VPCEndpoint", {"Properties": {"VpcEndpointType": "Gateway"}})
+    warnings = Annotations.from_stack(stack).find_warning("*", Match.string_like_regexp("private_route_table_ids"))
+    assert len(warnings) == 1
@@ -0,0 +1,144 @@
+"""Adminer-BigQueryの負荷試験シナリオ(Locust)
+
+各ユーザーはログインした後、実際の利用に近い比率で次の操作を繰り返す。
+リクエストはフロー名(name)ごとに集計し、試験の終了時にLOADTEST_REPORTへJSONのレポートを書き出す。
+
+- login: ログインフォームの送信(ユーザーの開始時に1度)
+- databases: データセット一覧
+- structure: テーブル構造
+- select: データの表示(ページング)
+- sql: SQLコマンドの実行
+- export: CSVのエクスポート
+
+run.shからcompose.ymlのlocustサービスとして実行する。
+"""
+
+import json
+import os
+import random
+import re
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from locust import HttpUser, between, events, task
+from locust import __version__ as locust_version
+
+from report import summarize
+
+PROJECT = os.environ.get("LOADTEST_PROJECT", "loadtest")
+DATASET = os.environ.get("LOADTEST_DATASET", "analytics")
+TABLE = os.environ.get("LOADTEST_TABLE", "events")
+PAGES = int(os.environ.get("LOADTEST_PAGES", "20"))
+"""selectで表示するページの範囲(1ページ50行)"""
+
+TOKEN = re.compile(r"name='token' value='([^']+)'")
+"""AdminerのCSRFトークン(input_token()の出力)"""
+
+SQL_QUERIES = (
+    f"SELECT event_type, COUNT(*) AS events, SUM(amount) AS amount FROM `{DATASET}.{TABLE}` GROUP BY event_type",
+    f"SELECT * FROM `{DATASET}.{TABLE}` WHERE user_id = {{user_id}} ORDER BY created_at DESC LIMIT 100",
+)
+
+
+class AdminerUser(HttpUser):
+    wait_time = between(1, 3)
+
+    def url(self, **params) -> str:
+        return "/?" + urlencode({"bigquery": PROJECT, "username": "", **params})
+
+    def on_start(self):
+        self.token = None
+        with self.client.post(
+            "/",
+            data={
+                "auth[driver]": "bigquery",
+                "auth[server]": PROJECT,
+                "auth[username]": "",
+                "auth[password]": "",
+                "auth[db]": "",
+            },
+            name="login",
+            catch_response=True,
+        ) as res:
+            match = TOKEN.search(res.text)
+            if "auth[driver]" in res.text or not match:
+                res.failure("login form was returned")
+                return
+            self.token = match.group(1)
+
+    def get(self, name: str, **params):
+        with self.client.get(self.url(**params), name=name, catch_response=True) as res:
+            # Adminerはエラーを200のページ内に表示する
+            if "class='error'" in res.text:
+                res.failure("error message in page")
+
+    @task(3)
+    def databases(self):
+        self.get("databases")
+
+    @task(3)
+    def structure(self):
+        self.get("structure", db=DATASET, table=TABLE)
+
+    @task(5)
+    def select(self):
+        self.get("select", db=DATASET, select=TABLE, page=random.randrange(PAGES))
+
+    @task(2)
+    def sql(self):
+        if self.token is None:
+            return
+        query = random.choice(SQL_QUERIES).format(user_id=random.randint(1, 500))
+        with self.client.post(
+            self.url(db=DATASET, sql=""),
+            data={"query": query, "limit": "", "token": self.token},
+            name="sql",
+            catch_response=True,
+        ) as res:
+            if "class='error'" in res.text:
+                res.failure("error message in page")
+
+    @task(1)
+    def export(self):
+        if self.token is None:
+            return
+        with self.client.post(
+            self.url(db=DATASET, dump=TABLE),
+            data={
+                "output": "text",
+                "format": "csv",
+                "db_style": "",
+                "table_style": "",
+                "data_style": "INSERT",
+                "tables[]": TABLE,
+                "data[]": TABLE,
+                "token": self.token,
+            },
+            name="export",
+            catch_response=True,
+        ) as res:
+            # エラーの場合はCSVの代わりにHTMLのページが返る
+            if res.text.lstrip("\ufeff").startswith("<"):
+                res.failure("CSV was not returned")
+
+
+@events.quitting.add_listener
+def write_report(environment, **kwargs):
+    path = os.environ.get("LOADTEST_REPORT")
+    if not path:
+        return
+    options = environment.parsed_options
+    meta = {
+        "image": os.environ.get("ADMINER_IMAGE") or "local build",
+        "users": options.num_users if options else None,
+        "spawn_rate": options.spawn_rate if options else None,
+        "host": environment.host,
+        "cpus": os.environ.get("LOADTEST_CPUS"),
+        "memory": os.environ.get("LOADTEST_MEMORY"),
+        "rows": os.environ.get("LOADTEST_ROWS"),
+        "locust": locust_version,
+        "finished_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(summarize(environment.stats, meta), f, indent=2)
@@ -0,0 +1,108 @@
+"""負荷試験の結果レポート
+
+locustfile.pyが試験の終了時にsummarize()で書き出すJSONと、イメージのタグ間での比較を扱う。
+locustには依存しないため、比較は手元のPythonだけで実行できる。
+
+使い方: python3 report.py compare results/<基準>/report.json results/<比較対象>/report.json [--max-regression 10]
+"""
+
+import argparse
+import json
+import sys
+
+PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+"""レポートに含めるレイテンシのパーセンタイル"""
+
+
+def entry_summary(entry, duration: float) -> dict:
+    """locustのStatsEntryを、フロー1つ分の集計に変換する(レイテンシはミリ秒)"""
+    summary = {
+        "requests": entry.num_requests,
+        "failures": entry.num_failures,
+        "rps": round(entry.num_requests / duration, 3) if duration > 0 else 0,
+        "avg": round(entry.avg_response_time, 1),
+        "max": round(entry.max_response_time or 0, 1),
+    }
+    for name, percentile in PERCENTILES.items():
+        summary[name] = entry.get_response_time_percentile(percentile) if entry.num_requests else None
+    return summary
+
+
+def summarize(stats, meta: dict) -> dict:
+    """locustのRequestStatsから、フローごとのスループットとレイテンシのレポートを作る
+
+    Args:
+        stats: locustのRequestStats(environment.stats)
+        meta (dict): イメージのタグや同時ユーザー数など、試験の条件
+    """
+    total = stats.total
+    duration = max((total.last_request_timestamp or 0) - (total.start_time or 0), 0)
+    return {
+        "meta": {**meta, "duration": round(duration, 1)},
+        "flows": {entry.name: entry_summary(entry, duration) for entry in stats.entries.values()},
+        "total": entry_summary(total, duration),
+    }
+
+
+def compare(base: dict, target: dict) -> list[dict]:
+    """2つのレポートをフローごとに比較する。変化率(%)は正の値が悪化(レイテンシの増加・スループットの低下)"""
+
+    def change(before, after, higher_is_better=False):
+        if not before or after is None:
+            return None
+        ratio = (after - before) / before * 100
+        return round(-ratio if higher_is_better else ratio, 1)
+
+    rows = []
+    for name in sorted(set(base["flows"]) | set(target["flows"])):
+        before = base["flows"].get(name, {})
+        after = target["flows"].get(name, {})
+        row = {"flow": name}
+        for key in list(PERCENTILES) + ["rps"]:
+            row[key] = (before.get(key), after.get(key), change(before.get(key), after.get(key), key == "rps"))
+        rows.append(row)
+    return rows
+
+
+def print_comparison(base: dict, target: dict, rows: list[dict]):
+    print(f"base:   {base['meta'].get('image')} ({base['meta'].get('users')} users)")
+    print(f"target: {target['meta'].get('image')} ({target['meta'].get('users')} users)")
+    print(f"{'flow':<12}" + "".join(f"{key:>26}" for key in list(PERCENTILES) + ["rps"]))
+    for row in rows:
+        cells = []
+        for key in list(PERCENTILES) + ["rps"]:
+            before, after, diff = row[key]
+            cells.append(f"{before} -> {after} ({'-' if diff is None else f'{diff:+}%'})")
+        print(f"{row['flow']:<12}" + "".join(f"{x:>26}" for x in cells))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmp = sub.add_parser("compare", help="2つのレポートをフローごとに比較する")
+    cmp.add_argument("base")
+    cmp.add_argument("target")
+    cmp.add_argument(
+        "--max-regression",
+        type=float,
+        default=None,
+        help="いずれかのフローのp95がこの割合(%%)より悪化した場合に終了コード1を返す",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.target) as f:
+        target = json.load(f)
+    rows = compare(base, target)
+    print_comparison(base, target, rows)
+    if args.max_regression is not None:
+        regressions = [x["flow"] for x in rows if x["p95"][2] is not None and x["p95"][2] > args.max_regression]
+        if regressions:
+            print(f"p95 regressed more than {args.max_regression}%: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
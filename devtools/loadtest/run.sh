@@ -0,0 +1,42 @@
+#!/bin/bash
+set -e
+
+# 負荷試験を実行し、results/<名前>/ にレポート(report.json)とLocustのCSV/HTMLを出力する
+#
+# 使い方: ./run.sh [名前]
+#   ADMINER_IMAGE=ghcr.io/takemi-ohama/adminer-bigquery:<tag> ./run.sh <tag>
+#   （ADMINER_IMAGE が未指定の場合は作業ツリーからイメージをビルドする）
+#
+# 主な環境変数（既定値）:
+#   LOADTEST_USERS (20) / LOADTEST_SPAWN_RATE (2) / LOADTEST_DURATION (3m)
+#   LOADTEST_CPUS (1) / LOADTEST_MEMORY (2g)   adminerコンテナのリソース（Fargateのタスクサイズに合わせる）
+#   LOADTEST_ROWS (5000)                        eventsテーブルの行数
+#
+# タグ間の比較: python3 report.py compare results/<基準>/report.json results/<比較対象>/report.json
+export LOADTEST_NAME="${1:-${LOADTEST_NAME:-latest}}"
+
+cd "$(dirname "$0")"
+
+# 同じ条件では常に同じデータにする
+python3 seed.py seed/seed.yaml
+rm -rf "results/$LOADTEST_NAME"
+
+if [ -n "${ADMINER_IMAGE:-}" ]; then
+    docker compose pull adminer
+else
+    docker compose build adminer
+fi
+docker compose up -d bigquery adminer
+
+# ウォームアップを含めて起動を待つ
+for _ in $(seq 60); do
+    curl -fsS -o /dev/null "http://localhost:${LOADTEST_PORT:-8091}/healthz" 2> /dev/null && break
+    sleep 1
+done
+sleep 5
+
+docker compose run --rm locust || status=$?
+docker compose down -t0
+
+echo "report: $(pwd)/results/$LOADTEST_NAME/report.json"
+exit "${status:-0}"
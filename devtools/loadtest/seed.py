@@ -0,0 +1,81 @@
+"""負荷試験用のBigQueryエミュレータのデータを生成する
+
+乱数のシードを固定しているため、同じ引数では常に同じデータになる。
+JSONはYAMLとしても読めるため、エミュレータの --data-from-yaml にそのまま渡す。
+
+使い方: python3 seed.py seed/seed.yaml
+"""
+
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+PROJECT = os.environ.get("LOADTEST_PROJECT", "loadtest")
+DATASET = os.environ.get("LOADTEST_DATASET", "analytics")
+ROWS = int(os.environ.get("LOADTEST_ROWS", "5000"))
+"""eventsテーブルの行数。ページングとエクスポートの量を決める"""
+EXTRA_TABLES = int(os.environ.get("LOADTEST_EXTRA_TABLES", "30"))
+"""データセット一覧・テーブル一覧の表示量を実際に近づけるための空テーブルの数"""
+
+EVENT_TYPES = ("page_view", "search", "add_to_cart", "purchase", "login")
+
+
+def columns(*pairs):
+    return [{"name": name, "type": type_} for name, type_ in pairs]
+
+
+def events(rng: random.Random) -> list[dict]:
+    start = datetime(2025, 1, 1)
+    return [
+        {
+            "id": i,
+            "user_id": rng.randint(1, 500),
+            "event_type": rng.choice(EVENT_TYPES),
+            "amount": round(rng.uniform(0, 20000), 2),
+            "created_at": (start + timedelta(seconds=rng.randint(0, 365 * 86400))).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for i in range(1, ROWS + 1)
+    ]
+
+
+def users(rng: random.Random) -> list[dict]:
+    return [
+        {"id": i, "name": f"user{i:04d}", "prefecture": rng.choice(("東京都", "大阪府", "愛知県", "福岡県"))}
+        for i in range(1, 501)
+    ]
+
+
+def seed() -> dict:
+    rng = random.Random(42)
+    tables = [
+        {
+            "id": "events",
+            "columns": columns(
+                ("id", "INTEGER"),
+                ("user_id", "INTEGER"),
+                ("event_type", "STRING"),
+                ("amount", "FLOAT"),
+                ("created_at", "DATETIME"),
+            ),
+            "data": events(rng),
+        },
+        {
+            "id": "users",
+            "columns": columns(("id", "INTEGER"), ("name", "STRING"), ("prefecture", "STRING")),
+            "data": users(rng),
+        },
+    ]
+    tables += [
+        {"id": f"daily_summary_{i:03d}", "columns": columns(("date", "DATE"), ("events", "INTEGER"))}
+        for i in range(1, EXTRA_TABLES + 1)
+    ]
+    return {"projects": [{"id": PROJECT, "datasets": [{"id": DATASET, "tables": tables}]}]}
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "seed/seed.yaml"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(seed(), f, ensure_ascii=False)
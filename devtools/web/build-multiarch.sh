@@ -0,0 +1,30 @@
+#!/bin/bash
+set -e
+
+# amd64/arm64のマルチアーキテクチャイメージをビルドしてpushする
+# （GitHub Actionsのpublish-docker.ymlと同じ構成を手元で作る場合に使う）
+#
+# 使い方: ./build-multiarch.sh ghcr.io/takemi-ohama/adminer-bigquery:<tag>
+# PLATFORMS で対象を変更できる（例: PLATFORMS=linux/arm64）
+# PROFILER=excimer でプロファイリング用イメージをビルドする（タグは <tag>-profiling とする）
+IMAGE="${1:?usage: $0 <image>:<tag>}"
+PLATFORMS="${PLATFORMS:-linux/amd64,linux/arm64}"
+PROFILER="${PROFILER:-}"
+
+cd "$(dirname "$0")/../.."
+
+if ! docker buildx inspect adminer-multiarch > /dev/null 2>&1; then
+    docker buildx create --name adminer-multiarch --driver docker-container > /dev/null
+fi
+
+docker buildx build \
+    --builder adminer-multiarch \
+    --platform "$PLATFORMS" \
+    --file devtools/web/Dockerfile \
+    --build-arg "PROFILER=$PROFILER" \
+    --tag "$IMAGE" \
+    --push \
+    .
+
+# pushしたイメージのプラットフォームを確認
+docker buildx imagetools inspect "$IMAGE"
@@ -0,0 +1,42 @@
+#!/bin/sh
+set -e
+
+# mpm-prefork.conf で参照する環境変数の既定値（Debianのprefork既定値と同じ）
+# 未定義のままだとApacheが起動できないため、ここで補う
+: "${APACHE_START_SERVERS:=5}"
+: "${APACHE_MIN_SPARE_SERVERS:=5}"
+: "${APACHE_MAX_SPARE_SERVERS:=10}"
+: "${APACHE_MAX_REQUEST_WORKERS:=150}"
+: "${APACHE_MAX_CONNECTIONS_PER_CHILD:=0}"
+# ALBのアイドルタイムアウト(60秒)より長くし、ALBが再利用する接続を先に閉じないようにする
+: "${APACHE_KEEPALIVE_TIMEOUT:=65}"
+export APACHE_START_SERVERS APACHE_MIN_SPARE_SERVERS APACHE_MAX_SPARE_SERVERS \
+    APACHE_MAX_REQUEST_WORKERS APACHE_MAX_CONNECTIONS_PER_CHILD APACHE_KEEPALIVE_TIMEOUT
+
+# プロファイリング用イメージの出力先（タスクのボリューム）をApacheのワーカーが書き込めるようにする
+if [ -n "${ADMINER_PROFILING_DIR:-}" ]; then
+    mkdir -p "$ADMINER_PROFILING_DIR"
+    chown www-data:www-data "$ADMINER_PROFILING_DIR"
+fi
+
+# ADMINER_WARMUP=true の場合、Apacheの起動後にOPcacheを温め（warmup.php）、
+# 代表的なページ（ADMINER_WARMUP_PATHS）を起動済みのワーカー数だけ並列に要求する。
+# 通常はALBのヘルスチェックが通る前に終わるため、最初の利用者がコールドなタスクに当たらない
+# （エクスポートワーカーなど、Apache以外のコマンドで起動した場合は行わない）
+if [ "${ADMINER_WARMUP:-}" = "true" ] && [ "$1" = "apache2-foreground" ]; then
+    (
+        for _ in $(seq 30); do
+            curl -fsS -o /dev/null http://localhost/healthz 2> /dev/null && break
+            sleep 1
+        done
+        echo "warmup: $(curl -sS --max-time 60 http://localhost/warmup)" >&2
+        for path in ${ADMINER_WARMUP_PATHS:-/}; do
+            for _ in $(seq "$APACHE_START_SERVERS"); do
+                curl -sS -o /dev/null --max-time 30 "http://localhost$path" &
+            done
+        done
+        wait
+    ) &
+fi
+
+exec docker-php-entrypoint "$@"
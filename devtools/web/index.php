@@ -12,12 +12,15 @@ function adminer_object() {
 	require_once __DIR__ . '/plugins/drivers/bigquery.php';
 	require_once __DIR__ . '/plugins/drivers/bigquery/AdminerLoginBigQuery.php';
 	require_once __DIR__ . '/plugins/drivers/bigquery/adminer-bigquery-css.php';
+	require_once __DIR__ . '/plugins/drivers/bigquery/AdminerBigQueryAsyncExport.php';
 
 	$plugins = array(
 		new \Adminer\AdminerLoginBigQuery(array(
 			'project_id' => getenv('GOOGLE_CLOUD_PROJECT')
 		)),
 		new \Adminer\AdminerBigQueryCSS(),
+		// BIGQUERY_EXPORT_QUEUE_URL が設定されている場合のみ、エクスポートの出力に「S3 (background)」を追加する
+		new \Adminer\AdminerBigQueryAsyncExport(),
 	);
 
 	return new \Adminer\Plugins($plugins);
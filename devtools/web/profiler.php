@@ -0,0 +1,36 @@
+<?php
+/**
+ * サンプリングプロファイラ(Excimer)
+ *
+ * PROFILER=excimer でビルドしたイメージでのみ auto_prepend_file として読み込まれる。
+ * リクエストごとにスタックをサンプリングし、flame graph用のcollapsed形式で
+ * ADMINER_PROFILING_DIR に書き出す。S3への転送はタスクのサイドカーが行う。
+ *
+ * 環境変数:
+ * - ADMINER_PROFILING_HZ: 1秒あたりのサンプリング回数。未設定の場合はプロファイルしない
+ * - ADMINER_PROFILING_REQUEST_RATE: プロファイルするリクエストの割合(0〜1, 既定: 1)
+ * - ADMINER_PROFILING_DIR: 出力先ディレクトリ(既定: /tmp/profiles)
+ */
+
+if (extension_loaded('excimer') && getenv('ADMINER_PROFILING_HZ')) {
+	$rate = getenv('ADMINER_PROFILING_REQUEST_RATE');
+	if ($rate === false || $rate === '' || mt_rand() / mt_getrandmax() < (float) $rate) {
+		$adminerProfiler = new ExcimerProfiler();
+		$adminerProfiler->setPeriod(1 / (int) getenv('ADMINER_PROFILING_HZ'));
+		$adminerProfiler->setEventType(EXCIMER_REAL);
+		$adminerProfiler->start();
+		register_shutdown_function(function () use ($adminerProfiler) {
+			$adminerProfiler->stop();
+			$collapsed = $adminerProfiler->getLog()->formatCollapsed();
+			if ($collapsed === '') {
+				return;
+			}
+			$dir = getenv('ADMINER_PROFILING_DIR') ?: '/tmp/profiles';
+			// 書き込み途中のファイルをサイドカーが転送しないよう、一時ファイルに書いてからrenameする
+			$name = $dir . '/' . gmdate('Ymd\THis\Z') . '-' . bin2hex(random_bytes(4)) . '.collapsed';
+			if (@file_put_contents("$name.tmp", $collapsed) !== false) {
+				rename("$name.tmp", $name);
+			}
+		});
+	}
+}
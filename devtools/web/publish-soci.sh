@@ -0,0 +1,31 @@
+#!/bin/bash
+set -e
+
+# レジストリのイメージをSOCIインデックス付きでECRに公開する
+# Fargateはインデックスのあるレイヤーを遅延読み込みし、イメージ全体のpullを待たずにコンテナを起動する
+# （CDKのsoci_repositoryで参照する。GitHub Actionsのpublish-docker.ymlからも使う）
+#
+# 使い方: sudo ./publish-soci.sh ghcr.io/takemi-ohama/adminer-bigquery:<tag> <account>.dkr.ecr.<region>.amazonaws.com
+# containerd, nerdctl, soci（v0.10以降）と aws cli が必要
+# ECRのリポジトリ名とタグは元のイメージと同じ（例: adminer-bigquery:<tag>）。リポジトリが無ければ作成する
+# MIN_LAYER_SIZE より小さいレイヤーはインデックスを作らず、起動時に通常通りpullする
+SOURCE="${1:?usage: $0 <image>:<tag> <ecr registry>}"
+REGISTRY="${2:?usage: $0 <image>:<tag> <ecr registry>}"
+MIN_LAYER_SIZE="${MIN_LAYER_SIZE:-10485760}"
+
+NAME="${SOURCE##*/}"
+REPOSITORY="${NAME%%:*}"
+TARGET="$REGISTRY/$NAME"
+REGION="$(echo "$REGISTRY" | cut -d. -f4)"
+
+aws ecr describe-repositories --region "$REGION" --repository-names "$REPOSITORY" > /dev/null 2>&1 \
+    || aws ecr create-repository --region "$REGION" --repository-name "$REPOSITORY" > /dev/null
+aws ecr get-login-password --region "$REGION" | nerdctl login --username AWS --password-stdin "$REGISTRY"
+
+# マルチアーキテクチャのまま変換し、各プラットフォームのマニフェストにSOCIインデックスを付ける（index manifest v2）
+nerdctl pull --all-platforms "$SOURCE"
+soci convert --all-platforms --min-layer-size "$MIN_LAYER_SIZE" "$SOURCE" "$TARGET"
+nerdctl push --all-platforms "$TARGET"
+
+# pushしたイメージのインデックスを確認
+soci index list --ref "$TARGET"
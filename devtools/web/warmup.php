@@ -0,0 +1,68 @@
+<?php
+/**
+ * タスク起動時のウォームアップ
+ *
+ * ADMINER_WARMUP=true の場合に docker-entrypoint.sh がApacheの起動後にlocalhostから呼び出す
+ * (apache-custom.conf でlocalhost以外からのアクセスは拒否する)。
+ * Adminer本体・BigQueryドライバ・Google Cloud SDKのソースをOPcacheにコンパイルし、
+ * 最初の利用者のリクエストがコンパイルを待たないようにする。
+ * OPcacheはワーカー間で共有されるため、1度呼び出せばタスク全体に効く。
+ *
+ * ?preload=1 の場合は、BigQueryのメタデータもキャッシュに読み込む(BigQueryPreloader)。
+ * Blue/Greenデプロイのライフサイクルフックが、本番のトラフィックを切り替える前に
+ * 新しいタスクのワーカー数だけ並列に呼び出す(ALBを経由しないVPC内からのアクセスのみ許可する)。
+ */
+
+$root = '/var/www/html';
+$paths = array(
+	"$root/index.php",
+	"$root/adminer",
+	"$root/plugins",
+	"$root/vendor/composer",
+	"$root/vendor/google/auth/src",
+	"$root/vendor/google/cloud-bigquery/src",
+	"$root/vendor/google/cloud-core/src",
+	"$root/vendor/guzzlehttp",
+	"$root/vendor/psr",
+);
+
+$startTime = microtime(true);
+$stats = array('compiled' => 0, 'cached' => 0, 'failed' => 0);
+if (function_exists('opcache_compile_file') && ini_get('opcache.enable')) {
+	foreach ($paths as $path) {
+		if (is_file($path)) {
+			$files = array($path);
+		} elseif (is_dir($path)) {
+			$files = new RecursiveIteratorIterator(new RecursiveDirectoryIterator($path, FilesystemIterator::SKIP_DOTS));
+		} else {
+			continue;
+		}
+		foreach ($files as $file) {
+			$file = (string) $file;
+			if (substr($file, -4) != '.php' || strpos($file, '/tests/') !== false) {
+				continue;
+			}
+			if (opcache_is_script_cached($file)) {
+				$stats['cached']++;
+			} elseif (@opcache_compile_file($file)) {
+				$stats['compiled']++;
+			} else {
+				$stats['failed']++;
+			}
+		}
+	}
+}
+
+$project = getenv('GOOGLE_CLOUD_PROJECT');
+if (!empty($_GET['preload']) && $project) {
+	require_once "$root/vendor/autoload.php";
+	foreach (array('BigQueryMetrics', 'BigQueryCacheManager', 'BigQueryConnectionPool', 'BigQueryConfig', 'BigQueryPreloader') as $class) {
+		require_once "$root/plugins/drivers/bigquery/$class.php";
+	}
+	$stats['preload'] = \Adminer\BigQueryPreloader::run($project);
+}
+$stats['ms'] = (int) ((microtime(true) - $startTime) * 1000);
+
+header('Content-Type: application/json');
+header('Cache-Control: no-store');
+echo json_encode($stats), "\n";
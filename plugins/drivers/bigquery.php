@@ -22,6 +22,10 @@ if (isset($_GET["bigquery"])) {
 	require_once __DIR__ . '/bigquery/driver.php';
 	require_once __DIR__ . '/bigquery/BigQueryCacheManager.php';
 	require_once __DIR__ . '/bigquery/BigQueryConnectionPool.php';
+	require_once __DIR__ . '/bigquery/BigQueryMetrics.php';
+	require_once __DIR__ . '/bigquery/BigQueryTracer.php';
+	require_once __DIR__ . '/bigquery/BigQueryAwsClient.php';
+	require_once __DIR__ . '/bigquery/BigQueryExportJob.php';
 	require_once __DIR__ . '/bigquery/BigQueryConfig.php';
 
 	function idf_escape($idf) {
@@ -248,6 +252,7 @@ if (isset($_GET["bigquery"])) {
 				return $cached;
 			}
 		}
+		$span = BigQueryTracer::start('bigquery.metadata.datasets');
 		try {
 			$datasets = array();
 			$datasetsIterator = ($connection && isset($connection->bigQueryClient)) ? $connection->bigQueryClient->datasets(array(
@@ -257,9 +262,11 @@ if (isset($_GET["bigquery"])) {
 				$datasets[] = $dataset->id();
 			}
 			sort($datasets);
+			BigQueryTracer::end($span, array('bigquery.dataset_count' => count($datasets)));
 			BigQueryCacheManager::set($cacheKey, $datasets, $cacheTime);
 			return $datasets;
 		} catch (Exception $e) {
+			BigQueryTracer::end($span, array(), $e);
 			error_log("Error listing datasets: " . $e->getMessage());
 			return array();
 		}
@@ -286,17 +293,24 @@ if (isset($_GET["bigquery"])) {
 			$dataset = ($connection && isset($connection->bigQueryClient)) ? $connection->bigQueryClient->dataset($actualDatabase) : null;
 			$tables = array();
 			$pageToken = null;
-			do {
-				$options = array('maxResults' => 100);
-				if ($pageToken) {
-					$options['pageToken'] = $pageToken;
-				}
-				$result = $dataset->tables($options);
-				foreach ($result as $table) {
-					$tables[$table->id()] = 'table';
-				}
-				$pageToken = $result->nextResultToken();
-			} while ($pageToken);
+			$span = BigQueryTracer::start('bigquery.metadata.tables', array('bigquery.dataset' => $actualDatabase));
+			try {
+				do {
+					$options = array('maxResults' => 100);
+					if ($pageToken) {
+						$options['pageToken'] = $pageToken;
+					}
+					$result = $dataset->tables($options);
+					foreach ($result as $table) {
+						$tables[$table->id()] = 'table';
+					}
+					$pageToken = $result->nextResultToken();
+				} while ($pageToken);
+			} catch (Exception $e) {
+				BigQueryTracer::end($span, array(), $e);
+				throw $e;
+			}
+			BigQueryTracer::end($span, array('bigquery.table_count' => count($tables)));
 			BigQueryCacheManager::set($cacheKey, $tables, $cacheTime);
 			return $tables;
 		} catch (Exception $e) {
@@ -390,9 +404,12 @@ if (isset($_GET["bigquery"])) {
 			}
 			$dataset = ($connection && isset($connection->bigQueryClient)) ? $connection->bigQueryClient->dataset($database) : null;
 			$tableObj = $dataset->table($table);
+			$span = BigQueryTracer::start('bigquery.metadata.fields', array('bigquery.dataset' => $database, 'bigquery.table' => $table));
 			try {
 				$tableInfo = $tableObj->info();
+				BigQueryTracer::end($span);
 			} catch (Exception $e) {
+				BigQueryTracer::end($span, array(), $e);
 				error_log("Table '$table' does not exist in dataset '$database' or access error: " . $e->getMessage());
 				return array();
 			}
@@ -401,43 +418,7 @@ if (isset($_GET["bigquery"])) {
 				return array();
 			}
 
-			$schemaFields = $tableInfo['schema']['fields'];
-			$fieldCount = count($schemaFields);
-
-			$maxFields = 1000;
-			if ($fieldCount > $maxFields) {
-				$schemaFields = array_slice($schemaFields, 0, $maxFields);
-			}
-
-			$fields = array();
-			static $typeCache = array();
-			foreach ($schemaFields as $field) {
-				$bigQueryType = $field['type'] ?? 'STRING';
-				if (!isset($typeCache[$bigQueryType])) {
-					$typeCache[$bigQueryType] = BigQueryConfig::mapType($bigQueryType);
-				}
-				$adminerTypeInfo = $typeCache[$bigQueryType];
-				$length = null;
-				if (preg_match('/\((\d+(?:,\d+)?)\)/', $bigQueryType, $matches)) {
-					$length = $matches[1];
-				}
-				$typeStr = $adminerTypeInfo['type'];
-				if ($length !== null) {
-					$typeStr .= "($length)";
-				} elseif (isset($adminerTypeInfo['length']) && $adminerTypeInfo['length'] !== null) {
-					$typeStr .= "(" . $adminerTypeInfo['length'] . ")";
-				}
-				$fields[$field['name']] = array(
-					'field' => $field['name'],
-					'type' => $typeStr,
-					'full_type' => $typeStr,
-					'null' => ($field['mode'] ?? 'NULLABLE') !== 'REQUIRED',
-					'default' => null,
-					'auto_increment' => false,
-					'comment' => $field['description'] ?? '',
-					'privileges' => array('select' => 1, 'insert' => 1, 'update' => 1, 'where' => 1, 'order' => 1)
-				);
-			}
+			$fields = BigQueryConfig::adminerFields($tableInfo['schema']['fields']);
 
 			BigQueryCacheManager::set($cacheKey, $fields, $cacheTime);
 			return $fields;
@@ -0,0 +1,138 @@
+<?php
+
+namespace Adminer;
+
+use Exception;
+
+/**
+ * AdminerBigQueryAsyncExport - エクスポートをバックグラウンドのワーカーで実行するプラグイン
+ *
+ * エクスポート画面の出力に「S3 (background)」を追加する。選択された場合はテーブルごとに
+ * Adminerが組み立てたクエリ(列・WHERE・ORDER BYを含む)をジョブとしてSQSに登録し、
+ * Webのリクエストではデータを読まずに、S3の署名付きダウンロードURLを返す。
+ * ジョブはワーカー(export-worker.php)が取り出し、gzip圧縮したファイルをS3に書き込む。
+ * ワーカーは自身の認証情報で実行するため、登録前にログイン中の認証情報でクエリをdry runする。
+ *
+ * 環境変数:
+ * - BIGQUERY_EXPORT_QUEUE_URL: ジョブを登録するSQSキューのURL。未設定の場合は何もしない
+ * - BIGQUERY_EXPORT_BUCKET: エクスポートファイルの保存先バケット
+ * - BIGQUERY_EXPORT_URL_TTL: 署名付きURLの有効期間(秒, 既定: 3600)
+ */
+class AdminerBigQueryAsyncExport extends Plugin {
+
+	const OUTPUT = 's3';
+
+	/** @var list<array{table: string, url: string}> */
+	private $jobs = array();
+	/** @var list<string> */
+	private $errors = array();
+	private $aws;
+
+	private function isBigQueryDriver() {
+		return (defined('DRIVER') && DRIVER === 'bigquery') || (defined('Adminer\\DRIVER') && constant('Adminer\\DRIVER') === 'bigquery');
+	}
+	private function isEnabled() {
+		return getenv('BIGQUERY_EXPORT_QUEUE_URL') && $this->isBigQueryDriver();
+	}
+	private function isAsync() {
+		return $this->isEnabled() && ($_POST['output'] ?? '') == self::OUTPUT;
+	}
+	/**
+	 * ワーカーが対応する形式に揃える(SQLなどはCSVとして出力する)
+	 */
+	private function format() {
+		$format = $_POST['format'] ?? 'csv';
+		return isset(BigQueryExportJob::CONTENT_TYPES[$format]) ? $format : 'csv';
+	}
+	private function enqueue($table, $query) {
+		if ($this->aws === null) {
+			$this->aws = new BigQueryAwsClient();
+		}
+		$format = $this->format();
+		$jobId = bin2hex(random_bytes(8));
+		// SQLコマンドの結果のエクスポートではテーブル名が空になる
+		$filename = friendly_url($table != '' ? $table : 'query') . '.' . ($format == 'json' ? 'jsonl' : ($format == 'tsv' ? 'tsv' : 'csv')) . '.gz';
+		$key = 'exports/' . DB . "/$jobId/$filename";
+		$message = BigQueryExportJob::create(array(
+			'id' => $jobId,
+			'project' => connection()->projectId,
+			'dataset' => DB,
+			'table' => $table,
+			'query' => $query,
+			'format' => $format,
+			'key' => $key,
+		));
+		// ユーザーが実行できないクエリをワーカーの権限で実行しないよう、ログイン中の認証情報で確かめる
+		connection()->dryRunQuery($query);
+		$this->aws->sqs('SendMessage', array(
+			'QueueUrl' => getenv('BIGQUERY_EXPORT_QUEUE_URL'),
+			'MessageBody' => $message,
+		));
+		$ttl = (int) (getenv('BIGQUERY_EXPORT_URL_TTL') ?: 3600);
+		return $this->aws->presignGet(getenv('BIGQUERY_EXPORT_BUCKET'), $key, $ttl, $filename);
+	}
+
+	function dumpOutput() {
+		if ($this->isEnabled()) {
+			return array(self::OUTPUT => 'S3 (background)');
+		}
+	}
+
+	function dumpHeaders($identifier, $multi_table = false) {
+		if ($this->isAsync()) {
+			header("Content-Type: text/html; charset=utf-8");
+			// dump_headers() が付けるダウンロード用のヘッダを、送信直前に外す
+			header_register_callback(function () {
+				header_remove('Content-Disposition');
+			});
+			// dump.inc.php が直接出力する内容は捨て、dumpFooter() で結果のページに置き換える
+			ob_start(function () {
+				return '';
+			});
+			return 'csv';
+		}
+	}
+
+	function dumpTable($table, $style, $is_view = 0) {
+		if ($this->isAsync()) {
+			return true;
+		}
+	}
+
+	function dumpData($table, $style, $query) {
+		if ($this->isAsync()) {
+			if ($style) {
+				$name = ($table != '' ? $table : lang('SQL command'));
+				try {
+					$this->jobs[] = array('table' => $name, 'url' => $this->enqueue($table, $query));
+				} catch (Exception $e) {
+					error_log("AdminerBigQueryAsyncExport: " . $e->getMessage());
+					$this->errors[] = $name;
+				}
+			}
+			return true;
+		}
+	}
+
+	function dumpFooter() {
+		if ($this->isAsync()) {
+			ob_end_clean();
+			echo "<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>Export</title></head><body>\n";
+			if ($this->jobs) {
+				echo "<p>The export runs in the background. The files can be downloaded once they are written (HTTP 404 until then).</p>\n<ul>\n";
+				foreach ($this->jobs as $job) {
+					echo "<li><a href='" . h($job['url']) . "'>" . h($job['table']) . "</a>\n";
+				}
+				echo "</ul>\n";
+			}
+			if ($this->errors) {
+				echo "<p>Failed to queue: " . h(implode(', ', $this->errors)) . "</p>\n";
+			}
+			if (!$this->jobs && !$this->errors) {
+				echo "<p>No table data was selected.</p>\n";
+			}
+			echo "<p><a href='" . h(ME . 'dump=' . urlencode($_GET['dump'] ?? '')) . "'>" . lang('Export') . "</a></p>\n</body></html>\n";
+			return true;
+		}
+	}
+}
@@ -0,0 +1,187 @@
+<?php
+
+namespace Adminer;
+
+use Exception;
+
+/**
+ * 非同期エクスポートで使うAWS API(SQS/S3)の最小限のクライアント
+ *
+ * AWS SDKは依存関係に含まれないため、Signature Version 4で署名したリクエストを直接送る。
+ * 認証情報はECSタスクロール(AWS_CONTAINER_CREDENTIALS_RELATIVE_URI)、無い場合は環境変数から取得する。
+ *
+ * 環境変数:
+ * - BIGQUERY_EXPORT_REGION: リージョン(未設定の場合は AWS_REGION)
+ */
+class BigQueryAwsClient {
+
+	private static ?array $credentials = null;
+	private $region;
+
+	function __construct($region = null) {
+		$this->region = $region ?: (getenv('BIGQUERY_EXPORT_REGION') ?: getenv('AWS_REGION'));
+		if (!$this->region) {
+			throw new Exception('AWS region is not configured');
+		}
+	}
+	private static function credentials() {
+		// タスクロールの一時認証情報は期限の5分前に取得し直す
+		if (self::$credentials !== null && self::$credentials['expiration'] - 300 > time()) {
+			return self::$credentials;
+		}
+		$uri = getenv('AWS_CONTAINER_CREDENTIALS_RELATIVE_URI');
+		if ($uri) {
+			$context = stream_context_create(array('http' => array('timeout' => 2)));
+			$response = json_decode((string) @file_get_contents('http://169.254.170.2' . $uri, false, $context), true);
+			if (!isset($response['AccessKeyId'])) {
+				throw new Exception('Failed to fetch ECS task credentials');
+			}
+			self::$credentials = array(
+				'key' => $response['AccessKeyId'],
+				'secret' => $response['SecretAccessKey'],
+				'token' => $response['Token'] ?? null,
+				'expiration' => strtotime($response['Expiration']),
+			);
+		} elseif (getenv('AWS_ACCESS_KEY_ID')) {
+			self::$credentials = array(
+				'key' => getenv('AWS_ACCESS_KEY_ID'),
+				'secret' => getenv('AWS_SECRET_ACCESS_KEY'),
+				'token' => getenv('AWS_SESSION_TOKEN') ?: null,
+				'expiration' => PHP_INT_MAX,
+			);
+		} else {
+			throw new Exception('AWS credentials are not available');
+		}
+		return self::$credentials;
+	}
+	private static function encodePath($path) {
+		return implode('/', array_map('rawurlencode', explode('/', $path)));
+	}
+	private static function canonicalQuery(array $query) {
+		ksort($query);
+		$pairs = array();
+		foreach ($query as $key => $value) {
+			$pairs[] = rawurlencode($key) . '=' . rawurlencode($value);
+		}
+		return implode('&', $pairs);
+	}
+	private function signature($service, $amzDate, $canonicalRequest) {
+		$credentials = self::credentials();
+		$date = substr($amzDate, 0, 8);
+		$scope = "$date/$this->region/$service/aws4_request";
+		$stringToSign = "AWS4-HMAC-SHA256\n$amzDate\n$scope\n" . hash('sha256', $canonicalRequest);
+		$key = 'AWS4' . $credentials['secret'];
+		foreach (array($date, $this->region, $service, 'aws4_request') as $part) {
+			$key = hash_hmac('sha256', $part, $key, true);
+		}
+		return array("$credentials[key]/$scope", hash_hmac('sha256', $stringToSign, $key));
+	}
+	/**
+	 * 署名済みのリクエストヘッダを返す
+	 * @param array<string, string> $headers 署名対象に含める追加ヘッダ(小文字)
+	 * @return list<string>
+	 */
+	private function signHeaders($method, $service, $host, $path, array $headers, $payloadHash) {
+		$credentials = self::credentials();
+		$amzDate = gmdate('Ymd\THis\Z');
+		$headers += array('host' => $host, 'x-amz-date' => $amzDate, 'x-amz-content-sha256' => $payloadHash);
+		if ($credentials['token']) {
+			$headers['x-amz-security-token'] = $credentials['token'];
+		}
+		ksort($headers);
+		$canonicalHeaders = '';
+		foreach ($headers as $name => $value) {
+			$canonicalHeaders .= "$name:" . trim($value) . "\n";
+		}
+		$signedHeaders = implode(';', array_keys($headers));
+		$canonicalRequest = "$method\n$path\n\n$canonicalHeaders\n$signedHeaders\n$payloadHash";
+		list($credential, $signature) = $this->signature($service, $amzDate, $canonicalRequest);
+		$ret = array("Authorization: AWS4-HMAC-SHA256 Credential=$credential, SignedHeaders=$signedHeaders, Signature=$signature");
+		foreach ($headers as $name => $value) {
+			if ($name != 'host') {
+				$ret[] = "$name: $value";
+			}
+		}
+		return $ret;
+	}
+	/**
+	 * SQSのAPIをJSONプロトコルで呼び出す
+	 * @param array<string, mixed> $params
+	 * @return array<string, mixed>
+	 */
+	function sqs($action, array $params) {
+		$host = "sqs.$this->region.amazonaws.com";
+		$body = json_encode((object) $params);
+		$headers = $this->signHeaders('POST', 'sqs', $host, '/', array(
+			'content-type' => 'application/x-amz-json-1.0',
+			'x-amz-target' => "AmazonSQS.$action",
+		), hash('sha256', $body));
+		$context = stream_context_create(array(
+			'http' => array(
+				'method' => 'POST',
+				'header' => implode("\r\n", $headers),
+				'content' => $body,
+				// ReceiveMessageのロングポーリング(最大20秒)より長くする
+				'timeout' => 30,
+				'ignore_errors' => true,
+			)
+		));
+		$response = @file_get_contents("https://$host/", false, $context);
+		$data = json_decode((string) $response, true);
+		if ($response === false || isset($data['__type'])) {
+			throw new Exception("SQS $action failed: " . ($data['message'] ?? $data['__type'] ?? 'no response'));
+		}
+		return $data ?: array();
+	}
+	/**
+	 * S3オブジェクトをダウンロードする署名付きURLを返す
+	 * 一時認証情報で署名したURLは認証情報の期限までしか使えないため、有効期間をそこまでに抑える
+	 */
+	function presignGet($bucket, $key, $expires, $filename = null) {
+		$credentials = self::credentials();
+		$expires = max(1, min($expires, $credentials['expiration'] - time(), 604800));
+		$host = "$bucket.s3.$this->region.amazonaws.com";
+		$path = '/' . self::encodePath($key);
+		$amzDate = gmdate('Ymd\THis\Z');
+		$query = array(
+			'X-Amz-Algorithm' => 'AWS4-HMAC-SHA256',
+			'X-Amz-Credential' => $credentials['key'] . '/' . substr($amzDate, 0, 8) . "/$this->region/s3/aws4_request",
+			'X-Amz-Date' => $amzDate,
+			'X-Amz-Expires' => (string) $expires,
+			'X-Amz-SignedHeaders' => 'host',
+		);
+		if ($credentials['token']) {
+			$query['X-Amz-Security-Token'] = $credentials['token'];
+		}
+		if ($filename !== null) {
+			$query['response-content-disposition'] = "attachment; filename=\"$filename\"";
+		}
+		$canonicalRequest = "GET\n$path\n" . self::canonicalQuery($query) . "\nhost:$host\n\nhost\nUNSIGNED-PAYLOAD";
+		list(, $signature) = $this->signature('s3', $amzDate, $canonicalRequest);
+		return "https://$host$path?" . self::canonicalQuery($query) . "&X-Amz-Signature=$signature";
+	}
+	/** ローカルファイルをS3にアップロードする(単一PUTのため5GBまで) */
+	function putObject($bucket, $key, $file, $contentType) {
+		$host = "$bucket.s3.$this->region.amazonaws.com";
+		$path = '/' . self::encodePath($key);
+		$headers = $this->signHeaders('PUT', 's3', $host, $path, array(
+			'content-type' => $contentType,
+		), hash_file('sha256', $file));
+		$handle = fopen($file, 'rb');
+		$curl = curl_init("https://$host$path");
+		curl_setopt_array($curl, array(
+			CURLOPT_PUT => true,
+			CURLOPT_INFILE => $handle,
+			CURLOPT_INFILESIZE => filesize($file),
+			CURLOPT_HTTPHEADER => $headers,
+			CURLOPT_RETURNTRANSFER => true,
+		));
+		$response = curl_exec($curl);
+		$status = curl_getinfo($curl, CURLINFO_HTTP_CODE);
+		curl_close($curl);
+		fclose($handle);
+		if ($status != 200) {
+			throw new Exception("S3 PutObject failed (HTTP $status): $response");
+		}
+	}
+}
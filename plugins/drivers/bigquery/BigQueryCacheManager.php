@@ -2,11 +2,33 @@
 
 namespace Adminer;
 
+/**
+ * BigQueryメタデータのキャッシュ
+ *
+ * タスク内のAPCu(無い場合はリクエスト内の静的配列)をL1とし、
+ * BIGQUERY_CACHE_REDIS_URL が設定されている場合は全タスクで共有するRedis/ValkeyをL2として使う。
+ *
+ * 環境変数:
+ * - BIGQUERY_CACHE_REDIS_URL: redis://host:port または rediss://host:port (TLS)
+ * - BIGQUERY_CACHE_TTL: 共有キャッシュのTTL(秒)。呼び出し元の既定値を上書きする
+ * - BIGQUERY_CACHE_LOCAL_TTL: 共有キャッシュ使用時のL1のTTL上限(秒)
+ * - BIGQUERY_CACHE_PREFIX: 共有キャッシュのキーのprefix
+ *
+ * 共有キャッシュへの接続に失敗した場合は、REDIS_RETRY_INTERVAL 秒間(APCu)タスク内の全ワーカーが接続を試みない。
+ */
 class BigQueryCacheManager {
 
+	/** 共有キャッシュへの接続に失敗した後、再接続を試みるまでの秒数 */
+	const REDIS_RETRY_INTERVAL = 30;
+
+	/** 接続の失敗を記録するAPCuのキー */
+	const REDIS_DOWN_KEY = 'bigquery-cache:redis-down';
+
 	private static array $staticCache = array();
 	private static array $cacheTimestamps = array();
 	private static ?bool $apcuAvailable = null;
+	private static ?bool $redisAvailable = null;
+	private static $redis = null;
 	private static function isApcuAvailable() {
 		if (self::$apcuAvailable === null) {
 			self::$apcuAvailable = extension_loaded('apcu')
@@ -16,7 +38,50 @@ class BigQueryCacheManager {
 		}
 		return self::$apcuAvailable;
 	}
-	static function get($key, $ttl = 300) {
+	private static function getRedis() {
+		if (self::$redisAvailable === null) {
+			self::$redisAvailable = false;
+			$url = getenv('BIGQUERY_CACHE_REDIS_URL');
+			// 直前に接続できなかった場合は、リクエストごとに接続のタイムアウトを待たない
+			if ($url && extension_loaded('redis') && !(self::isApcuAvailable() && \apcu_exists(self::REDIS_DOWN_KEY))) {
+				$parts = parse_url($url);
+				$host = ($parts['scheme'] ?? 'redis') === 'rediss' ? 'tls://' . $parts['host'] : $parts['host'];
+				try {
+					$redis = new \Redis();
+					// 共有キャッシュの障害でリクエストを止めないよう、短いタイムアウトの永続接続を使う
+					if ($redis->pconnect($host, $parts['port'] ?? 6379, 0.5, 'bigquery-cache', 0, 0.5)) {
+						if (isset($parts['pass'])) {
+							$redis->auth(isset($parts['user']) ? array($parts['user'], $parts['pass']) : $parts['pass']);
+						}
+						self::$redis = $redis;
+						self::$redisAvailable = true;
+					}
+				} catch (\Exception $e) {
+					error_log("BigQueryCacheManager: shared cache unavailable: " . $e->getMessage());
+				}
+				if (!self::$redisAvailable && self::isApcuAvailable()) {
+					\apcu_store(self::REDIS_DOWN_KEY, time(), self::REDIS_RETRY_INTERVAL);
+				}
+			}
+		}
+		return self::$redisAvailable ? self::$redis : null;
+	}
+	private static function sharedTtl($ttl) {
+		$override = getenv('BIGQUERY_CACHE_TTL');
+		return $override !== false && $override !== '' ? (int) $override : $ttl;
+	}
+	private static function localTtl($ttl) {
+		$ttl = self::sharedTtl($ttl);
+		$limit = getenv('BIGQUERY_CACHE_LOCAL_TTL');
+		if (self::getRedis() && $limit !== false && $limit !== '') {
+			return min($ttl, (int) $limit);
+		}
+		return $ttl;
+	}
+	private static function sharedKey($key) {
+		return (getenv('BIGQUERY_CACHE_PREFIX') ?: 'adminer-bigquery:') . $key;
+	}
+	private static function getLocal($key, $ttl) {
 		if (self::isApcuAvailable()) {
 			return \apcu_fetch($key);
 		}
@@ -28,7 +93,7 @@ class BigQueryCacheManager {
 		}
 		return false;
 	}
-	static function set($key, $value, $ttl = 300) {
+	private static function setLocal($key, $value, $ttl) {
 		$success = false;
 		if (self::isApcuAvailable()) {
 			$success = \apcu_store($key, $value, $ttl);
@@ -37,6 +102,42 @@ class BigQueryCacheManager {
 		self::$cacheTimestamps[$key] = time();
 		return $success;
 	}
+	static function get($key, $ttl = 300) {
+		$localTtl = self::localTtl($ttl);
+		$value = self::getLocal($key, $localTtl);
+		if ($value !== false) {
+			BigQueryMetrics::increment('CacheHit');
+			return $value;
+		}
+		$redis = self::getRedis();
+		if ($redis) {
+			try {
+				$serialized = $redis->get(self::sharedKey($key));
+				if ($serialized !== false) {
+					$value = unserialize($serialized, array('allowed_classes' => false));
+					self::setLocal($key, $value, $localTtl);
+					BigQueryMetrics::increment('SharedCacheHit');
+					return $value;
+				}
+			} catch (\Exception $e) {
+				error_log("BigQueryCacheManager: shared cache get failed: " . $e->getMessage());
+			}
+		}
+		BigQueryMetrics::increment('CacheMiss');
+		return false;
+	}
+	static function set($key, $value, $ttl = 300) {
+		$success = self::setLocal($key, $value, self::localTtl($ttl));
+		$redis = self::getRedis();
+		if ($redis) {
+			try {
+				$success = $redis->setex(self::sharedKey($key), self::sharedTtl($ttl), serialize($value)) || $success;
+			} catch (\Exception $e) {
+				error_log("BigQueryCacheManager: shared cache set failed: " . $e->getMessage());
+			}
+		}
+		return $success;
+	}
 	static function clear($pattern = null) {
 		if ($pattern === null) {
 			if (self::isApcuAvailable()) {
@@ -52,6 +153,20 @@ class BigQueryCacheManager {
 				}
 			}
 		}
+		$redis = self::getRedis();
+		if ($redis) {
+			try {
+				$match = self::sharedKey('') . ($pattern === null ? '*' : '*' . $pattern . '*');
+				$iterator = null;
+				while (($keys = $redis->scan($iterator, $match, 1000)) !== false) {
+					if ($keys) {
+						$redis->del($keys);
+					}
+				}
+			} catch (\Exception $e) {
+				error_log("BigQueryCacheManager: shared cache clear failed: " . $e->getMessage());
+			}
+		}
 	}
 	static function getStats() {
 		$apcuInfo = self::isApcuAvailable() ? \apcu_cache_info() : array();
@@ -59,6 +174,7 @@ class BigQueryCacheManager {
 			'static_cache_size' => count(self::$staticCache),
 			'apcu_available' => self::isApcuAvailable(),
 			'apcu_info' => $apcuInfo,
+			'shared_cache_available' => self::getRedis() !== null,
 			'cache_keys' => array_keys(self::$staticCache)
 		);
 	}
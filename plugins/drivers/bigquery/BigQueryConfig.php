@@ -77,10 +77,50 @@ class BigQueryConfig {
 		'apcu_shm_size' => '64M',
 		'connection_pool_max' => 3,
 	);
+	public const MAX_FIELDS = 1000;
 	static function mapType($bigQueryType) {
 		$baseType = strtoupper(preg_replace('/\\(.*\\)/', '', $bigQueryType));
 		return self::TYPE_MAPPING[$baseType] ?? array('type' => 'text', 'length' => null);
 	}
+	/**
+	 * テーブルのスキーマをAdminerのフィールド定義に変換する
+	 * fields() とデプロイ時のプリロード(BigQueryPreloader)で同じ形式をキャッシュするため共通化している
+	 * 列数が MAX_FIELDS を超える場合は先頭の MAX_FIELDS 列のみを返す
+	 * @param array<int, array<string, mixed>> $schemaFields テーブル情報の schema.fields
+	 * @return array<string, array<string, mixed>>
+	 */
+	static function adminerFields(array $schemaFields) {
+		static $typeCache = array();
+		$fields = array();
+		foreach (array_slice($schemaFields, 0, self::MAX_FIELDS) as $field) {
+			$bigQueryType = $field['type'] ?? 'STRING';
+			if (!isset($typeCache[$bigQueryType])) {
+				$typeCache[$bigQueryType] = self::mapType($bigQueryType);
+			}
+			$adminerTypeInfo = $typeCache[$bigQueryType];
+			$length = null;
+			if (preg_match('/\((\d+(?:,\d+)?)\)/', $bigQueryType, $matches)) {
+				$length = $matches[1];
+			}
+			$typeStr = $adminerTypeInfo['type'];
+			if ($length !== null) {
+				$typeStr .= "($length)";
+			} elseif (isset($adminerTypeInfo['length']) && $adminerTypeInfo['length'] !== null) {
+				$typeStr .= "(" . $adminerTypeInfo['length'] . ")";
+			}
+			$fields[$field['name']] = array(
+				'field' => $field['name'],
+				'type' => $typeStr,
+				'full_type' => $typeStr,
+				'null' => ($field['mode'] ?? 'NULLABLE') !== 'REQUIRED',
+				'default' => null,
+				'auto_increment' => false,
+				'comment' => $field['description'] ?? '',
+				'privileges' => array('select' => 1, 'insert' => 1, 'update' => 1, 'where' => 1, 'order' => 1)
+			);
+		}
+		return $fields;
+	}
 	static function isDangerousQuery($query) {
 		foreach (self::DANGEROUS_SQL_PATTERNS as $pattern) {
 			if (preg_match($pattern, $query)) {
@@ -2,6 +2,7 @@
 
 namespace Adminer;
 
+use Google\Auth\Credentials\InsecureCredentials;
 use Google\Cloud\BigQuery\BigQueryClient;
 
 class BigQueryConnectionPool {
@@ -24,11 +25,17 @@ class BigQueryConnectionPool {
 			'projectId' => $config['projectId'],
 			'location' => $config['location']
 		);
-		if (isset($config['credentialsPath'])) {
+		// ローカルの代替エンドポイント(負荷試験のエミュレータなど)は認証しない
+		$apiEndpoint = getenv('BIGQUERY_API_ENDPOINT');
+		if ($apiEndpoint) {
+			$clientConfig['apiEndpoint'] = $apiEndpoint;
+			$clientConfig['credentialsFetcher'] = new InsecureCredentials();
+		} elseif (isset($config['credentialsPath'])) {
 			$clientConfig['keyFilePath'] = $config['credentialsPath'];
 		}
 		$client = new BigQueryClient($clientConfig);
 		$creationTime = microtime(true) - $startTime;
+		BigQueryMetrics::put('ClientCreationTime', $creationTime * 1000, 'Milliseconds');
 		self::$pool[$key] = $client;
 		self::$usageTimestamps[$key] = time();
 		self::$creationTimes[$key] = time();
@@ -0,0 +1,80 @@
+<?php
+
+namespace Adminer;
+
+use Exception;
+
+/**
+ * 非同期エクスポートのジョブ(SQSのメッセージ)の組み立てと検証
+ *
+ * AdminerBigQueryAsyncExport が create() で登録し、export-worker.php が parse() で取り出す。
+ * メッセージはキューやDLQに最長14日残るため、FIELDS以外(アクセストークンなどの認証情報)は含めない。
+ * ワーカーは自身の認証情報(GOOGLE_APPLICATION_CREDENTIALS)でクエリを実行する。
+ */
+class BigQueryExportJob {
+
+	/** メッセージに含める項目 */
+	const FIELDS = array('id', 'project', 'dataset', 'table', 'query', 'format', 'key');
+
+	/** ワーカーが対応する形式と、アップロードするファイルのContent-Type */
+	const CONTENT_TYPES = array(
+		'csv' => 'text/csv',
+		'csv;' => 'text/csv',
+		'tsv' => 'text/tab-separated-values',
+		'json' => 'application/x-ndjson',
+	);
+
+	/**
+	 * ジョブのメッセージ本文を組み立てる
+	 * @param array<string, string> $job FIELDSの各項目。それ以外の項目は捨てる
+	 * @return string JSON
+	 * @throws Exception 項目が足りない、または読み取り以外のクエリの場合
+	 */
+	static function create(array $job) {
+		$job = self::validate($job);
+		if ($job === null) {
+			throw new Exception('Invalid export job');
+		}
+		BigQueryUtils::validateReadOnlyQuery($job['query']);
+		return json_encode($job);
+	}
+
+	/**
+	 * メッセージ本文からジョブを取り出す
+	 * @return array<string, string>|null 形式が不正な場合や読み取り以外のクエリの場合はnull
+	 */
+	static function parse($body) {
+		$job = json_decode((string) $body, true);
+		if (!is_array($job)) {
+			return null;
+		}
+		$job = self::validate($job);
+		if ($job === null) {
+			return null;
+		}
+		try {
+			BigQueryUtils::validateReadOnlyQuery($job['query']);
+		} catch (Exception $e) {
+			return null;
+		}
+		return $job;
+	}
+
+	/**
+	 * @param array<string, mixed> $job
+	 * @return array<string, string>|null FIELDSの項目だけの配列
+	 */
+	private static function validate(array $job) {
+		$return = array();
+		foreach (self::FIELDS as $field) {
+			if (!isset($job[$field]) || !is_string($job[$field])) {
+				return null;
+			}
+			$return[$field] = $job[$field];
+		}
+		if (!isset(self::CONTENT_TYPES[$return['format']]) || strpos($return['key'], 'exports/') !== 0) {
+			return null;
+		}
+		return $return;
+	}
+}
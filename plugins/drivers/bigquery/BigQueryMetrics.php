@@ -0,0 +1,72 @@
+<?php
+
+namespace Adminer;
+
+/**
+ * BigQueryドライバの計測値をCloudWatch Embedded Metric Format(EMF)で標準エラー出力に書き出す
+ *
+ * 計測値ごとに1行のJSONを出力し、キャッシュのヒット/ミスはリクエスト終了時に1行にまとめて出力する。
+ * CloudWatch LogsがEMFのログをそのままメトリクスにする(devtools/cdkはメトリクスフィルタを作成しない)。
+ *
+ * 環境変数:
+ * - BIGQUERY_METRICS_NAMESPACE: メトリクスの名前空間。未設定の場合は何も出力しない
+ * - BIGQUERY_METRICS_SERVICE: ディメンション Service の値(既定: adminer-bigquery)
+ */
+class BigQueryMetrics {
+
+	private static ?string $namespace = null;
+	private static array $counters = array();
+	private static bool $shutdownRegistered = false;
+	private static function isEnabled() {
+		if (self::$namespace === null) {
+			self::$namespace = (string) getenv('BIGQUERY_METRICS_NAMESPACE');
+		}
+		return self::$namespace !== '';
+	}
+	static function put($name, $value, $unit = 'None') {
+		self::emit(array($name => array($value, $unit)));
+	}
+	static function increment($name) {
+		if (!self::isEnabled()) {
+			return;
+		}
+		self::$counters[$name] = (self::$counters[$name] ?? 0) + 1;
+		if (!self::$shutdownRegistered) {
+			self::$shutdownRegistered = true;
+			register_shutdown_function(array(__CLASS__, 'flush'));
+		}
+	}
+	static function flush() {
+		$metrics = array();
+		foreach (self::$counters as $name => $count) {
+			$metrics[$name] = array($count, 'Count');
+		}
+		self::$counters = array();
+		self::emit($metrics);
+	}
+	private static function emit(array $metrics) {
+		if (!$metrics || !self::isEnabled()) {
+			return;
+		}
+		$service = getenv('BIGQUERY_METRICS_SERVICE') ?: 'adminer-bigquery';
+		$definitions = array();
+		$record = array();
+		foreach ($metrics as $name => $metric) {
+			$definitions[] = array('Name' => $name, 'Unit' => $metric[1]);
+			$record[$name] = $metric[0];
+		}
+		$record = array(
+			'_aws' => array(
+				'Timestamp' => (int) round(microtime(true) * 1000),
+				'CloudWatchMetrics' => array(array(
+					'Namespace' => self::$namespace,
+					'Dimensions' => array(array('Service')),
+					'Metrics' => $definitions,
+				)),
+			),
+			'Service' => $service,
+		) + $record;
+		// error_logは行頭に日時などを付けるため、JSONをそのまま1行で書き出す
+		file_put_contents('php://stderr', json_encode($record) . "\n");
+	}
+}
@@ -0,0 +1,93 @@
+<?php
+
+namespace Adminer;
+
+use Exception;
+
+/**
+ * デプロイ直後のタスクにBigQueryのメタデータを読み込む
+ *
+ * Blue/Greenデプロイのライフサイクルフック(devtools/cdk)が、本番のトラフィックを切り替える前に
+ * 新しいタスクの warmup.php?preload=1 を呼び出す。
+ * データセット一覧・指定したデータセットのテーブル一覧・指定したテーブルのスキーマを、
+ * get_databases() / tables_list() / fields() と同じキーでキャッシュ(APCu、共有キャッシュ)に格納する。
+ * データセット一覧は毎回APIから取得するため、呼び出したワーカーの接続プールのクライアントと
+ * サービスアカウントのアクセストークンも用意される。
+ *
+ * 環境変数:
+ * - ADMINER_PRELOAD_DATASETS: テーブル一覧を読み込むデータセット(空白区切り)。未設定の場合は先頭 MAX_DATASETS 件
+ * - ADMINER_PRELOAD_TABLES: スキーマを読み込むテーブル(dataset.table を空白区切り)
+ */
+class BigQueryPreloader {
+
+	/** ADMINER_PRELOAD_DATASETS が未設定の場合に、テーブル一覧を読み込むデータセットの上限 */
+	const MAX_DATASETS = 20;
+
+	/**
+	 * @return array<string, int> 読み込んだ件数とエラー数
+	 */
+	static function run($projectId) {
+		$stats = array('datasets' => 0, 'tables' => 0, 'fields' => 0, 'errors' => 0);
+		$credentialsPath = getenv('GOOGLE_APPLICATION_CREDENTIALS') ?: null;
+		$location = getenv('BIGQUERY_LOCATION') ?: 'US';
+		// Db::createBigQueryClient() と同じキーで、ログイン時にこのワーカーのクライアントが再利用されるようにする
+		$client = BigQueryConnectionPool::getConnection(md5($projectId . $credentialsPath . $location), array(
+			'projectId' => $projectId,
+			'location' => $location,
+			'credentialsPath' => $credentialsPath,
+		));
+
+		try {
+			$datasets = array();
+			foreach ($client->datasets(array('maxResults' => 100)) as $dataset) {
+				$datasets[] = $dataset->id();
+			}
+			sort($datasets);
+			BigQueryCacheManager::set("bq_databases_$projectId", $datasets, 300);
+			$stats['datasets'] = count($datasets);
+		} catch (Exception $e) {
+			error_log("BigQueryPreloader: datasets: " . $e->getMessage());
+			$stats['errors']++;
+			return $stats;
+		}
+
+		$preloadDatasets = preg_split('~\s+~', trim((string) getenv('ADMINER_PRELOAD_DATASETS')), -1, PREG_SPLIT_NO_EMPTY);
+		foreach ($preloadDatasets ?: array_slice($datasets, 0, self::MAX_DATASETS) as $datasetId) {
+			$cacheKey = "bq_tables_{$projectId}_$datasetId";
+			if (BigQueryCacheManager::get($cacheKey, 300) !== false) {
+				continue;
+			}
+			try {
+				$tables = array();
+				foreach ($client->dataset($datasetId)->tables(array('maxResults' => 100)) as $table) {
+					$tables[$table->id()] = 'table';
+				}
+				BigQueryCacheManager::set($cacheKey, $tables, 300);
+				$stats['tables'] += count($tables);
+			} catch (Exception $e) {
+				error_log("BigQueryPreloader: tables of $datasetId: " . $e->getMessage());
+				$stats['errors']++;
+			}
+		}
+
+		$preloadTables = preg_split('~\s+~', trim((string) getenv('ADMINER_PRELOAD_TABLES')), -1, PREG_SPLIT_NO_EMPTY);
+		foreach ($preloadTables as $name) {
+			list($datasetId, $tableId) = array_pad(explode('.', $name, 2), 2, '');
+			$cacheKey = "bq_fields_{$projectId}_{$datasetId}_$tableId";
+			if ($tableId == '' || BigQueryCacheManager::get($cacheKey, 600) !== false) {
+				continue;
+			}
+			try {
+				$info = $client->dataset($datasetId)->table($tableId)->info();
+				if (isset($info['schema']['fields'])) {
+					BigQueryCacheManager::set($cacheKey, BigQueryConfig::adminerFields($info['schema']['fields']), 600);
+					$stats['fields']++;
+				}
+			} catch (Exception $e) {
+				error_log("BigQueryPreloader: schema of $name: " . $e->getMessage());
+				$stats['errors']++;
+			}
+		}
+		return $stats;
+	}
+}
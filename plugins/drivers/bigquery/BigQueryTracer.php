@@ -0,0 +1,144 @@
+<?php
+
+namespace Adminer;
+
+/**
+ * BigQueryドライバのトレースをOTLP/HTTP(JSON)でOpenTelemetryコレクタに送る軽量なトレーサ
+ *
+ * リクエスト全体をルートspanとし、クエリ・メタデータ取得・OAuth2トークン交換を子spanとして記録する。
+ * spanはリクエスト終了時にまとめて送信する。ALBが付与する X-Amzn-Trace-Id があれば同じトレースIDを使う。
+ *
+ * 環境変数:
+ * - OTEL_EXPORTER_OTLP_ENDPOINT: コレクタのOTLP/HTTPエンドポイント(例: http://localhost:4318)。未設定の場合は何もしない
+ * - OTEL_SERVICE_NAME: service.name(既定: adminer-bigquery)
+ * - OTEL_TRACES_SAMPLER_ARG: サンプリング率(0〜1, 既定: 1)
+ */
+class BigQueryTracer {
+
+	const SPAN_KIND_SERVER = 2;
+	const SPAN_KIND_CLIENT = 3;
+	const STATUS_ERROR = 2;
+
+	private static ?bool $enabled = null;
+	private static string $traceId = '';
+	private static string $rootSpanId = '';
+	private static array $spans = array();
+	private static array $stack = array();
+	private static function isEnabled() {
+		if (self::$enabled === null) {
+			$ratio = getenv('OTEL_TRACES_SAMPLER_ARG');
+			$ratio = $ratio !== false && $ratio !== '' ? (float) $ratio : 1.0;
+			self::$enabled = (bool) getenv('OTEL_EXPORTER_OTLP_ENDPOINT') && mt_rand() / mt_getrandmax() < $ratio;
+			if (self::$enabled) {
+				self::$traceId = self::incomingTraceId() ?: sprintf('%08x', time()) . bin2hex(random_bytes(12));
+				self::$rootSpanId = bin2hex(random_bytes(8));
+				register_shutdown_function(array(__CLASS__, 'flush'));
+			}
+		}
+		return self::$enabled;
+	}
+	private static function incomingTraceId() {
+		// X-Amzn-Trace-Id: Root=1-5759e988-bd862e3fe1be46a994272793;...
+		if (preg_match('/Root=1-([0-9a-f]{8})-([0-9a-f]{24})/', $_SERVER['HTTP_X_AMZN_TRACE_ID'] ?? '', $matches)) {
+			return $matches[1] . $matches[2];
+		}
+		return '';
+	}
+	private static function now() {
+		return (string) (int) (microtime(true) * 1e9);
+	}
+	private static function attributes(array $attributes) {
+		$ret = array();
+		foreach ($attributes as $key => $value) {
+			if (is_bool($value)) {
+				$typed = array('boolValue' => $value);
+			} elseif (is_int($value)) {
+				$typed = array('intValue' => (string) $value);
+			} elseif (is_float($value)) {
+				$typed = array('doubleValue' => $value);
+			} else {
+				$typed = array('stringValue' => (string) $value);
+			}
+			$ret[] = array('key' => $key, 'value' => $typed);
+		}
+		return $ret;
+	}
+	static function start($name, array $attributes = array()) {
+		if (!self::isEnabled()) {
+			return null;
+		}
+		$spanId = bin2hex(random_bytes(8));
+		$span = array(
+			'traceId' => self::$traceId,
+			'spanId' => $spanId,
+			'parentSpanId' => self::$stack ? end(self::$stack) : self::$rootSpanId,
+			'name' => $name,
+			'kind' => self::SPAN_KIND_CLIENT,
+			'startTimeUnixNano' => self::now(),
+			'attributes' => $attributes,
+		);
+		self::$stack[] = $spanId;
+		return $span;
+	}
+	static function end($span, array $attributes = array(), ?\Throwable $error = null) {
+		if ($span === null) {
+			return;
+		}
+		array_pop(self::$stack);
+		$span['endTimeUnixNano'] = self::now();
+		$span['attributes'] = self::attributes($attributes + $span['attributes']);
+		if ($error !== null) {
+			$span['status'] = array('code' => self::STATUS_ERROR, 'message' => $error->getMessage());
+		}
+		self::$spans[] = $span;
+	}
+	static function flush() {
+		if (!self::$enabled) {
+			return;
+		}
+		$start = $_SERVER['REQUEST_TIME_FLOAT'] ?? microtime(true);
+		$path = parse_url($_SERVER['REQUEST_URI'] ?? '/', PHP_URL_PATH) ?: '/';
+		$status = http_response_code() ?: 200;
+		$root = array(
+			'traceId' => self::$traceId,
+			'spanId' => self::$rootSpanId,
+			'name' => ($_SERVER['REQUEST_METHOD'] ?? 'GET') . ' ' . $path,
+			'kind' => self::SPAN_KIND_SERVER,
+			'startTimeUnixNano' => (string) (int) ($start * 1e9),
+			'endTimeUnixNano' => self::now(),
+			'attributes' => self::attributes(array(
+				'http.request.method' => $_SERVER['REQUEST_METHOD'] ?? 'GET',
+				'url.path' => $path,
+				// クエリ文字列の値(OAuth2の認可コードなど)は送らず、Adminerの画面を表すキーのみ記録する
+				'adminer.params' => implode(',', array_keys($_GET)),
+				'http.response.status_code' => $status,
+			)),
+		);
+		if ($status >= 500) {
+			$root['status'] = array('code' => self::STATUS_ERROR);
+		}
+		$payload = array('resourceSpans' => array(array(
+			'resource' => array('attributes' => self::attributes(array(
+				'service.name' => getenv('OTEL_SERVICE_NAME') ?: 'adminer-bigquery',
+			))),
+			'scopeSpans' => array(array(
+				'scope' => array('name' => 'adminer-bigquery'),
+				'spans' => array_merge(array($root), self::$spans),
+			)),
+		)));
+		self::$spans = array();
+		$context = stream_context_create(array(
+			'http' => array(
+				'method' => 'POST',
+				'header' => 'Content-Type: application/json',
+				'content' => json_encode($payload),
+				// コレクタはタスク内のサイドカーのため、応答が無い場合もリクエストを待たせない
+				'timeout' => 0.2,
+				'ignore_errors' => true,
+			)
+		));
+		if (@file_get_contents(rtrim(getenv('OTEL_EXPORTER_OTLP_ENDPOINT'), '/') . '/v1/traces', false, $context) === false) {
+			error_log("BigQueryTracer: failed to export spans");
+		}
+	}
+}
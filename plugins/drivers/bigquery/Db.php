@@ -63,7 +63,7 @@ class Db {
 			} else {
 				// 従来のCREDENTIAL認証
 				$credentialsPath = $this->getCredentialsPath();
-				if (!$credentialsPath) {
+				if (!$credentialsPath && !getenv('BIGQUERY_API_ENDPOINT')) {
 					throw new Exception('BigQuery authentication not configured. Set GOOGLE_APPLICATION_CREDENTIALS environment variable or provide credentials file path.');
 				}
 				$this->initializeConfiguration($location);
@@ -347,6 +347,19 @@ class Db {
 		return null;
 	}
 
+	/**
+	 * クエリをログイン中の認証情報でdry runする
+	 * 非同期エクスポートのワーカーは自身の認証情報で実行するため、ユーザーが読めないデータを書き出さないよう登録前に確かめる
+	 * @throws Exception 実行できないクエリの場合
+	 */
+	function dryRunQuery($query) {
+		$queryJob = $this->bigQueryClient->query($query)->useLegacySql(false)->dryRun(true)->location($this->determineQueryLocation());
+		if (!empty($this->datasetId)) {
+			$queryJob = $queryJob->defaultDataset($this->bigQueryClient->dataset($this->datasetId));
+		}
+		$this->bigQueryClient->startQuery($queryJob);
+	}
+
 	/**
 	 * プロキシ認証情報からアクセストークンを生成
 	 */
@@ -606,7 +619,9 @@ class Db {
 			)
 		));
 
+		$span = BigQueryTracer::start('oauth2.token_exchange', array('server.address' => 'oauth2.googleapis.com'));
 		$response = file_get_contents($tokenUrl, false, $context);
+		BigQueryTracer::end($span);
 
 		// Get HTTP response headers to check status code
 		$httpStatus = null;
@@ -804,17 +819,33 @@ class Db {
 			}
 
 			if (getenv('BIGQUERY_READONLY_MODE') === 'true') {
-				$this->validateReadOnlyQuery($query);
+				BigQueryUtils::validateReadOnlyQuery($query);
 			}
 
 			$queryLocation = $this->determineQueryLocation();
 
 			$queryJob = $this->bigQueryClient->query($query)->useLegacySql(false)->location($queryLocation);
-			$job = $this->bigQueryClient->runQuery($queryJob);
-			if (!$job->isComplete()) {
-				$job->waitUntilComplete();
+			$startTime = microtime(true);
+			$span = BigQueryTracer::start('bigquery.query', array('db.system' => 'bigquery', 'bigquery.location' => $queryLocation));
+			try {
+				$job = $this->bigQueryClient->runQuery($queryJob);
+				if (!$job->isComplete()) {
+					$job->waitUntilComplete();
+				}
+				$jobInfo = $this->checkJobStatus($job);
+			} catch (Exception $e) {
+				BigQueryTracer::end($span, array(), $e);
+				throw $e;
+			}
+			BigQueryMetrics::put('QueryLatency', (microtime(true) - $startTime) * 1000, 'Milliseconds');
+			if (isset($jobInfo['totalBytesProcessed'])) {
+				BigQueryMetrics::put('BytesProcessed', (int) $jobInfo['totalBytesProcessed'], 'Bytes');
 			}
-			$this->checkJobStatus($job);
+			BigQueryTracer::end($span, array(
+				'bigquery.job_id' => $jobInfo['jobReference']['jobId'] ?? '',
+				'bigquery.bytes_processed' => (int) ($jobInfo['totalBytesProcessed'] ?? 0),
+				'bigquery.cache_hit' => (bool) ($jobInfo['cacheHit'] ?? false),
+			));
 
 			return $this->last_result = new Result($job);
 		} catch (ServiceException $e) {
@@ -839,26 +870,7 @@ class Db {
 				throw new Exception("BigQuery job failed: " . ($errorResult['message'] ?? 'Unknown error'));
 			}
 		}
-	}
-	private function validateReadOnlyQuery($query) {
-		$cleanQuery = preg_replace('/--.*$/m', '', $query);
-		$cleanQuery = preg_replace('/\/\*.*?\*\//s', '', $cleanQuery);
-		$cleanQuery = trim($cleanQuery);
-		if (!preg_match('/^\s*SELECT\s+/i', $cleanQuery)) {
-			throw new Exception('Only SELECT queries are supported in read-only mode');
-		}
-		$dangerousPatterns = array(
-			'/\b(INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|TRUNCATE)\b/i',
-			'/\b(GRANT|REVOKE)\b/i',
-			'/\bCALL\s+/i',
-			'/\bEXEC(UTE)?\s+/i',
-		);
-		foreach ($dangerousPatterns as $pattern) {
-			if (preg_match($pattern, $cleanQuery)) {
-				throw new Exception('DDL/DML operations are not allowed in read-only mode');
-			}
-		}
-		return true;
+		return $jobInfo;
 	}
 	private function determineQueryLocation() {
 		if (!empty($this->datasetId)) {
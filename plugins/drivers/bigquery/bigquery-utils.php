@@ -38,6 +38,31 @@ class BigQueryUtils {
 		error_log("BigQuery $context: $safeQuery");
 	}
 
+	/**
+	 * 読み取り(SELECT)のクエリであることを確かめる
+	 * @throws Exception SELECT以外、またはDDL/DMLを含む場合
+	 */
+	public static function validateReadOnlyQuery($query) {
+		$cleanQuery = preg_replace('/--.*$/m', '', $query);
+		$cleanQuery = preg_replace('/\/\*.*?\*\//s', '', $cleanQuery);
+		$cleanQuery = trim($cleanQuery);
+		if (!preg_match('/^\s*SELECT\s+/i', $cleanQuery)) {
+			throw new Exception('Only SELECT queries are supported in read-only mode');
+		}
+		$dangerousPatterns = array(
+			'/\b(INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|TRUNCATE)\b/i',
+			'/\b(GRANT|REVOKE)\b/i',
+			'/\bCALL\s+/i',
+			'/\bEXEC(UTE)?\s+/i',
+		);
+		foreach ($dangerousPatterns as $pattern) {
+			if (preg_match($pattern, $cleanQuery)) {
+				throw new Exception('DDL/DML operations are not allowed in read-only mode');
+			}
+		}
+		return true;
+	}
+
 	public static function convertValueForBigQuery($value, $fieldType) {
 		if ($value === null) {
 			return 'NULL';
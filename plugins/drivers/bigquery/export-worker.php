@@ -0,0 +1,152 @@
+<?php
+
+/**
+ * 非同期エクスポートのワーカー
+ *
+ * AdminerBigQueryAsyncExport がSQSに登録したジョブを取り出し、ジョブのクエリの結果を
+ * gzip圧縮したCSV/TSV/JSON Linesに書き出してS3にアップロードする。
+ * 失敗したジョブは削除せず、可視性タイムアウト後に再試行される(上限を超えるとDLQに移る)。
+ * 形式が不正なメッセージは再試行しても処理できないため、ログに残して削除する。
+ *
+ * タスクの停止(SIGTERM)から強制終了までは最長120秒(Fargateのstop_timeoutの上限)で、
+ * 最長で可視性タイムアウト(既定3600秒)かかるジョブの完了は待てない。途中までの結果は保存できないため、
+ * 処理中のジョブは可視性タイムアウトを0にしてキューに戻し、すぐに終了する。
+ * 戻したジョブは別のタスクが最初からやり直し、試行回数(DLQに移るまでの回数)を1回消費する。
+ *
+ * 使い方: php plugins/drivers/bigquery/export-worker.php
+ *
+ * 環境変数:
+ * - BIGQUERY_EXPORT_QUEUE_URL: ジョブを取り出すSQSキューのURL
+ * - BIGQUERY_EXPORT_BUCKET: アップロード先のバケット
+ * - GOOGLE_APPLICATION_CREDENTIALS: クエリを実行する認証情報(ジョブには認証情報を含めない)
+ */
+
+namespace Adminer;
+
+use Exception;
+use Google\Cloud\BigQuery\BigQueryClient;
+
+require_once __DIR__ . '/../../../vendor/autoload.php';
+require_once __DIR__ . '/BigQueryAwsClient.php';
+require_once __DIR__ . '/BigQueryExportJob.php';
+require_once __DIR__ . '/BigQueryMetrics.php';
+require_once __DIR__ . '/bigquery-utils.php';
+require_once __DIR__ . '/result.php';
+
+/**
+ * dump_csv() と同じ規則で1行を組み立てる
+ * @param array<string, mixed> $row
+ */
+function export_csv_line(array $row, $separator) {
+	foreach ($row as $key => $val) {
+		if (preg_match('~["\n,;\t]|^0.|\.\d*0$~', (string) $val) || $val === "") {
+			$row[$key] = '"' . str_replace('"', '""', $val) . '"';
+		}
+	}
+	return implode($separator, $row) . "\r\n";
+}
+
+/**
+ * ジョブのクエリの結果をgzip圧縮したファイルに書き出す
+ * @param array<string, string> $job BigQueryExportJob::parse() で取り出したジョブ
+ * @return int 書き出した行数
+ */
+function export_table(array $job, $file) {
+	$client = new BigQueryClient(array('projectId' => $job['project']));
+	$dataset = $client->dataset($job['dataset']);
+	$location = $dataset->info()['location'] ?? 'US';
+	// Adminerのクエリのテーブル名はデータセットを含まないため、ジョブのデータセットを既定にする
+	$queryJob = $client->query($job['query'])->useLegacySql(false)->location($location)->defaultDataset($dataset);
+	$result = new Result($client->runQuery($queryJob));
+
+	$separator = ($job['format'] == 'tsv' ? "\t" : ($job['format'] == 'csv;' ? ';' : ','));
+	$gz = gzopen($file, 'wb6');
+	$rows = 0;
+	while ($row = $result->fetch_assoc()) {
+		if ($job['format'] == 'json') {
+			gzwrite($gz, json_encode($row, JSON_UNESCAPED_UNICODE) . "\n");
+		} else {
+			if (!$rows) {
+				gzwrite($gz, "\xef\xbb\xbf" . export_csv_line(array_keys($row), $separator));
+			}
+			gzwrite($gz, export_csv_line($row, $separator));
+		}
+		$rows++;
+	}
+	gzclose($gz);
+	// Result::fetch_assoc() は取得エラーをfalseで返すため、件数で途中終了を検出する
+	if ($rows != $result->num_rows) {
+		throw new Exception("Export of job $job[id] stopped at $rows of {$result->num_rows} rows");
+	}
+	return $rows;
+}
+
+$queueUrl = getenv('BIGQUERY_EXPORT_QUEUE_URL');
+$bucket = getenv('BIGQUERY_EXPORT_BUCKET');
+if (!$queueUrl || !$bucket) {
+	fwrite(STDERR, "BIGQUERY_EXPORT_QUEUE_URL and BIGQUERY_EXPORT_BUCKET are required\n");
+	exit(1);
+}
+$aws = new BigQueryAwsClient();
+
+// タスクの停止(SIGTERM)では、処理中のジョブをキューに戻して終了する(先頭のコメントを参照)
+$running = true;
+$receiptHandle = null;
+if (function_exists('pcntl_async_signals')) {
+	pcntl_async_signals(true);
+	pcntl_signal(SIGTERM, function () use (&$running, &$receiptHandle, $aws, $queueUrl) {
+		$running = false;
+		if ($receiptHandle === null) {
+			return;
+		}
+		try {
+			$aws->sqs('ChangeMessageVisibility', array('QueueUrl' => $queueUrl, 'ReceiptHandle' => $receiptHandle, 'VisibilityTimeout' => 0));
+			error_log("export-worker: returned the job in progress to the queue on SIGTERM");
+		} catch (Exception $e) {
+			error_log("export-worker: " . $e->getMessage());
+		}
+		exit(0);
+	});
+}
+
+while ($running) {
+	try {
+		$response = $aws->sqs('ReceiveMessage', array(
+			'QueueUrl' => $queueUrl,
+			'MaxNumberOfMessages' => 1,
+			'WaitTimeSeconds' => 20,
+		));
+	} catch (Exception $e) {
+		error_log("export-worker: " . $e->getMessage());
+		sleep(5);
+		continue;
+	}
+	foreach ($response['Messages'] ?? array() as $message) {
+		$job = BigQueryExportJob::parse($message['Body'] ?? null);
+		if ($job === null) {
+			error_log("export-worker: deleting malformed message " . ($message['MessageId'] ?? ''));
+			try {
+				$aws->sqs('DeleteMessage', array('QueueUrl' => $queueUrl, 'ReceiptHandle' => $message['ReceiptHandle']));
+			} catch (Exception $e) {
+				error_log("export-worker: " . $e->getMessage());
+			}
+			continue;
+		}
+		$receiptHandle = $message['ReceiptHandle'];
+		$file = tempnam(sys_get_temp_dir(), 'export');
+		$startTime = microtime(true);
+		try {
+			$rows = export_table($job, $file);
+			$aws->putObject($bucket, $job['key'], $file, BigQueryExportJob::CONTENT_TYPES[$job['format']]);
+			$aws->sqs('DeleteMessage', array('QueueUrl' => $queueUrl, 'ReceiptHandle' => $receiptHandle));
+			BigQueryMetrics::put('ExportDuration', (microtime(true) - $startTime) * 1000, 'Milliseconds');
+			BigQueryMetrics::put('ExportRows', $rows, 'Count');
+			error_log("export-worker: job $job[id] exported $rows rows to $job[key]");
+		} catch (Exception $e) {
+			BigQueryUtils::logQuerySafely($e->getMessage(), 'EXPORT_ERROR');
+		} finally {
+			$receiptHandle = null;
+			@unlink($file);
+		}
+	}
+}